@@ -0,0 +1,42 @@
+"""
+Cache settings built from the environment.
+
+Processes share recipe list versions, revoked tokens and the pins
+keeping a user's reads on the primary after a write through the default
+cache (see recipe/cache.py, user/authentication.py and core/routers.py),
+so it must be shared by every process serving requests. REDIS_URL
+selects Redis. Without it the cache is local to the process, which is
+only correct when there is one; gunicorn.conf.py sets SERVER_PROCESSES to
+its number of workers, and more than one then fails configuration instead
+of serving stale listings. So do read replicas: the next request of a
+user who just wrote may reach any process, or any server.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+LOCAL_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def cache_config(environ, replicas=()):
+    """
+    Return the settings of the default cache
+    :param environ:
+    :param replicas: the aliases of the read replicas
+    :return:
+    """
+    if environ.get('REDIS_URL'):
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': environ['REDIS_URL'],
+        }
+    processes = int(environ.get('SERVER_PROCESSES', 1))
+    if processes > 1:
+        raise ImproperlyConfigured(
+            f'REDIS_URL must be set to serve from {processes} processes; '
+            'a process local cache would keep each one on its own data.'
+        )
+    if replicas:
+        raise ImproperlyConfigured(
+            'REDIS_URL must be set to read from replicas; pins kept in a '
+            'process local cache would not follow a user to other processes.'
+        )
+    return {'BACKEND': LOCAL_BACKEND}
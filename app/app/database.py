@@ -0,0 +1,95 @@
+"""
+Database connection settings built from the environment.
+
+By default connections persist for DB_CONN_MAX_AGE seconds and are health
+checked before reuse, so a request does not pay the TCP and authentication
+handshake. Under ASGI (API_ASYNC_READS=1) requests hop between threads and
+persistent connections would pile up, so they are disabled there; use the
+pool instead. DB_POOL=1 enables Django's psycopg 3 pool, which replaces
+persistent connections. It needs Django 5.1 or later and the
+`psycopg[pool]` package, so configuration fails without them; the image
+built from python:3.9 has Django 4.2 and psycopg2.
+
+DB_REPLICA_HOSTS lists read replicas, comma separated; they share the
+primary's name and credentials unless DB_REPLICA_USER and DB_REPLICA_PASS
+are set. See core/routers.py for how reads are routed to them.
+"""
+import copy
+from importlib.util import find_spec
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+
+
+def _flag(environ, name, default='0'):
+    return environ.get(name, default) == '1'
+
+
+def _check_pool_support():
+    if django.VERSION < (5, 1):
+        raise ImproperlyConfigured(
+            f'DB_POOL=1 needs Django 5.1 or later, not {django.get_version()}.'
+        )
+    if find_spec('psycopg') is None or find_spec('psycopg_pool') is None:
+        raise ImproperlyConfigured(
+            'DB_POOL=1 needs the psycopg[pool] package; psycopg2 has no pool.'
+        )
+
+
+def database_config(environ):
+    """
+    Return the settings of the default database
+    :param environ:
+    :return:
+    """
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': environ.get('DB_NAME'),
+        'USER': environ.get('DB_USER'),
+        'PASSWORD': environ.get('DB_PASS'),
+        'HOST': environ.get('DB_HOST'),
+        'CONN_HEALTH_CHECKS': _flag(environ, 'DB_CONN_HEALTH_CHECKS', '1'),
+        'OPTIONS': {},
+    }
+    if _flag(environ, 'DB_POOL'):
+        _check_pool_support()
+        config['CONN_MAX_AGE'] = 0
+        config['OPTIONS']['pool'] = {
+            'min_size': int(environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(environ.get('DB_POOL_MAX_SIZE', 10)),
+            # Seconds a request waits for a connection before failing.
+            'timeout': float(environ.get('DB_POOL_TIMEOUT', 10)),
+            # Recycle connections so server side memory cannot grow forever.
+            'max_lifetime': float(environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+        }
+    elif _flag(environ, 'API_ASYNC_READS'):
+        config['CONN_MAX_AGE'] = 0
+    else:
+        config['CONN_MAX_AGE'] = int(environ.get('DB_CONN_MAX_AGE', 60))
+    return config
+
+
+def replica_configs(environ, primary):
+    """
+    Return the settings of the read replicas by alias
+    :param environ:
+    :param primary:
+    :return:
+    """
+    hosts = [
+        host.strip()
+        for host in environ.get('DB_REPLICA_HOSTS', '').split(',')
+        if host.strip()
+    ]
+    return {
+        f'replica_{number}': {
+            **primary,
+            'HOST': host,
+            'USER': environ.get('DB_REPLICA_USER', primary['USER']),
+            'PASSWORD': environ.get('DB_REPLICA_PASS', primary['PASSWORD']),
+            'OPTIONS': copy.deepcopy(primary['OPTIONS']),
+            # Tests read the primary's test database through the replicas.
+            'TEST': {'MIRROR': 'default'},
+        }
+        for number, host in enumerate(hosts, 1)
+    }
@@ -10,10 +10,14 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+from datetime import timedelta
 from pathlib import Path
 
 from django.conf.global_settings import MEDIA_URL
 
+from app.caches import LOCAL_BACKEND, cache_config
+from app.database import database_config, replica_configs
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -21,12 +25,15 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-91wfb7eyve+&#9(jxya^*20spm!*v*+2(9d(*rkl%8-_qe2@ro'
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY',
+    'django-insecure-91wfb7eyve+&#9(jxya^*20spm!*v*+2(9d(*rkl%8-_qe2@ro',
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = bool(int(os.environ.get('DEBUG', 0)))
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
 
 # Application definition
 
@@ -46,7 +53,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,14 +90,91 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.environ.get('DB_NAME'),
-        'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASS'),
-        'HOST': os.environ.get('DB_HOST'),
-    }
+    'default': database_config(os.environ),
+}
+DATABASES.update(replica_configs(os.environ, DATABASES['default']))
+
+# Reads of GET, HEAD and OPTIONS requests go to the replicas; see
+# core/routers.py. A user is pinned to the primary for PIN_SECONDS after a
+# write, and an unreachable replica is retried after RETRY_SECONDS.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_ROUTING = {
+    'CACHE_ALIAS': 'default',
+    'PIN_SECONDS': int(os.environ.get('DB_REPLICA_PIN_SECONDS', 10)),
+    'RETRY_SECONDS': int(os.environ.get('DB_REPLICA_RETRY_SECONDS', 30)),
+}
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': cache_config(os.environ, replicas=DATABASE_REPLICAS),
+}
+
+# Versions expire after VERSION_TIMEOUT seconds, so a lost bump outlives
+# no cached listing or list ETag for longer than that.
+RECIPE_LIST_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': int(os.environ.get('RECIPE_LIST_CACHE_TIMEOUT', 300)),
+    'VERSION_TIMEOUT': int(
+        os.environ.get('RECIPE_LIST_CACHE_VERSION_TIMEOUT', 24 * 60 * 60)
+    ),
+    'LOCAL_MAX_ENTRIES': int(os.environ.get('RECIPE_LIST_CACHE_LOCAL_MAX_ENTRIES', 1024)),
+}
+
+# Token -> user cache used by CachedTokenAuthentication. Revoking a token
+# or deactivating its user drops it from the shared cache at once; LOCAL_TTL
+# bounds how long another process may still accept it from its own tier.
+# app/caches.py requires a shared cache for more than one process; a
+# process local one keeps tokens no longer than LOCAL_TTL either.
+AUTH_TOKEN_LOCAL_TTL = int(os.environ.get('AUTH_TOKEN_LOCAL_TTL', 10))
+AUTH_TOKEN_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': (
+        AUTH_TOKEN_LOCAL_TTL
+        if CACHES['default']['BACKEND'] == LOCAL_BACKEND else 300
+    ),
+    'LOCAL_TTL': AUTH_TOKEN_LOCAL_TTL,
+    'LOCAL_MAX_ENTRIES': 4096,
+}
+
+# Tokens expire this long after their last renewal; a token in use is
+# renewed at most once per interval.
+AUTH_TOKEN_LIFETIME = timedelta(days=int(os.environ.get('AUTH_TOKEN_LIFETIME_DAYS', 14)))
+AUTH_TOKEN_RENEW_INTERVAL = timedelta(hours=1)
+
+# Password hashing. PASSWORD_HASHER picks the algorithm used for new hashes;
+# the others stay listed so older hashes verify and are upgraded on login,
+# as are hashes made with different cost parameters. Measured with
+# `manage.py benchmark_logins`: scrypt n=2**15 costs ~150 ms and 32 MiB per
+# login on one core, against ~500 ms for PBKDF2 at 1,000,000 iterations.
+# argon2 needs the argon2-cffi package.
+PASSWORD_HASHING = {
+    'ALGORITHM': os.environ.get('PASSWORD_HASHER', 'scrypt'),
+    'SCRYPT': {
+        'work_factor': int(os.environ.get('SCRYPT_WORK_FACTOR', 2 ** 15)),
+        'block_size': 8,
+        'parallelism': 1,
+    },
+    'ARGON2': {
+        'time_cost': int(os.environ.get('ARGON2_TIME_COST', 2)),
+        'memory_cost': int(os.environ.get('ARGON2_MEMORY_COST', 19456)),
+        'parallelism': 1,
+    },
+    # Per process; logins beyond this wait, then get a 429.
+    'MAX_CONCURRENT_VERIFICATIONS': int(os.environ.get('MAX_CONCURRENT_LOGINS', 2)),
+    'VERIFICATION_TIMEOUT': 2.0,
+}
+
+_PASSWORD_HASHER_CLASSES = {
+    'scrypt': 'user.hashers.ScryptPasswordHasher',
+    'argon2': 'user.hashers.Argon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
 }
+PASSWORD_HASHERS = [_PASSWORD_HASHER_CLASSES[PASSWORD_HASHING['ALGORITHM']]] + [
+    path for name, path in _PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHING['ALGORITHM']
+]
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -125,6 +213,57 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Serve GET list/retrieve on the recipe API with async views. Enabled by
+# app/asgi.py; under WSGI each async view would need its own event loop.
+API_ASYNC_READS = os.environ.get('API_ASYNC_READS') == '1'
+
+# Per-request SQL instrumentation; see core/queries.py. Views over their
+# query_budget fail when ENFORCE is set (the default with DEBUG, as in CI)
+# and are logged otherwise.
+QUERY_BUDGET = {
+    'ENFORCE': os.environ.get('QUERY_BUDGET_ENFORCE', '1' if DEBUG else '0') == '1',
+    'SERVER_TIMING': os.environ.get('SERVER_TIMING', '1') == '1',
+}
+
+# Prometheus metrics served at /metrics; see core/metrics.py. Worker
+# processes share them through files in DIR, which gunicorn.conf.py sets.
+METRICS = {
+    'DIR': os.environ.get('METRICS_DIR'),
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+}
+
+# Response compression; see core/compression.py. brotli and zstd are used
+# when the Brotli and zstandard packages are installed.
+RESPONSE_COMPRESSION = {
+    'ENCODINGS': [name for name in os.environ.get('COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(',') if name],
+    'LEVELS': {
+        'gzip': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+        'br': int(os.environ.get('COMPRESSION_BROTLI_LEVEL', 4)),
+        'zstd': int(os.environ.get('COMPRESSION_ZSTD_LEVEL', 3)),
+    },
+    'MIN_SIZE': int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.queries': {
+            'handlers': ['console'],
+            'level': os.environ.get('QUERY_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# Recipe image processing: 'thread' runs a worker pool in each process,
+# 'immediate' processes on the request thread once the upload commits.
+RECIPE_IMAGE_EXECUTOR = os.environ.get('RECIPE_IMAGE_EXECUTOR', 'thread')
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -135,6 +274,17 @@ AUTH_USER_MODEL = 'core.User'
 REST_FRAMEWORK = {
 
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # JSON is encoded and decoded with orjson when it is installed; see
+    # core/fastjson.py
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.fastjson.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.fastjson.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 
@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
+
+from core.models import AuthToken
 # Register your models here.
 
 User = get_user_model()
@@ -28,3 +30,17 @@ class UserAdmin(BaseUserAdmin):
 
 
 admin.site.register(User, UserAdmin)
+
+
+class AuthTokenAdmin(admin.ModelAdmin):
+    """
+    Tokens can only be revoked here; keys are never stored
+    """
+    list_display = ['user', 'device', 'created', 'expires_at']
+    readonly_fields = ['digest', 'user', 'device', 'created', 'expires_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(AuthToken, AuthTokenAdmin)
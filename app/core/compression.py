@@ -0,0 +1,235 @@
+"""
+Negotiated response compression.
+
+gzip is always available; brotli (`br`) and zstd need the Brotli and
+zstandard packages and are left out when those are not installed. The
+encodings and their levels are set in RESPONSE_COMPRESSION; the first
+one of the server's preference order the client accepts with the
+highest q value wins.
+
+Streaming responses are compressed chunk by chunk. The compressor is
+flushed whenever FLUSH_SIZE bytes went in since the last flush, so the
+client keeps receiving data while memory stays bounded; flushing on
+every NDJSON line would cost most of the compression. Output is held
+until a flush, so every part sent can be decoded on arrival.
+"""
+import functools
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULTS = {
+    'ENCODINGS': ['zstd', 'br', 'gzip'],
+    'LEVELS': {'gzip': 6, 'br': 4, 'zstd': 3},
+    'MIN_SIZE': 1024,
+    'FLUSH_SIZE': 16 * 1024,
+    # Prefixes of the media types worth compressing
+    'CONTENT_TYPES': [
+        'application/json',
+        'application/x-ndjson',
+        'application/vnd.oai.openapi',
+        'application/javascript',
+        'application/xml',
+        'image/svg+xml',
+        'text/',
+    ],
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'RESPONSE_COMPRESSION', {}).get(
+        name, DEFAULTS[name]
+    )
+
+
+class GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(
+            level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class Encoder:
+    """
+    A content coding at a compression level
+    """
+    streams = {'gzip': GzipStream, 'br': BrotliStream, 'zstd': ZstdStream}
+
+    def __init__(self, name, level, flush_size):
+        self.name = name
+        self.level = level
+        self.flush_size = flush_size
+        self.stream_class = self.streams[name]
+
+    @classmethod
+    def available(cls, name):
+        if name not in cls.streams:
+            raise ImproperlyConfigured(
+                f'Unknown content coding {name!r} in RESPONSE_COMPRESSION.'
+            )
+        installed = {
+            'gzip': True, 'br': brotli is not None,
+            'zstd': zstandard is not None,
+        }
+        return installed[name]
+
+    def compress(self, data):
+        """
+        Compress a whole body
+        :param data:
+        :return:
+        """
+        stream = self.stream_class(self.level)
+        return stream.compress(data) + stream.finish()
+
+    def compress_stream(self, chunks):
+        """
+        Compress an iterable of byte chunks
+        :param chunks:
+        :return:
+        """
+        buffer = _FlushBuffer(self)
+        for chunk in chunks:
+            data = buffer.compress(chunk)
+            if data:
+                yield data
+        yield buffer.finish()
+
+    async def acompress_stream(self, chunks):
+        """
+        Compress an async iterable of byte chunks
+        :param chunks:
+        :return:
+        """
+        buffer = _FlushBuffer(self)
+        async for chunk in chunks:
+            data = buffer.compress(chunk)
+            if data:
+                yield data
+        yield buffer.finish()
+
+
+class _FlushBuffer:
+    """
+    Compressed output of a stream, released only once it is flushed
+    """
+
+    def __init__(self, encoder):
+        self.stream = encoder.stream_class(encoder.level)
+        self.flush_size = encoder.flush_size
+        self.parts = []
+        self.pending = 0
+
+    def compress(self, chunk):
+        """
+        Compress a chunk, returning the output up to the flush it triggers,
+        or b'' while under FLUSH_SIZE
+        :param chunk:
+        :return:
+        """
+        self.parts.append(self.stream.compress(chunk))
+        self.pending += len(chunk)
+        if self.pending < self.flush_size:
+            return b''
+        self.parts.append(self.stream.flush())
+        return self._release()
+
+    def finish(self):
+        self.parts.append(self.stream.finish())
+        return self._release()
+
+    def _release(self):
+        data = b''.join(self.parts)
+        self.parts, self.pending = [], 0
+        return data
+
+
+def load_encoders():
+    """
+    Return the configured encoders that are installed, by name, in the
+    server's order of preference
+    :return:
+    """
+    levels = {**DEFAULTS['LEVELS'], **get_setting('LEVELS')}
+    return {
+        name: Encoder(name, levels[name], get_setting('FLUSH_SIZE'))
+        for name in get_setting('ENCODINGS')
+        if Encoder.available(name)
+    }
+
+
+@functools.lru_cache(maxsize=256)
+def negotiate(accept_encoding, names):
+    """
+    Return the coding of `names` the Accept-Encoding header prefers, or
+    None when it accepts none of them
+    :param accept_encoding: the header value
+    :param names: the server's codings, most preferred first
+    :return:
+    """
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip()] = q
+    best, best_q = None, 0.0
+    for name in names:
+        q = accepted.get(name, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
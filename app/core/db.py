@@ -0,0 +1,81 @@
+"""
+Database connection metrics
+"""
+import threading
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+_lock = threading.Lock()
+_opened = {}
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    with _lock:
+        _opened[connection.alias] = _opened.get(connection.alias, 0) + 1
+    metrics.DB_CONNECTIONS.inc(alias=connection.alias)
+
+
+def connections_opened(alias='default'):
+    """
+    Return how many connections this process has opened to the database;
+    with persistent connections or a pool it should stay near the number
+    of threads
+    :param alias:
+    :return:
+    """
+    return _opened.get(alias, 0)
+
+
+def pool_metrics(stats):
+    """
+    Map psycopg_pool statistics to the metrics we report
+    :param stats:
+    :return:
+    """
+    size = stats.get('pool_size', 0)
+    available = stats.get('pool_available', 0)
+    return {
+        'size': size,
+        'checked_out': size - available,
+        'waiting': stats.get('requests_waiting', 0),
+        'waits': stats.get('requests_queued', 0),
+        'wait_ms': stats.get('requests_wait_ms', 0),
+        'timeouts': stats.get('requests_errors', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+    }
+
+
+def record_pool_metrics():
+    """
+    Report the pools of this process: their connections and waiting
+    requests as gauges, and the waits, timeouts and lost connections since
+    the last report as counters
+    :return:
+    """
+    for alias in connections:
+        # Pools are shared by the threads of a process; reading one does no
+        # I/O, so this is safe on the event loop too.
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is None:
+            continue
+        # pop_stats() resets the counters it returns.
+        stats = pool_metrics(pool.pop_stats())
+        available = stats['size'] - stats['checked_out']
+        metrics.DB_POOL_CONNECTIONS.set(
+            stats['checked_out'], alias=alias, state='checked_out'
+        )
+        metrics.DB_POOL_CONNECTIONS.set(
+            available, alias=alias, state='available'
+        )
+        metrics.DB_POOL_WAITING.set(stats['waiting'], alias=alias)
+        metrics.DB_POOL_WAITS.inc(stats['waits'], alias=alias)
+        metrics.DB_POOL_WAIT_SECONDS.inc(stats['wait_ms'] / 1000, alias=alias)
+        metrics.DB_POOL_TIMEOUTS.inc(stats['timeouts'], alias=alias)
+        metrics.DB_POOL_CONNECTIONS_LOST.inc(
+            stats['connections_lost'], alias=alias
+        )
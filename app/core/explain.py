@@ -0,0 +1,113 @@
+"""
+Query plan checks.
+
+`capture_selects()` records the SELECT statements run on a connection, and
+`sequential_scans()` asks the database how it would run each one. A table
+read in full is reported when it holds more than `min_rows` rows; smaller
+tables are cheaper to scan than to search, so planners rightly do so.
+
+PostgreSQL plans come from `EXPLAIN (FORMAT JSON)` with sequential scans
+disabled, so a small test database still reports every query no index can
+serve; SQLite ones come from `EXPLAIN QUERY PLAN`. Run ANALYZE after
+loading data so the planner knows the table sizes.
+"""
+import json
+import re
+from contextlib import contextmanager
+
+SEQ_SCAN_MIN_ROWS = 1000
+
+# Django aliases tables in subqueries and joins: "core_recipe_tag" U0
+_ALIAS = re.compile(r'"(\w+)"\s+(?:AS\s+)?(\w+)')
+
+
+@contextmanager
+def capture_selects(connection):
+    """
+    Collect the (sql, params) of every SELECT run in the block
+    :param connection:
+    :return:
+    """
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        yield queries
+
+
+def _postgresql_scans(cursor, sql, params):
+    # With sequential scans priced out the planner only picks one when no
+    # index can serve the query, however small the test tables are.
+    cursor.execute('SET enable_seqscan = off')
+    try:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    finally:
+        cursor.execute('RESET enable_seqscan')
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes, tables = [plan[0]['Plan']], []
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan':
+            tables.append(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+    return tables
+
+
+def _sqlite_scans(cursor, sql, params):
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+    aliases = {alias: table for table, alias in _ALIAS.findall(sql)}
+    tables = []
+    for row in cursor.fetchall():
+        detail = row[-1].split()
+        # 'SCAN core_recipe' reads the table; 'SCAN core_recipe USING
+        # INDEX ...' walks an index, like a PostgreSQL index scan.
+        if (len(detail) == 2 and detail[0] == 'SCAN'
+                and detail[1] != 'CONSTANT'):
+            tables.append(aliases.get(detail[1], detail[1]))
+    return tables
+
+
+def scanned_tables(connection, sql, params):
+    """
+    Return the tables the database would read in full to run the query
+    :param connection:
+    :param sql:
+    :param params:
+    :return:
+    """
+    explainers = {'postgresql': _postgresql_scans, 'sqlite': _sqlite_scans}
+    explain = explainers.get(connection.vendor)
+    if explain is None:
+        raise NotImplementedError(
+            f'Query plans are not supported on {connection.vendor}'
+        )
+    with connection.cursor() as cursor:
+        return explain(cursor, sql, params)
+
+
+def sequential_scans(connection, queries, min_rows=SEQ_SCAN_MIN_ROWS):
+    """
+    Return (sql, table, rows) for each full scan of a table holding more
+    than min_rows rows
+    :param connection:
+    :param queries:
+    :param min_rows:
+    :return:
+    """
+    sizes, scans = {}, []
+    for sql, params in queries:
+        for table in scanned_tables(connection, sql, params):
+            if table not in sizes:
+                with connection.cursor() as cursor:
+                    quoted = connection.ops.quote_name(table)
+                    cursor.execute(f'SELECT COUNT(*) FROM {quoted}')
+                    sizes[table] = cursor.fetchone()[0]
+            if sizes[table] > min_rows:
+                scans.append((sql, table, sizes[table]))
+    return scans
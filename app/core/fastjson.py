@@ -0,0 +1,104 @@
+"""
+Fast JSON rendering and parsing for the API.
+
+orjson encodes straight to UTF-8 bytes and decodes several times faster
+than the stdlib json module DRF uses. It is optional: without it `dumps()`
+and `loads()` use the stdlib with DRF's encoder, and the renderer and
+parser behave exactly like DRF's.
+
+Output matches DRF's compact JSONRenderer. Types orjson does not encode
+itself, and datetimes, which DRF encodes to millisecond precision, are
+handed to DRF's JSONEncoder, except Decimal: DRF encodes it as a float,
+which loses digits of values like prices, so it is rendered as a string,
+as DecimalField renders it.
+"""
+import decimal
+import json
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    return _encoder.default(obj)
+
+
+_stdlib_encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+_stdlib_encoder.default = _default
+# DRF escapes these for JSONP and script tags; orjson leaves them as is.
+_UNSAFE = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(data):
+        """
+        Encode data as compact JSON bytes
+        :param data:
+        :return:
+        """
+        try:
+            return orjson.dumps(data, default=_default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Integers wider than 64 bits, mostly; the stdlib encodes them.
+            return _stdlib_encoder.encode(data).encode()
+
+    loads = orjson.loads
+else:
+    def dumps(data):
+        """
+        Encode data as compact JSON bytes
+        :param data:
+        :return:
+        """
+        return _stdlib_encoder.encode(data).encode()
+
+    loads = json.loads
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer encoding with dumps().
+
+    Indented output, asked for by the browsable API or an `indent` media
+    type parameter, is left to DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = dumps(data)
+        for char, escaped in _UNSAFE:
+            if char in ret:
+                ret = ret.replace(char, escaped)
+        return ret
+
+
+class FastJSONParser(parsers.JSONParser):
+    """
+    JSONParser decoding UTF-8 bodies with orjson
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,487 @@
+"""
+Prometheus metrics shared across worker processes.
+
+Every process adds to its own memory mapped file in METRICS['DIR'], one
+double per sample, so recording a value takes a lock, a dict lookup and an
+8 byte write. A scrape of /metrics sums the files of all processes, live
+and dead, and renders the Prometheus text format. Counters and histograms
+sum correctly across processes. Gauges hold a value set by each process,
+such as its pool's checked out connections; the sum is over the live
+processes only.
+
+The gunicorn master empties the directory when it starts and folds the
+file of each worker that exits into `archive.db`, dropping its gauges, so
+the directory does not grow as workers are recycled. Without a directory,
+e.g. under runserver or in tests, values are kept in memory for the one
+process.
+"""
+import fcntl
+import functools
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DEFAULTS = {
+    'DIR': None,
+    'TOKEN': None,
+}
+
+_HEADER = struct.Struct('i')
+_VALUE = struct.Struct('d')
+_INITIAL_SIZE = 64 * 1024
+ARCHIVE = 'archive.db'
+
+
+def get_setting(name):
+    """
+    Return a METRICS setting, falling back to the default
+    :param name:
+    :return:
+    """
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+def _entry(key):
+    """
+    Return the packed length and key of an entry, padded so its value is
+    8 byte aligned
+    """
+    encoded = key.encode()
+    padded = encoded + b' ' * (8 - (_HEADER.size + len(encoded)) % 8)
+    return _HEADER.pack(len(encoded)) + padded
+
+
+def read_file(path):
+    """
+    Yield the (key, value) pairs stored in a metrics file
+    :param path:
+    :return:
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 8:
+        return
+    used = _HEADER.unpack_from(data, 0)[0]
+    position = 8
+    while position < used:
+        length = _HEADER.unpack_from(data, position)[0]
+        start = position + _HEADER.size
+        key = data[start:start + length].decode()
+        position += len(_entry(key))
+        yield key, _VALUE.unpack_from(data, position)[0]
+        position += _VALUE.size
+
+
+class FileStore:
+    """
+    Values of one process in a memory mapped file: an 8 byte header with
+    the bytes used, then entries of a key and a double
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._positions = {}
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(_INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or 8
+        position = 8
+        while position < self._used:
+            length = _HEADER.unpack_from(self._map, position)[0]
+            start = position + _HEADER.size
+            key = self._map[start:start + length].decode()
+            position += len(_entry(key))
+            self._positions[key] = position
+            position += _VALUE.size
+
+    def add(self, key, amount):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        value = _VALUE.unpack_from(self._map, position)[0]
+        _VALUE.pack_into(self._map, position, value + amount)
+
+    def set(self, key, value):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        _VALUE.pack_into(self._map, position, value)
+
+    def _append(self, key):
+        entry = _entry(key)
+        end = self._used + len(entry) + _VALUE.size
+        if end > len(self._map):
+            size = len(self._map)
+            while end > size:
+                size *= 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        self._map[self._used:self._used + len(entry)] = entry
+        position = self._used + len(entry)
+        _VALUE.pack_into(self._map, position, 0.0)
+        # Readers parse up to the header, so it moves last.
+        self._used = end
+        _HEADER.pack_into(self._map, 0, end)
+        self._positions[key] = position
+        return position
+
+    def items(self):
+        return read_file(self.path)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class MemoryStore:
+    """
+    Values of this process only
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def add(self, key, amount):
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        self._values[key] = value
+
+    def items(self):
+        return list(self._values.items())
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def _directory_lock(directory, operation):
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        fcntl.flock(lock, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _escape(value):
+    value = str(value).replace('\\', r'\\').replace('\n', r'\n')
+    return value.replace('"', r'\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """
+    The metrics of the application and the store of this process
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._store = None
+        self._pid = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    @property
+    def store(self):
+        """
+        Return this process' store, opening a new one after a fork
+        :return:
+        """
+        pid = os.getpid()
+        if self._pid != pid:
+            directory = get_setting('DIR')
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+                self._store = FileStore(os.path.join(directory, f'{pid}.db'))
+            else:
+                self._store = MemoryStore()
+            self._pid = pid
+        return self._store
+
+    def add(self, key, amount):
+        with self.lock:
+            self.store.add(key, amount)
+
+    def set(self, key, value):
+        with self.lock:
+            self.store.set(key, value)
+
+    def reset(self):
+        """
+        Forget this process' store; the next value opens a new one
+        :return:
+        """
+        with self.lock:
+            if self._store is not None:
+                self._store.close()
+            self._store = self._pid = None
+
+    def collect(self):
+        """
+        Return the sum of every sample over all processes
+        :return:
+        """
+        directory = get_setting('DIR')
+        if not directory:
+            with self.lock:
+                return dict(self.store.items())
+        totals = {}
+        os.makedirs(directory, exist_ok=True)
+        with _directory_lock(directory, fcntl.LOCK_SH):
+            for path in glob.glob(os.path.join(directory, '*.db')):
+                for key, value in read_file(path):
+                    totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def render(self):
+        """
+        Return all metrics in the Prometheus text format
+        :return:
+        """
+        samples = {}
+        for key, value in self.collect().items():
+            name, suffix, labels = json.loads(key)
+            samples.setdefault(name, []).append(
+                (suffix, tuple(map(tuple, labels)), value)
+            )
+        lines = []
+        for name in sorted(self.metrics):
+            metric = self.metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            lines.extend(metric.render(samples.get(name, [])))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def clear_directory(directory):
+    """
+    Remove the files of earlier processes; run when the master starts,
+    which may already have written to its own while preloading the app
+    :param directory:
+    :return:
+    """
+    os.makedirs(directory, exist_ok=True)
+    own = os.path.join(directory, f'{os.getpid()}.db')
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        if path != own:
+            os.remove(path)
+
+
+def archive_process(directory, pid, registry=None):
+    """
+    Fold the file of an exited process into the archive, so counters keep
+    their totals without a file per recycled worker; its gauges are dropped
+    :param directory:
+    :param pid:
+    :param registry: the registry of the metrics, REGISTRY by default
+    :return:
+    """
+    path = os.path.join(directory, f'{pid}.db')
+    if not os.path.exists(path):
+        return
+    with _directory_lock(directory, fcntl.LOCK_EX):
+        archive = FileStore(os.path.join(directory, ARCHIVE))
+        try:
+            for key, value in read_file(path):
+                metric = (registry or REGISTRY).metrics.get(
+                    json.loads(key)[0]
+                )
+                if not isinstance(metric, Gauge):
+                    archive.add(key, value)
+        finally:
+            archive.close()
+        os.remove(path)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def _labels(self, labels):
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(
+                f'{self.name} takes the labels {", ".join(self.labelnames)}'
+            )
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    @functools.lru_cache(maxsize=4096)
+    def _key(self, suffix, labels):
+        return json.dumps([self.name, suffix, labels], separators=(',', ':'))
+
+
+class Counter(Metric):
+    """
+    A total that only goes up
+    """
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self._key('', self._labels(labels)), amount)
+
+    def render(self, samples):
+        for _, labels, value in sorted(samples):
+            yield f'{self.name}{_format_labels(labels)} {_format_value(value)}'
+
+
+class Gauge(Metric):
+    """
+    A value each process sets, summed over the live processes
+    """
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        self.registry.set(self._key('', self._labels(labels)), value)
+
+    render = Counter.render
+
+
+class Histogram(Metric):
+    """
+    Counts of observations at or below each bucket's upper bound, with
+    their sum
+    """
+    type = 'histogram'
+    DEFAULT_BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0,
+        7.5, 10.0,
+    )
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        bound = next(bound for bound in self.buckets if value <= bound)
+        with self.registry.lock:
+            store = self.registry.store
+            bucket_labels = labels + (('le', _format_value(bound)),)
+            store.add(self._key('_bucket', bucket_labels), 1)
+            store.add(self._key('_sum', labels), value)
+            store.add(self._key('_count', labels), 1)
+
+    def render(self, samples):
+        series = {}
+        for suffix, labels, value in samples:
+            if suffix == '_bucket':
+                *labels, (_, bound) = labels
+                buckets = series.setdefault(tuple(labels), {}).setdefault(
+                    'buckets', {}
+                )
+                buckets[bound] = value
+            else:
+                series.setdefault(labels, {})[suffix] = value
+        for labels in sorted(series):
+            values = series[labels]
+            cumulative = 0
+            for bound in self.buckets:
+                le = _format_value(bound)
+                cumulative += values.get('buckets', {}).get(le, 0)
+                bucket_labels = _format_labels(labels + (('le', le),))
+                yield (
+                    f'{self.name}_bucket{bucket_labels} '
+                    f'{_format_value(cumulative)}'
+                )
+            for suffix in ('_sum', '_count'):
+                yield (
+                    f'{self.name}{suffix}{_format_labels(labels)} '
+                    f'{_format_value(values.get(suffix, 0))}'
+                )
+
+
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time spent serving requests.',
+    ['view', 'method', 'status'],
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Size of response bodies; streamed responses are not counted.', ['view'],
+    buckets=SIZE_BUCKETS,
+)
+DB_QUERIES = Counter(
+    'db_queries_total', 'SQL statements run while serving requests.', ['view']
+)
+DB_QUERY_SECONDS = Counter(
+    'db_query_seconds_total', 'Time spent running SQL while serving requests.',
+    ['view'],
+)
+DB_CONNECTIONS = Counter(
+    'db_connections_opened_total', 'Database connections opened.', ['alias']
+)
+AUTH_TOKEN_CACHE = Counter(
+    'auth_token_cache_total', 'Token lookups by the cache tier that answered.',
+    ['result'],
+)
+RECIPE_LIST_CACHE = Counter(
+    'recipe_list_cache_total',
+    'Recipe list lookups by the cache tier that answered.', ['result'],
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections', 'Connections of the pools by state.',
+    ['alias', 'state'],
+)
+DB_POOL_WAITING = Gauge(
+    'db_pool_waiting_requests',
+    'Requests waiting for a connection from the pools.', ['alias'],
+)
+DB_POOL_WAITS = Counter(
+    'db_pool_waits_total', 'Requests that had to wait for a connection.',
+    ['alias'],
+)
+DB_POOL_WAIT_SECONDS = Counter(
+    'db_pool_wait_seconds_total', 'Time spent waiting for a connection.',
+    ['alias'],
+)
+DB_POOL_TIMEOUTS = Counter(
+    'db_pool_timeouts_total',
+    'Requests for a connection that timed out or failed.', ['alias'],
+)
+DB_POOL_CONNECTIONS_LOST = Counter(
+    'db_pool_connections_lost_total',
+    'Pooled connections found broken and discarded.', ['alias'],
+)
+IMAGE_UPLOADS = Counter(
+    'recipe_image_uploads_total', 'Recipe images uploaded.'
+)
+IMAGE_UPLOAD_BYTES = Counter(
+    'recipe_image_upload_bytes_total', 'Bytes of recipe images uploaded.'
+)
@@ -0,0 +1,243 @@
+"""
+Middleware shared by the API
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.cache import patch_vary_headers
+
+from . import compression, db, metrics, queries, routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Let ReplicaRouter send the reads of safe requests to a replica, and pin
+    a user to the primary after a successful write
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = routers.begin_request(request.method in SAFE_METHODS)
+        try:
+            response = self.get_response(request)
+            user_id = self._writer(request, response)
+            if user_id is not None:
+                routers.pin(user_id)
+            return response
+        finally:
+            routers.end_request(token)
+
+    async def __acall__(self, request):
+        token = routers.begin_request(request.method in SAFE_METHODS)
+        try:
+            response = await self.get_response(request)
+            user_id = self._writer(request, response)
+            if user_id is not None:
+                await routers.apin(user_id)
+            return response
+        finally:
+            routers.end_request(token)
+
+    def _writer(self, request, response):
+        """
+        Return the id of the user who wrote in this request, if any
+        :param request:
+        :param response:
+        :return:
+        """
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        return routers.current_state().user_id
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies with the coding the client prefers; see
+    core/compression.py
+
+    Bodies under MIN_SIZE are passed through before any header is read.
+    Like Django's GZipMiddleware, strong ETags of re-encoded bodies are
+    made weak, since the bytes differ from the identity encoding;
+    ConditionalRequestMixin accepts the weak form in If-Match.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.encoders = compression.load_encoders()
+        self.names = tuple(self.encoders)
+        self.min_size = compression.get_setting('MIN_SIZE')
+        self.content_types = tuple(compression.get_setting('CONTENT_TYPES'))
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+        if not self.names or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').lower()
+        if not content_type.startswith(self.content_types):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        name = compression.negotiate(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), self.names
+        )
+        if name is None:
+            return response
+        encoder = self.encoders[name]
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = encoder.acompress_stream(
+                    response.streaming_content
+                )
+            else:
+                response.streaming_content = encoder.compress_stream(
+                    response.streaming_content
+                )
+            del response['Content-Length']
+        else:
+            compressed = encoder.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = name
+        return response
+
+
+class QueryBudgetMiddleware:
+    """
+    Record the queries of each request, report them in a Server-Timing
+    header and the `core.queries` log, and check them against the view's
+    query_budget.
+
+    Under ASGI the execute wrappers are installed in the thread where the
+    async views' ORM calls run, so those are recorded too, while the
+    middleware chain itself stays on the event loop. Queries run while a
+    streaming response is consumed are not.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with queries.record_queries() as recorder:
+            response = self.get_response(request)
+        return self._report(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        async with queries.arecord_queries() as recorder:
+            response = await self.get_response(request)
+        return self._report(request, response, recorder, started)
+
+    def _report(self, request, response, recorder, started):
+        request._query_recorder = recorder
+        if queries.get_setting('SERVER_TIMING'):
+            response['Server-Timing'] = queries.server_timing(
+                recorder, time.perf_counter() - started
+            )
+        queries.check_budget(
+            request, recorder, getattr(request, '_query_budget', None)
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = queries.get_budget(view_func, request.method)
+
+
+METHODS = ('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def view_label(request, view_func):
+    """
+    Return the metrics label of a view: viewset and action for DRF views,
+    the URL name otherwise
+    :param request:
+    :param view_func:
+    :return:
+    """
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return request.resolver_match.view_name
+    actions = getattr(view_func, 'actions', None)
+    if actions is None:
+        return view_class.__name__
+    action = actions.get(request.method.lower(), 'other')
+    return f'{view_class.__name__}.{action}'
+
+
+class MetricsMiddleware:
+    """
+    Record each request's latency, response size and queries by view,
+    and the state of this process' connection pools after it
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        return self._observe(request, response, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        return self._observe(request, response, started)
+
+    def _observe(self, request, response, started):
+        view = getattr(request, '_metrics_view', 'unmatched')
+        metrics.REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            view=view,
+            method=request.method if request.method in METHODS else 'other',
+            status=f'{response.status_code // 100}xx',
+        )
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.observe(len(response.content), view=view)
+        recorder = getattr(request, '_query_recorder', None)
+        if recorder is not None:
+            metrics.DB_QUERIES.inc(recorder.count, view=view)
+            metrics.DB_QUERY_SECONDS.inc(recorder.duration, view=view)
+        db.record_pool_metrics()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = view_label(request, view_func)
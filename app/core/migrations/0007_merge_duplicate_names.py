@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 17:17
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """
+    Merge tags and ingredients sharing a (user, name) pair into the oldest row
+    so the unique constraints can be added.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, relation in (('Tag', 'tag'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        fk_name = f'{model_name.lower()}_id'
+        duplicates = (
+            model.objects.values('user', 'name')
+            .annotate(keep_id=Min('id'), total=Count('id'))
+            .filter(total__gt=1)
+        )
+        for duplicate in duplicates:
+            stale_ids = list(
+                model.objects.filter(user=duplicate['user'], name=duplicate['name'])
+                .exclude(id=duplicate['keep_id'])
+                .values_list('id', flat=True)
+            )
+            linked_recipes = set(
+                through.objects.filter(**{f'{fk_name}__in': stale_ids})
+                .values_list('recipe_id', flat=True)
+            )
+            linked_recipes -= set(
+                through.objects.filter(**{fk_name: duplicate['keep_id']})
+                .values_list('recipe_id', flat=True)
+            )
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{fk_name: duplicate['keep_id']})
+                for recipe_id in linked_recipes
+            ])
+            model.objects.filter(id__in=stale_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 18:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index the auto-created M2M through tables from the tag/ingredient side,
+    covering the recipe id so EXISTS filters never touch the heap.
+    """
+
+    dependencies = [
+        ('core', '0009_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_tag_tag_recipe_idx ON core_recipe_tag (tag_id, recipe_id)',
+            'DROP INDEX core_recipe_tag_tag_recipe_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_ingredients_ingredient_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id)',
+            'DROP INDEX core_recipe_ingredients_ingredient_recipe_idx',
+        ),
+    ]
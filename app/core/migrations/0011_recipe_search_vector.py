@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 17:40
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POPULATE_SQL = """
+UPDATE core_recipe r SET search_vector =
+    setweight(to_tsvector('english', coalesce(r.title, '')), 'A')
+    || setweight(to_tsvector('english', coalesce(r.description, '')), 'B')
+    || setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(i.name, ' ')
+        FROM core_ingredient i
+        JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+        WHERE ri.recipe_id = r.id
+    ), '')), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Populate the search vectors and add the GIN index on PostgreSQL only
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(POPULATE_SQL)
+    schema_editor.execute('CREATE INDEX recipe_search_vector_idx ON core_recipe USING GIN (search_vector)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_through_table_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
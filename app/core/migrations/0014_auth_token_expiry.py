@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 17:54
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_auth_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authtoken',
+            name='device',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='authtoken',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=core.models.token_expiry),
+        ),
+        migrations.AddConstraint(
+            model_name='authtoken',
+            constraint=models.UniqueConstraint(condition=models.Q(('device', ''), _negated=True), fields=('user', 'device'), name='unique_token_device_per_user'),
+        ),
+    ]
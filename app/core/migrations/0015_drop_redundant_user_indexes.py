@@ -0,0 +1,93 @@
+# Generated by Django 5.2 on 2026-10-18 19:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+THROUGH_TABLES = [
+    ('Recipe', 'tag'),
+    ('Recipe', 'ingredients'),
+]
+
+
+def _through_fields(apps):
+    for model_name, field_name in THROUGH_TABLES:
+        model = apps.get_model('core', model_name)
+        through = model._meta.get_field(field_name).remote_field.through
+        for field in through._meta.local_fields:
+            if field.is_relation:
+                yield through, field
+
+
+def drop_through_indexes(apps, schema_editor):
+    """
+    Drop the single column indexes of the through tables. The unique
+    (recipe_id, <related>_id) constraint and the indexes of 0010 lead with
+    each column, and every import writes these tables.
+
+    The auto-created through models have no migration state of their own,
+    so RemoveIndex cannot reach them; their indexes are looked up by
+    column instead, since Django derives the names from a hash.
+    """
+    introspection = schema_editor.connection.introspection
+    for through, field in _through_fields(apps):
+        with schema_editor.connection.cursor() as cursor:
+            constraints = introspection.get_constraints(
+                cursor, through._meta.db_table
+            )
+        for name, constraint in constraints.items():
+            if (constraint['index'] and not constraint['unique']
+                    and constraint['columns'] == [field.column]):
+                schema_editor.remove_index(
+                    through, models.Index(fields=[field.name], name=name)
+                )
+
+
+def create_through_indexes(apps, schema_editor):
+    for through, field in _through_fields(apps):
+        name = f'{through._meta.db_table}_{field.column}_idx'
+        schema_editor.add_index(
+            through, models.Index(fields=[field.name], name=name)
+        )
+
+
+class Migration(migrations.Migration):
+    """
+    Drop indexes covered by the composite indexes that lead with the same
+    column; they only cost writes and cache space.
+    """
+
+    dependencies = [
+        ('core', '0014_auth_token_expiry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingredient',
+            name='user',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='user',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='user',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(drop_through_indexes, create_through_indexes),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+POPULATE_SQL = """
+UPDATE core_recipe SET
+    tag_count = (
+        SELECT count(*) FROM core_recipe_tag rt
+        WHERE rt.recipe_id = core_recipe.id
+    ),
+    ingredient_count = (
+        SELECT count(*) FROM core_recipe_ingredients ri
+        WHERE ri.recipe_id = core_recipe.id
+    ),
+    tag_names = {names}(
+        SELECT t.name FROM core_tag t
+        JOIN core_recipe_tag rt ON rt.tag_id = t.id
+        WHERE rt.recipe_id = core_recipe.id
+        ORDER BY t.id
+    ){end},
+    ingredient_names = {names}(
+        SELECT i.name FROM core_ingredient i
+        JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+        WHERE ri.recipe_id = core_recipe.id
+        ORDER BY i.id
+    ){end}
+"""
+
+# How each database turns the ordered names into a JSON array.
+NAME_ARRAYS = {
+    'postgresql': ('TO_JSONB(ARRAY', ')'),
+    'sqlite': ('(SELECT JSON_GROUP_ARRAY(name) FROM ', ')'),
+}
+
+
+def populate_summaries(apps, schema_editor):
+    """
+    Compute the summaries of existing recipes, on the databases whose JSON
+    array functions are known
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor not in NAME_ARRAYS:
+        return
+    names, end = NAME_ARRAYS[vendor]
+    schema_editor.execute(POPULATE_SQL.format(names=names, end=end))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_drop_redundant_user_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_names',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_names',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,16 @@
+import hashlib
 import os
+import secrets
 import uuid
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.contrib.auth.models import PermissionsMixin
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.db.models import ManyToManyField
+from django.utils import timezone
 
 
 # Create your models here.
@@ -59,31 +64,227 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+def token_lifetime():
+    """
+    Return how long a token stays valid after its last renewal
+    :return:
+    """
+    return getattr(settings, 'AUTH_TOKEN_LIFETIME', timedelta(days=14))
+
+
+def token_expiry():
+    """
+    Return the expiry of a token issued or renewed now
+    :return:
+    """
+    return timezone.now() + token_lifetime()
+
+
+class AuthTokenManager(models.Manager):
+    """
+    Manager issuing authentication tokens
+    """
+
+    @transaction.atomic
+    def create_token(self, user, device=''):
+        """
+        Create a token for the user and return it with its key; the key is
+        only available here, the database keeps its digest. A named device
+        holds one token, so logging in again from it rotates the token.
+        :param user:
+        :param device:
+        :return:
+        """
+        if device:
+            self.filter(user=user, device=device).delete()
+        key = secrets.token_hex(20)
+        token = self.create(
+            user=user, device=device, digest=AuthToken.hash_key(key)
+        )
+        return token, key
+
+    def expired(self):
+        """
+        Return the tokens past their expiry
+        :return:
+        """
+        return self.filter(expires_at__lte=timezone.now())
+
+
+class AuthToken(models.Model):
+    """
+    API authentication token, stored as the SHA-256 digest of its key
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='auth_tokens',
+    )
+    device = models.CharField(max_length=64, blank=True, default='')
+    created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=token_expiry, db_index=True)
+
+    objects = AuthTokenManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'device'],
+                condition=~models.Q(device=''),
+                name='unique_token_device_per_user',
+            ),
+        ]
+
+    @staticmethod
+    def hash_key(key):
+        """
+        Return the digest stored for a token key
+        :param key:
+        :return:
+        """
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def is_expired(self, now=None):
+        """
+        Return whether the token is past its expiry
+        :param now:
+        :return:
+        """
+        return self.expires_at <= (now or timezone.now())
+
+    def __str__(self):
+        return f'{self.user} {self.device or ""} ({self.digest[:8]})'
+
+
+class NamedObjectManager(models.Manager):
+    """
+    Manager for per-user objects identified by their name
+    """
+
+    def resolve_names(self, user, names):
+        """
+        Return a mapping of name to object for the user, creating the
+        missing names with a single bulk insert.
+        :param user:
+        :param names:
+        :return:
+        """
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        objects = {
+            obj.name: obj for obj in self.filter(user=user, name__in=names)
+        }
+        missing = [name for name in names if name not in objects]
+        if missing:
+            # Rows inserted by a concurrent request are skipped on conflict
+            # and picked up by the follow-up lookup.
+            self.bulk_create(
+                [self.model(user=user, name=name) for name in missing],
+                ignore_conflicts=True,
+            )
+            created = self.filter(user=user, name__in=missing)
+            objects.update({obj.name: obj for obj in created})
+        return objects
+
 
 class Recipe(models.Model):
     """
     Custom recipe model
     """
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+
+    class ImageStatus(models.TextChoices):
+        NONE = 'none', 'No image'
+        PENDING = 'pending', 'Pending'
+        PROCESSING = 'processing', 'Processing'
+        READY = 'ready', 'Ready'
+        FAILED = 'failed', 'Failed'
+
+    # Indexed by recipe_user_id_idx, which leads with the user.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False
+    )
     title = models.CharField(max_length=255)
     time_minutes = models.IntegerField()
     description = models.TextField(null=True, blank=True)
     price = models.DecimalField(decimal_places=2, max_digits=10)
     link = models.URLField(null=True, blank=True)
     image = models.ImageField(upload_to=recipe_image_path, null=True, blank=True)
+    image_status = models.CharField(
+        max_length=20, choices=ImageStatus.choices, default=ImageStatus.NONE
+    )
+    image_renditions = models.JSONField(default=dict, blank=True)
     tag = ManyToManyField('Tag', related_name='recipes')
     ingredients = ManyToManyField('Ingredient', related_name='recipes')
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by recipe.search; the GIN index is created by migration on
+    # PostgreSQL only.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Summaries of the tags and ingredients, maintained by recipe.summary.
+    SUMMARY_FIELDS = (
+        'tag_count', 'ingredient_count', 'tag_names', 'ingredient_names',
+    )
+    tag_count = models.PositiveIntegerField(default=0, editable=False)
+    ingredient_count = models.PositiveIntegerField(default=0, editable=False)
+    tag_names = models.JSONField(default=list, blank=True, editable=False)
+    ingredient_names = models.JSONField(
+        default=list, blank=True, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        """
+        Save the recipe, leaving the summaries of an existing row to the
+        SQL updates maintaining them, so an instance loaded before a change
+        of its tags or ingredients does not write the old ones back
+        """
+        if (
+            not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.SUMMARY_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
 
 class Tag(models.Model):
     """
     Custom tags model
     """
     name = models.CharField(max_length=255)
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Indexed by tag_user_name_idx, which leads with the user.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = NamedObjectManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name', '-id'], name='tag_user_name_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='unique_tag_name_per_user'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -93,9 +294,27 @@ class Ingredient(models.Model):
     """
     Custom ingredient model
     """
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Indexed by ingredient_user_name_idx, which leads with the user.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False
+    )
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = NamedObjectManager()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-name', '-id'],
+                name='ingredient_user_name_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='unique_ingredient_name_per_user'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -0,0 +1,194 @@
+"""
+Per-request SQL instrumentation.
+
+QueryRecorder is installed with `connection.execute_wrapper()` on every
+database alias and counts the statements run, their total time and the
+repeated ones: `duplicates` are identical statements with identical
+parameters, `similar` ones share the SQL but not the parameters, which is
+what an N+1 looks like. Transaction control statements sent as SQL,
+like savepoints and SQLite's BEGIN, are not counted.
+
+Views declare their budget in `query_budget`, either one number or a
+number per action (per lower-case method for views that are not
+viewsets). QueryBudgetMiddleware reports every request in a Server-Timing
+header and in the `core.queries` log, and raises QueryBudgetExceeded when
+QUERY_BUDGET['ENFORCE'] is set, as it is for CI; otherwise an overrun is
+logged as a warning.
+"""
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENFORCE': False,
+    'SERVER_TIMING': True,
+}
+
+_TRANSACTION_CONTROL = (
+    'BEGIN', 'START TRANSACTION',
+    'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT',
+)
+
+
+def get_setting(name):
+    """
+    Return a QUERY_BUDGET setting, falling back to the default
+    :param name:
+    :return:
+    """
+    return getattr(settings, 'QUERY_BUDGET', {}).get(name, DEFAULTS[name])
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    A view ran more queries than its budget
+    """
+
+
+class QueryRecorder:
+    """
+    Execute wrapper counting statements, their time and repetitions
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self._statements = Counter()
+        self._templates = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(_TRANSACTION_CONTROL):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self._templates[sql] += 1
+            try:
+                self._statements[sql, repr(params)] += 1
+            except TypeError:
+                pass
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self._statements.values())
+
+    @property
+    def similar(self):
+        return sum(count - 1 for count in self._templates.values())
+
+    def repeated(self):
+        """
+        Return the statements run more than once, most repeated first
+        :return:
+        """
+        return [
+            (sql, count) for sql, count in self._templates.most_common()
+            if count > 1
+        ]
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'db_ms': round(self.duration * 1000, 3),
+            'duplicates': self.duplicates,
+            'similar': self.similar,
+        }
+
+
+@contextmanager
+def record_queries():
+    """
+    Record the queries run in the block on every database, in this thread
+    :return:
+    """
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+@asynccontextmanager
+async def arecord_queries():
+    """
+    Async version of record_queries(), recording in the thread where the
+    async ORM and other thread sensitive calls run
+    :return:
+    """
+    recording = record_queries()
+    recorder = await sync_to_async(recording.__enter__)()
+    try:
+        yield recorder
+    finally:
+        await sync_to_async(recording.__exit__)(None, None, None)
+
+
+def get_budget(view_func, method):
+    """
+    Return the query budget a view declares for the request method, or None
+    :param view_func:
+    :param method:
+    :return:
+    """
+    view_class = getattr(view_func, 'cls', None)
+    budget = getattr(view_class, 'query_budget', None)
+    if not isinstance(budget, dict):
+        return budget
+    actions = getattr(view_func, 'actions', None)
+    if actions is not None:
+        return budget.get(actions.get(method.lower()))
+    return budget.get(method.lower())
+
+
+def server_timing(recorder, total):
+    """
+    Return the Server-Timing header value for a request
+    :param recorder:
+    :param total: seconds spent on the request
+    :return:
+    """
+    return (
+        f'db;dur={recorder.duration * 1000:.3f};'
+        f'desc="{recorder.count} queries, {recorder.duplicates} duplicates", '
+        f'total;dur={total * 1000:.3f}'
+    )
+
+
+def check_budget(request, recorder, budget):
+    """
+    Log the request's queries and handle a budget overrun
+    :param request:
+    :param recorder:
+    :param budget:
+    :return:
+    """
+    details = {
+        'method': request.method, 'path': request.path, 'budget': budget,
+        **recorder.as_dict(),
+    }
+    if budget is None or recorder.count <= budget:
+        logger.info(
+            'queries %s', json.dumps(details), extra={'queries': details}
+        )
+        return
+    message = (
+        f'{request.method} {request.path} ran {recorder.count} queries, '
+        f'over its budget of {budget}; '
+        f'repeated: {recorder.repeated()[:3]}'
+    )
+    if get_setting('ENFORCE'):
+        raise QueryBudgetExceeded(message)
+    logger.warning(
+        '%s %s', message, json.dumps(details), extra={'queries': details}
+    )
@@ -0,0 +1,237 @@
+"""
+Read-replica routing.
+
+Queries made while serving a safe (GET, HEAD, OPTIONS) request go to one of
+DATABASE_REPLICAS; everything else, including work outside a request such
+as management commands and image processing, stays on the primary.
+
+A user who has just written is pinned to the primary for
+REPLICA_ROUTING['PIN_SECONDS'], so they read their own writes while the
+replicas catch up. The pin lives in the shared cache, so the user's next
+request finds it whichever process serves it; app/caches.py fails
+configuration when replicas are set without one. It is checked once per
+request, when the user is authenticated.
+
+A replica that can not be connected to is skipped by this process for
+REPLICA_ROUTING['RETRY_SECONDS']; when none is left reads fall back to the
+primary.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import SynchronousOnlyOperation
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',
+    'PIN_SECONDS': 10,
+    'RETRY_SECONDS': 30,
+    # Read from the primary even in safe requests; token lookups must see
+    # a token the moment it is issued.
+    'PRIMARY_MODELS': ['core.AuthToken'],
+}
+
+_state = ContextVar('replica_routing', default=None)
+_down_until = {}
+
+
+def get_setting(name):
+    """
+    Return a REPLICA_ROUTING setting, falling back to the default
+    :param name:
+    :return:
+    """
+    return getattr(settings, 'REPLICA_ROUTING', {}).get(name, DEFAULTS[name])
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class RoutingState:
+    """
+    Routing decisions for the request being served
+    """
+
+    def __init__(self, read_only):
+        self.read_only = read_only
+        self.user_id = None
+        self.pinned = False
+        self.replica = None
+
+
+def begin_request(read_only):
+    """
+    Start routing the current request; return a token for end_request()
+    :param read_only:
+    :return:
+    """
+    return _state.set(RoutingState(read_only))
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def current_state():
+    return _state.get()
+
+
+def _pin_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+def _cache():
+    return caches[get_setting('CACHE_ALIAS')]
+
+
+def _needs_pin_check(state):
+    return (
+        state is not None and state.read_only and state.user_id is None
+        and bool(replicas())
+    )
+
+
+def bind_user(user_id):
+    """
+    Record the authenticated user of the current request, pinning a safe
+    request to the primary if the user wrote recently
+    :param user_id:
+    :return:
+    """
+    state = _state.get()
+    if _needs_pin_check(state):
+        state.pinned = _cache().get(_pin_key(user_id)) is not None
+    if state is not None:
+        state.user_id = user_id
+
+
+async def abind_user(user_id):
+    """
+    Async version of bind_user()
+    :param user_id:
+    :return:
+    """
+    state = _state.get()
+    if _needs_pin_check(state):
+        state.pinned = await _cache().aget(_pin_key(user_id)) is not None
+    if state is not None:
+        state.user_id = user_id
+
+
+def pin(user_id):
+    """
+    Send the user's reads to the primary for the next PIN_SECONDS
+    :param user_id:
+    :return:
+    """
+    if replicas():
+        _cache().set(_pin_key(user_id), 1, timeout=get_setting('PIN_SECONDS'))
+
+
+async def apin(user_id):
+    """
+    Async version of pin()
+    :param user_id:
+    :return:
+    """
+    if replicas():
+        await _cache().aset(
+            _pin_key(user_id), 1, timeout=get_setting('PIN_SECONDS')
+        )
+
+
+def mark_down(alias, now=None):
+    """
+    Stop routing reads to the replica for RETRY_SECONDS
+    :param alias:
+    :param now:
+    :return:
+    """
+    now = now or time.monotonic()
+    _down_until[alias] = now + get_setting('RETRY_SECONDS')
+
+
+def is_down(alias, now=None):
+    until = _down_until.get(alias)
+    if until is None:
+        return False
+    if (now or time.monotonic()) >= until:
+        _down_until.pop(alias, None)
+        return False
+    return True
+
+
+def replica_status():
+    """
+    Return whether each replica is in use by this process
+    :return:
+    """
+    return {alias: 'down' if is_down(alias) else 'up' for alias in replicas()}
+
+
+def _connect(alias):
+    """
+    Open a connection to the replica unless one is open; return False and
+    mark the replica down if that fails
+    :param alias:
+    :return:
+    """
+    connection = connections[alias]
+    if connection.connection is not None:
+        return True
+    try:
+        connection.ensure_connection()
+    except SynchronousOnlyOperation:
+        # Called from the event loop; the query itself will connect.
+        return True
+    except DatabaseError:
+        mark_down(alias)
+        return False
+    return True
+
+
+def choose_replica():
+    """
+    Return a healthy replica, or the primary when none is left
+    :return:
+    """
+    candidates = [alias for alias in replicas() if not is_down(alias)]
+    random.shuffle(candidates)
+    for alias in candidates:
+        if _connect(alias):
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """
+    Send reads of safe requests to a replica and everything else to the
+    primary. A request sticks to the replica it first picked, so all of
+    its reads see the same snapshot lag.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.read_only or state.pinned:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label in get_setting('PRIMARY_MODELS'):
+            return DEFAULT_DB_ALIAS
+        if state.replica is None or is_down(state.replica):
+            state.replica = choose_replica()
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,43 @@
+"""
+Testing cache settings
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from app.caches import LOCAL_BACKEND, cache_config
+
+
+class CacheConfigTests(SimpleTestCase):
+    """
+    Test the cache settings built from the environment
+    """
+
+    def test_local_for_one_process(self):
+        self.assertEqual(cache_config({}), {'BACKEND': LOCAL_BACKEND})
+
+    def test_redis(self):
+        config = cache_config(
+            {'REDIS_URL': 'redis://cache:6379/0', 'SERVER_PROCESSES': '4'}
+        )
+        self.assertEqual(config['LOCATION'], 'redis://cache:6379/0')
+        self.assertTrue(config['BACKEND'].endswith('RedisCache'))
+
+    def test_processes_need_a_shared_cache(self):
+        """
+        Test more than one process fails without REDIS_URL
+        :return:
+        """
+        with self.assertRaises(ImproperlyConfigured):
+            cache_config({'SERVER_PROCESSES': '4'})
+
+    def test_replicas_need_a_shared_cache(self):
+        """
+        Test read replicas fail without REDIS_URL
+        :return:
+        """
+        with self.assertRaises(ImproperlyConfigured):
+            cache_config({}, replicas=['replica_1'])
+        config = cache_config(
+            {'REDIS_URL': 'redis://cache:6379/0'}, replicas=['replica_1']
+        )
+        self.assertTrue(config['BACKEND'].endswith('RedisCache'))
@@ -0,0 +1,158 @@
+"""
+Testing negotiated response compression
+"""
+import gzip
+import json
+import zlib
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import compression
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class NegotiationTests(SimpleTestCase):
+    """
+    Test the Accept-Encoding header is negotiated
+    """
+
+    def test_negotiate(self):
+        names = ('zstd', 'br', 'gzip')
+        cases = [
+            ('gzip, deflate, br', 'br'),
+            ('gzip;q=1.0, br;q=0.5', 'gzip'),
+            ('GZIP', 'gzip'),
+            ('*', 'zstd'),
+            ('*;q=0.5, zstd;q=0, br;q=0', 'gzip'),
+            ('identity', None),
+            ('gzip;q=0', None),
+            ('gzip;q=oops', None),
+            ('', None),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(
+                    compression.negotiate(header, names), expected
+                )
+
+    def test_stream_flushes(self):
+        """
+        Test a stream is flushed every FLUSH_SIZE bytes and decompresses
+        to its input
+        :return:
+        """
+        encoder = compression.Encoder('gzip', 6, flush_size=100)
+        chunks = [b'{"id": %d, "title": "Soup"}\n' % i for i in range(100)]
+
+        parts = list(encoder.compress_stream(iter(chunks)))
+
+        self.assertGreater(len(parts), 10)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertTrue(decompressor.decompress(parts[0]))
+        self.assertEqual(gzip.decompress(b''.join(parts)), b''.join(chunks))
+
+    @override_settings(RESPONSE_COMPRESSION={'ENCODINGS': ['deflate']})
+    def test_unknown_coding(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compression.load_encoders()
+
+
+@override_settings(
+    RESPONSE_COMPRESSION={'ENCODINGS': ['gzip'], 'MIN_SIZE': 1024}
+)
+class CompressionMiddlewareTests(TestCase):
+    """
+    Test API responses are compressed
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        Recipe.objects.bulk_create([
+            Recipe(
+                user=self.user, title=f'Recipe {i}', time_minutes=i,
+                price=Decimal('5.50'),
+            )
+            for i in range(count)
+        ])
+
+    def test_list_compressed(self):
+        self._create_recipes(30)
+
+        res = self.client.get(
+            RECIPES_URL, {'page_size': 30}, HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertEqual(int(res['Content-Length']), len(res.content))
+        data = json.loads(gzip.decompress(res.content))
+        self.assertEqual(len(data['results']), 30)
+
+    def test_not_accepted(self):
+        self._create_recipes(30)
+
+        res = self.client.get(RECIPES_URL, {'page_size': 30})
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertEqual(len(res.json()['results']), 30)
+
+    def test_small_response_untouched(self):
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertNotIn('Accept-Encoding', res.get('Vary', ''))
+
+    def test_etag_weakened(self):
+        """
+        Test compressed bodies carry a weak ETag that If-None-Match and
+        If-Match still accept
+        :return:
+        """
+        self._create_recipes(30)
+        recipe = Recipe.objects.filter(user=self.user).first()
+        recipe.description = 'Simmer slowly. ' * 100
+        recipe.save()
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+
+        res = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        etag = res['ETag']
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertTrue(etag.startswith('W/"'))
+        res = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        res = self.client.patch(url, {'title': 'New'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.patch(url, {'title': 'Newer'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_streaming_export(self):
+        self._create_recipes(50)
+
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertFalse(res.has_header('Content-Length'))
+        lines = (
+            gzip.decompress(b''.join(res.streaming_content))
+            .decode()
+            .splitlines()
+        )
+        self.assertEqual(len(lines), 50)
@@ -0,0 +1,134 @@
+"""
+Testing database connection settings and metrics
+"""
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase
+
+from app.database import database_config
+from core import db, metrics
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    """
+    Test the database settings built from the environment
+    """
+
+    def test_persistent_connections_by_default(self):
+        """
+        Test connections persist and are health checked by default
+        :return:
+        """
+        config = database_config({'DB_NAME': 'app'})
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('pool', config['OPTIONS'])
+
+    def test_async_reads_disable_persistence(self):
+        """
+        Test persistent connections are disabled under ASGI
+        :return:
+        """
+        config = database_config(
+            {'API_ASYNC_READS': '1', 'DB_CONN_MAX_AGE': '300'}
+        )
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+    @mock.patch('app.database.find_spec', return_value=object())
+    def test_pool(self, find_spec):
+        """
+        Test the pool replaces persistent connections
+        :return:
+        """
+        config = database_config(
+            {'DB_POOL': '1', 'DB_POOL_MAX_SIZE': '20', 'API_ASYNC_READS': '1'}
+        )
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 20)
+        self.assertEqual(config['OPTIONS']['pool']['min_size'], 2)
+
+    @mock.patch('app.database.find_spec', return_value=None)
+    def test_pool_needs_psycopg3(self, find_spec):
+        """
+        Test the pool fails configuration without psycopg 3
+        :return:
+        """
+        with self.assertRaises(ImproperlyConfigured):
+            database_config({'DB_POOL': '1'})
+
+    @mock.patch('django.VERSION', (4, 2, 17, 'final', 0))
+    def test_pool_needs_django_5_1(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_config({'DB_POOL': '1'})
+
+
+class ConnectionMetricsTests(SimpleTestCase):
+    """
+    Test connection metrics
+    """
+
+    def test_pool_metrics(self):
+        """
+        Test psycopg_pool statistics are mapped to our metrics
+        :return:
+        """
+        metrics = db.pool_metrics({
+            'pool_size': 10,
+            'pool_available': 4,
+            'requests_waiting': 2,
+            'requests_queued': 7,
+            'requests_wait_ms': 130,
+            'requests_errors': 1,
+        })
+        self.assertEqual(metrics['checked_out'], 6)
+        self.assertEqual(metrics['waits'], 7)
+        self.assertEqual(metrics['timeouts'], 1)
+        self.assertEqual(metrics['connections_lost'], 0)
+
+    def test_opened_connections_counted(self):
+        """
+        Test new connections are counted per alias
+        :return:
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = {
+                **connection.settings_dict,
+                'NAME': os.path.join(directory, 'db.sqlite3'),
+            }
+            wrapper = DatabaseWrapper(settings_dict, alias='metrics-test')
+            wrapper.ensure_connection()
+            wrapper.close()
+            wrapper.ensure_connection()
+            wrapper.close()
+        self.assertEqual(db.connections_opened('metrics-test'), 2)
+
+    def test_pool_exported(self):
+        """
+        Test pool statistics are reported as metrics
+        :return:
+        """
+        pool = mock.Mock()
+        pool.pop_stats.return_value = {
+            'pool_size': 10, 'pool_available': 4, 'requests_waiting': 2,
+            'requests_queued': 7, 'requests_wait_ms': 1500,
+        }
+        pooled = {
+            'pooled': SimpleNamespace(pool=pool),
+            'unpooled': SimpleNamespace(pool=None),
+        }
+        with mock.patch.object(db, 'connections', pooled):
+            db.record_pool_metrics()
+
+        output = metrics.REGISTRY.render()
+        self.assertIn(
+            'db_pool_connections{alias="pooled",state="checked_out"} 6', output
+        )
+        self.assertIn('db_pool_waiting_requests{alias="pooled"} 2', output)
+        self.assertIn('db_pool_wait_seconds_total{alias="pooled"} 1.5', output)
+        self.assertNotIn('alias="unpooled"', output)
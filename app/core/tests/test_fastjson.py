@@ -0,0 +1,123 @@
+"""
+Testing the fast JSON renderer and parser
+"""
+import datetime
+import io
+import uuid
+from decimal import Decimal
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core import fastjson
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """
+    Test rendering matches DRF's JSONRenderer
+    """
+
+    def setUp(self):
+        self.renderer = fastjson.FastJSONRenderer()
+
+    def test_matches_drf(self):
+        data = {
+            'id': 1,
+            'title': 'Crème brûlée',
+            'price': '5.50',
+            'tags': [{'id': 2, 'name': 'dessert'}],
+            'link': None,
+            'ready': True,
+            'created': datetime.datetime(
+                2024, 5, 1, 12, 30, 0, 123456, tzinfo=datetime.timezone.utc
+            ),
+            'day': datetime.date(2024, 5, 1),
+            'uuid': uuid.UUID(int=1),
+            'label': gettext_lazy('Recipes'),
+            1: 'integer key',
+        }
+
+        self.assertEqual(
+            self.renderer.render(data), JSONRenderer().render(data)
+        )
+
+    def test_decimal_keeps_digits(self):
+        data = {'price': Decimal('12345678901234567.01')}
+
+        self.assertEqual(
+            self.renderer.render(data), b'{"price":"12345678901234567.01"}'
+        )
+
+    def test_escapes_line_separators(self):
+        data = {'description': 'one\u2028two\u2029'}
+
+        self.assertEqual(
+            self.renderer.render(data), JSONRenderer().render(data)
+        )
+
+    def test_big_integer(self):
+        data = {'id': 2 ** 70}
+
+        self.assertEqual(
+            self.renderer.render(data), JSONRenderer().render(data)
+        )
+
+    def test_indent_left_to_drf(self):
+        data = {'id': 1}
+
+        self.assertEqual(
+            self.renderer.render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+    def test_none(self):
+        self.assertEqual(self.renderer.render(None), b'')
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """
+    Test parsing matches DRF's JSONParser
+    """
+
+    def setUp(self):
+        self.parser = fastjson.FastJSONParser()
+
+    def test_parse(self):
+        body = '{"title": "Crème", "price": "5.50", "tags": [1, 2]}'.encode()
+
+        self.assertEqual(
+            self.parser.parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(body)),
+        )
+
+    def test_parse_error(self):
+        for body in (b'', b'{"title": ', b'{"a": NaN}'):
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                self.parser.parse(io.BytesIO(body))
+
+    def test_other_charset(self):
+        body = '{"title": "Crème"}'.encode('latin-1')
+
+        data = self.parser.parse(
+            io.BytesIO(body), parser_context={'encoding': 'latin-1'}
+        )
+
+        self.assertEqual(data, {'title': 'Crème'})
+
+    @skipIf(fastjson.orjson is None, 'orjson is not installed')
+    def test_without_orjson(self):
+        """
+        Test the parser falls back to DRF without orjson
+        :return:
+        """
+        with patch.object(fastjson, 'orjson', None):
+            self.assertEqual(
+                self.parser.parse(io.BytesIO(b'{"a": 1}')), {'a': 1}
+            )
+            with self.assertRaises(ParseError):
+                self.parser.parse(io.BytesIO(b'{"a": NaN}'))
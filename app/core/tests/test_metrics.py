@@ -0,0 +1,222 @@
+"""
+Testing the metrics store and the /metrics endpoint
+"""
+import multiprocessing
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import AuthToken
+
+METRICS_URL = reverse('metrics')
+
+
+def _count_in_child(registry, counter, times):
+    for _ in range(times):
+        counter.inc(route='a')
+    registry.reset()
+
+
+class MetricsStoreTests(SimpleTestCase):
+    """
+    Test values are shared between processes through the directory
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            METRICS={'DIR': self.directory.name}
+        )
+        self.settings_override.enable()
+        self.registry = metrics.Registry()
+        self.counter = metrics.Counter(
+            'jobs_total', 'Jobs.', ['route'], registry=self.registry
+        )
+        self.histogram = metrics.Histogram(
+            'latency_seconds', 'Latency.', ['route'], buckets=(0.1, 1),
+            registry=self.registry,
+        )
+
+    def tearDown(self):
+        self.registry.reset()
+        self.settings_override.disable()
+        self.directory.cleanup()
+
+    def test_processes_summed(self):
+        """
+        Test counts of forked processes add up in a scrape
+        :return:
+        """
+        self.counter.inc(route='a')
+        context = multiprocessing.get_context('fork')
+        children = [
+            context.Process(
+                target=_count_in_child, args=(self.registry, self.counter, 50)
+            )
+            for _ in range(3)
+        ]
+        for child in children:
+            child.start()
+        for child in children:
+            child.join()
+
+        self.assertIn('jobs_total{route="a"} 151', self.registry.render())
+        files = os.listdir(self.directory.name)
+        self.assertEqual(len([n for n in files if n.endswith('.db')]), 4)
+
+    def test_reopened_file_keeps_values(self):
+        """
+        Test a store reopened by the same pid continues from its values
+        :return:
+        """
+        self.counter.inc(2, route='a')
+        self.registry.reset()
+        self.counter.inc(route='a')
+
+        self.assertIn('jobs_total{route="a"} 3', self.registry.render())
+
+    def test_file_grows(self):
+        """
+        Test the file is extended when its entries outgrow it
+        :return:
+        """
+        for number in range(3000):
+            self.counter.inc(route=f'route-{number}')
+
+        self.assertIn(
+            'jobs_total{route="route-2999"} 1', self.registry.render()
+        )
+
+    def test_archive(self):
+        """
+        Test an exited process' values move to the archive
+        :return:
+        """
+        self.counter.inc(route='a')
+        self.registry.reset()
+        metrics.archive_process(self.directory.name, os.getpid())
+        self.counter.inc(route='a')
+        self.registry.reset()
+        metrics.archive_process(self.directory.name, os.getpid())
+
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)), ['.lock', metrics.ARCHIVE]
+        )
+        self.assertIn('jobs_total{route="a"} 2', self.registry.render())
+
+    def test_gauges(self):
+        """
+        Test gauges are set per process, summed over live processes and
+        dropped when a process exits
+        :return:
+        """
+        gauge = metrics.Gauge(
+            'busy', 'Busy.', ['route'], registry=self.registry
+        )
+        gauge.set(3, route='a')
+        gauge.set(2, route='a')
+        other = metrics.FileStore(os.path.join(self.directory.name, '1.db'))
+        other.set(gauge._key('', (('route', 'a'),)), 4)
+        other.close()
+
+        self.assertIn('# TYPE busy gauge', self.registry.render())
+        self.assertIn('busy{route="a"} 6', self.registry.render())
+        metrics.archive_process(self.directory.name, 1, self.registry)
+        self.assertIn('busy{route="a"} 2', self.registry.render())
+
+    def test_clear_directory(self):
+        """
+        Test a starting master drops earlier files but its own
+        :return:
+        """
+        open(os.path.join(self.directory.name, '1.db'), 'wb').close()
+        self.counter.inc(route='a')
+
+        metrics.clear_directory(self.directory.name)
+
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)), [f'{os.getpid()}.db']
+        )
+
+    def test_histogram(self):
+        """
+        Test buckets are rendered cumulative, with the sum and count
+        :return:
+        """
+        self.histogram.observe(0.05, route='a')
+        self.histogram.observe(0.5, route='a')
+        self.histogram.observe(5, route='a')
+
+        text = self.registry.render()
+
+        self.assertIn('# TYPE latency_seconds histogram', text)
+        self.assertIn('latency_seconds_bucket{route="a",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{route="a",le="1"} 2', text)
+        self.assertIn('latency_seconds_bucket{route="a",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_sum{route="a"} 5.55', text)
+        self.assertIn('latency_seconds_count{route="a"} 3', text)
+
+    def test_labels_escaped_and_checked(self):
+        self.counter.inc(route='say "hi"\n')
+
+        self.assertIn(
+            r'jobs_total{route="say \"hi\"\n"} 1', self.registry.render()
+        )
+        with self.assertRaises(ValueError):
+            self.counter.inc(path='a')
+
+
+class MetricsEndpointTests(TestCase):
+    """
+    Test the /metrics endpoint
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        _, key = AuthToken.objects.create_token(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+
+    def test_request_metrics(self):
+        """
+        Test requests are recorded by viewset action
+        :return:
+        """
+        self.client.get(reverse('recipe:recipe-list'))
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(
+            res['Content-Type'].startswith('text/plain; version=0.0.4')
+        )
+        text = res.content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_bucket{view="RecipeViewSet.list",'
+            'method="GET",status="2xx",le="+Inf"}',
+            text,
+        )
+        self.assertIn(
+            'http_response_size_bytes_count{view="RecipeViewSet.list"}', text
+        )
+        self.assertIn('db_queries_total{view="RecipeViewSet.list"}', text)
+        self.assertIn('auth_token_cache_total{result="misses"}', text)
+
+    @override_settings(METRICS={'TOKEN': 'secret'})
+    def test_token_required(self):
+        """
+        Test a configured token must be sent
+        :return:
+        """
+        self.client.credentials()
+
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 401)
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, 200)
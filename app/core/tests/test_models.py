@@ -84,6 +84,20 @@ class ModelTests(TestCase):
         )
         self.assertEqual( str(ingredient), ingredient.name)
 
+    def test_resolve_names_creates_missing(self):
+        """
+        Test resolving names reuses existing tags and creates the rest
+        :return:
+        """
+        user = create_user()
+        existing = models.Tag.objects.create(name='dinner', user=user)
+        tags = models.Tag.objects.resolve_names(
+            user, ['dinner', 'quick', 'quick']
+        )
+        self.assertEqual(tags['dinner'], existing)
+        self.assertEqual(set(tags), {'dinner', 'quick'})
+        self.assertEqual(models.Tag.objects.filter(user=user).count(), 2)
+
 
 @patch('core.models.uuid.uuid4')
 def test_file_name_uuid(self, mock_uuid):
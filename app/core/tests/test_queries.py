@@ -0,0 +1,155 @@
+"""
+Testing per-request SQL instrumentation
+"""
+from unittest.mock import Mock, patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import queries
+from recipe import cache
+from recipe.views import RecipeViewSet
+from user.views import ManageUserView
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class QueryRecorderTests(TestCase):
+    """
+    Test queries are counted, timed and their repetitions found
+    """
+
+    def test_counts_repetitions(self):
+        """
+        Test identical statements count as duplicates and statements that
+        differ only in their parameters as similar
+        :return:
+        """
+        User = get_user_model()
+        with queries.record_queries() as recorder:
+            User.objects.filter(pk=1).first()
+            User.objects.filter(pk=1).first()
+            User.objects.filter(pk=2).first()
+
+        self.assertEqual(recorder.count, 3)
+        self.assertEqual(recorder.duplicates, 1)
+        self.assertEqual(recorder.similar, 2)
+        self.assertGreater(recorder.duration, 0)
+        self.assertEqual(len(recorder.repeated()), 1)
+
+    def test_savepoints_not_counted(self):
+        """
+        Test transaction control statements are left out
+        :return:
+        """
+        with queries.record_queries() as recorder:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+
+        self.assertEqual(recorder.count, 1)
+
+    def test_begin_not_counted(self):
+        """
+        Test transactions opened with SQL, as on SQLite, are left out
+        :return:
+        """
+        recorder = queries.QueryRecorder()
+        execute = Mock()
+        for sql in ('BEGIN', 'START TRANSACTION', 'SELECT 1'):
+            recorder(execute, sql, None, False, {})
+
+        self.assertEqual(recorder.count, 1)
+        self.assertEqual(execute.call_count, 3)
+
+    def test_budget_lookup(self):
+        """
+        Test budgets are found per viewset action and per view method
+        :return:
+        """
+        viewset = RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+        view = ManageUserView.as_view()
+
+        self.assertEqual(
+            queries.get_budget(viewset, 'POST'),
+            RecipeViewSet.query_budget['create'],
+        )
+        self.assertEqual(
+            queries.get_budget(view, 'PATCH'),
+            ManageUserView.query_budget['patch'],
+        )
+        self.assertIsNone(queries.get_budget(view, 'DELETE'))
+        self.assertIsNone(queries.get_budget(lambda request: None, 'GET'))
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    """
+    Test requests report their queries and respect their budgets
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        cache.local_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing(self):
+        """
+        Test the response reports the database time and query count
+        :return:
+        """
+        res = self.client.get(RECIPE_URL)
+
+        self.assertRegex(
+            res['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="\d+ queries, 0 duplicates", '
+            r'total;dur=[\d.]+$',
+        )
+
+    @override_settings(QUERY_BUDGET={'SERVER_TIMING': False})
+    def test_server_timing_disabled(self):
+        res = self.client.get(RECIPE_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(QUERY_BUDGET={'ENFORCE': True})
+    def test_over_budget_fails(self):
+        """
+        Test a view over its budget fails when budgets are enforced
+        :return:
+        """
+        with patch.object(RecipeViewSet, 'query_budget', {'list': 0}):
+            with self.assertRaisesMessage(
+                queries.QueryBudgetExceeded, 'over its budget of 0'
+            ):
+                self.client.get(RECIPE_URL)
+
+    @override_settings(QUERY_BUDGET={'ENFORCE': False})
+    def test_over_budget_logged(self):
+        """
+        Test a view over its budget is logged when budgets are not enforced
+        :return:
+        """
+        with patch.object(RecipeViewSet, 'query_budget', {'list': 0}):
+            with self.assertLogs('core.queries', 'WARNING') as logs:
+                res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('"budget": 0', logs.output[0])
+
+    def test_within_budget_logged(self):
+        """
+        Test every request is logged with its numbers
+        :return:
+        """
+        with self.assertLogs('core.queries', 'INFO') as logs:
+            self.client.get(RECIPE_URL)
+
+        self.assertIn('"path": "/api/v1/recipe/"', logs.output[0])
@@ -0,0 +1,286 @@
+"""
+Testing read-replica routing
+
+The replicas are stand-in SQLite databases: `replica` has the schema but
+none of the primary's rows, like a replica that has not caught up yet, and
+`replica_down` can not be opened at all.
+"""
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.apps import apps
+from django.core.cache import caches
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from app.database import database_config, replica_configs
+from core import routers
+from core.models import AuthToken, Recipe, User
+
+RECIPE_URL = reverse('recipe:recipe-list')
+ME_URL = reverse('user:me')
+
+
+def recipe_detail(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def add_database(alias, name):
+    """
+    Register a SQLite database under the alias. It is marked as a test
+    mirror so the test case never flushes it; nothing is written to it.
+    :param alias:
+    :param name:
+    :return:
+    """
+    connections.settings[alias] = {
+        **connections['default'].settings_dict,
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'OPTIONS': {},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+
+def remove_database(alias):
+    connections[alias].close()
+    del connections[alias]
+    del connections.settings[alias]
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Test reads of safe requests go to a replica, and a user reads their own
+    writes from the primary
+    """
+    # Resolved when the class is set up, after the replicas are registered.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        add_database(
+            'replica', os.path.join(cls.directory.name, 'replica.sqlite3')
+        )
+        add_database(
+            'replica_down',
+            os.path.join(cls.directory.name, 'missing', 'replica.sqlite3'),
+        )
+        with connections['replica'].schema_editor() as editor:
+            for model in apps.get_models():
+                if model._meta.managed and not model._meta.proxy:
+                    editor.create_model(model)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        remove_database('replica')
+        remove_database('replica_down')
+        cls.directory.cleanup()
+
+    def setUp(self):
+        caches['default'].clear()
+        routers._down_until.clear()
+        self.user = User.objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        _, key = AuthToken.objects.create_token(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10,
+            price=Decimal('5.00'),
+        )
+
+    def tearDown(self):
+        routers._down_until.clear()
+
+    def test_reads_go_to_replica(self):
+        """
+        Test a GET reads from the replica, which has not seen the recipe;
+        the token is still found on the primary
+        :return:
+        """
+        res = self.client.get(recipe_detail(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_primary_without_replicas(self):
+        """
+        Test reads stay on the primary when no replica is configured
+        :return:
+        """
+        with self.settings(DATABASE_REPLICAS=[]):
+            res = self.client.get(recipe_detail(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_create_pins_user_to_primary(self):
+        """
+        Test a user reads the recipe they just created
+        :return:
+        """
+        res = self.client.post(
+            RECIPE_URL, {'title': 'Stew', 'time_minutes': 30, 'price': '9.50'}
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.get(recipe_detail(res.data['id']))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Stew')
+
+    def test_update_pins_user_to_primary(self):
+        """
+        Test a recipe update pins the user, until the pin expires
+        :return:
+        """
+        res = self.client.patch(
+            recipe_detail(self.recipe.id), {'title': 'Broth'}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(recipe_detail(self.recipe.id))
+        self.assertEqual(res.data['title'], 'Broth')
+
+        caches['default'].delete(routers._pin_key(self.user.id))
+        res = self.client.get(recipe_detail(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_user_update_pins_user_to_primary(self):
+        """
+        Test updating the user's profile pins them to the primary
+        :return:
+        """
+        res = self.client.patch(ME_URL, {'name': 'New name'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(recipe_detail(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_failed_write_does_not_pin(self):
+        """
+        Test a rejected write leaves the user on the replicas
+        :return:
+        """
+        res = self.client.post(RECIPE_URL, {'title': ''})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(recipe_detail(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        """
+        Test a replica that can not be opened is skipped
+        :return:
+        """
+        with self.settings(DATABASE_REPLICAS=['replica_down']):
+            res = self.client.get(recipe_detail(self.recipe.id))
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                routers.replica_status(), {'replica_down': 'down'}
+            )
+
+    def test_healthy_replica_preferred(self):
+        """
+        Test reads skip the unhealthy replica for the healthy one
+        :return:
+        """
+        with self.settings(DATABASE_REPLICAS=['replica_down', 'replica']):
+            for _ in range(3):
+                res = self.client.get(recipe_detail(self.recipe.id))
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_replica_retried(self):
+        """
+        Test a replica marked down is used again after RETRY_SECONDS
+        :return:
+        """
+        routers.mark_down('replica', now=100)
+
+        self.assertTrue(routers.is_down('replica', now=110))
+        self.assertFalse(routers.is_down('replica', now=131))
+
+
+class ReplicaRouterTests(TestCase):
+    """
+    Test the router outside of requests
+    """
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_primary_outside_requests(self):
+        """
+        Test management commands and background work read the primary
+        :return:
+        """
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_unsafe_request_reads_primary(self):
+        """
+        Test reads made while serving a write go to the primary
+        :return:
+        """
+        token = routers.begin_request(read_only=False)
+        try:
+            self.assertEqual(self.router.db_for_read(Recipe), 'default')
+        finally:
+            routers.end_request(token)
+
+    def test_writes_and_migrations_on_primary(self):
+        """
+        Test writes and migrations only go to the primary
+        :return:
+        """
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'core'))
+
+
+class ReplicaConfigTests(TestCase):
+    """
+    Test replica settings built from the environment
+    """
+
+    @mock.patch('app.database.find_spec', return_value=object())
+    def test_replicas(self, find_spec):
+        """
+        Test each replica host gets an alias mirroring the primary in tests
+        :return:
+        """
+        environ = {
+            'DB_NAME': 'app', 'DB_USER': 'app',
+            'DB_REPLICA_HOSTS': 'db-r1, db-r2', 'DB_POOL': '1',
+        }
+        primary = database_config(environ)
+
+        replicas = replica_configs(environ, primary)
+
+        self.assertEqual(list(replicas), ['replica_1', 'replica_2'])
+        self.assertEqual(replicas['replica_2']['HOST'], 'db-r2')
+        self.assertEqual(replicas['replica_1']['USER'], 'app')
+        self.assertEqual(replicas['replica_1']['TEST'], {'MIRROR': 'default'})
+        self.assertIsNot(
+            replicas['replica_1']['OPTIONS']['pool'],
+            primary['OPTIONS']['pool'],
+        )
+
+    def test_no_replicas(self):
+        """
+        Test no replica is configured by default
+        :return:
+        """
+        self.assertEqual(replica_configs({}, database_config({})), {})
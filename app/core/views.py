@@ -1,3 +1,27 @@
-from django.shortcuts import render
+"""
+Views for operating the API
+"""
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
 
-# Create your views here.
+from . import metrics
+
+
+@require_safe
+def export_metrics(request):
+    """
+    Serve the metrics of all worker processes in the Prometheus text
+    format; METRICS['TOKEN'], when set, must be sent as a bearer token
+    :param request:
+    :return:
+    """
+    token = metrics.get_setting('TOKEN')
+    if token and not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(
+        metrics.REGISTRY.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,162 @@
+"""
+Gunicorn configuration for production.
+
+Every value can be overridden from the environment. The worker and thread
+defaults per core are the usual rules of thumb for each worker class, not
+measurements: they have not been benchmarked here. Use them as starting
+points and tune them on the target hardware with
+`python manage.py benchmark_runtime`.
+
+GUNICORN_WORKER_CLASS selects the runtime:
+
+* sync     -- one request per process; simplest, most memory per request
+* gthread  -- a thread pool per process; the default, suited to an API
+              that mostly waits on PostgreSQL and Redis
+* uvicorn  -- ASGI workers serving the async read views
+"""
+import multiprocessing
+import os
+import tempfile
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn_worker.UvicornWorker',
+}
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+runtime = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if runtime not in WORKER_CLASSES:
+    raise RuntimeError(
+        f'GUNICORN_WORKER_CLASS must be one of {", ".join(WORKER_CLASSES)}, '
+        f'not {runtime!r}'
+    )
+cores = _cores()
+
+wsgi_app = (
+    'app.asgi:application' if runtime == 'uvicorn' else 'app.wsgi:application'
+)
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = WORKER_CLASSES[runtime]
+workers = _env_int('GUNICORN_WORKERS', {
+    'sync': 2 * cores + 1, 'gthread': cores + 1, 'uvicorn': cores,
+}[runtime])
+threads = _env_int('GUNICORN_THREADS', 4 if runtime == 'gthread' else 1)
+# Read by app/caches.py, which needs a shared cache for more than one.
+os.environ['SERVER_PROCESSES'] = str(workers)
+
+# Load the application once in the master so workers share its memory
+# copy-on-write and start faster. Connections opened while loading are
+# closed before forking; see pre_fork().
+preload_app = bool(_env_int('GUNICORN_PRELOAD', 1))
+
+# Recycle workers to contain slow leaks: after a jittered number of
+# requests, or once their resident memory passes the limit (checked after
+# each request; sync and gthread workers only).
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int(
+    'GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10
+)
+max_worker_memory = (
+    _env_int('GUNICORN_MAX_WORKER_MEMORY_MB', 512) * 1024 * 1024
+)
+
+# A worker silent for `timeout` seconds is killed; on shutdown or reload
+# workers get `graceful_timeout` seconds to finish in-flight requests.
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# The heartbeat file lives on tmpfs so a slow disk cannot stall workers.
+worker_tmp_dir = os.environ.get(
+    'GUNICORN_WORKER_TMP_DIR',
+    '/dev/shm' if os.path.isdir('/dev/shm') else None,
+)
+
+# Workers write their metrics to files here, so /metrics can sum them.
+os.environ.setdefault(
+    'METRICS_DIR',
+    os.path.join(worker_tmp_dir or tempfile.gettempdir(), 'recipe-metrics'),
+)
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """
+    Drop the metrics of an earlier master
+    """
+    from core.metrics import clear_directory
+
+    clear_directory(os.environ['METRICS_DIR'])
+
+
+def child_exit(server, worker):
+    """
+    Fold the metrics of the exited worker into the archive
+    """
+    from core.metrics import archive_process
+
+    archive_process(os.environ['METRICS_DIR'], worker.pid)
+
+
+def pre_fork(server, worker):
+    """
+    Close connections the master opened while preloading, so no socket is
+    shared between forked workers
+    """
+    from django.core.cache import caches
+    from django.db import connections
+
+    connections.close_all()
+    for connection in connections.all(initialized_only=True):
+        # A psycopg pool's worker threads do not survive fork().
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+    for cache in caches.all(initialized_only=True):
+        cache.close()
+
+
+def post_fork(server, worker):
+    """
+    Drop any connection objects inherited from the master without closing
+    the sockets underneath them, which the master still owns
+    """
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+        connection.closed_in_transaction = False
+
+
+def _resident_memory():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def post_request(worker, req, environ, resp):
+    """
+    Restart the worker once its resident memory passes max_worker_memory
+    """
+    if not max_worker_memory:
+        return
+    try:
+        rss = _resident_memory()
+    except OSError:
+        return
+    if rss > max_worker_memory and worker.alive:
+        worker.log.info('Worker using %d MiB, restarting', rss // 2 ** 20)
+        worker.alive = False
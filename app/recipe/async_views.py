@@ -0,0 +1,238 @@
+"""
+Async read path for the recipe API.
+
+Under ASGI, GET and HEAD on the list and detail routes are served by
+coroutines instead of each taking a thread from the sync adapter. They
+reuse the viewsets' querysets, filters, serializers and pagination: a
+page and its prefetched relations are loaded by the paginator, then
+serialized on the event loop, where an unplanned lazy query fails loudly
+with SynchronousOnlyOperation. Every other method goes to the viewset.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from core.fastjson import FastJSONRenderer
+from user.authentication import CachedTokenAuthentication
+
+from . import cache
+from .mixins import CompiledListMixin, _make_etag
+
+
+class AsyncReadView(View):
+    """
+    Serve the list or retrieve action of a viewset asynchronously
+    """
+    viewset_class = None
+    action = None
+    authentication = CachedTokenAuthentication()
+    renderer = FastJSONRenderer()
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            viewset = self.get_viewset(
+                await self.initialize_request(request), kwargs
+            )
+            if self.action == 'list':
+                return await self.list(viewset, request)
+            return await self.retrieve(viewset, request)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    async def initialize_request(self, request):
+        """
+        Authenticate the request and wrap it for the viewset
+        :param request:
+        :return:
+        """
+        drf_request = Request(request)
+        result = await self.authentication.aauthenticate(request)
+        if result is None:
+            raise exceptions.NotAuthenticated()
+        drf_request.user, drf_request.auth = result
+        return drf_request
+
+    def get_viewset(self, drf_request, kwargs):
+        """
+        Return a viewset instance set up as the router would for the action
+        :param drf_request:
+        :param kwargs:
+        :return:
+        """
+        return self.viewset_class(
+            request=drf_request,
+            args=(),
+            kwargs=kwargs,
+            action=self.action,
+            format_kwarg=kwargs.get('format'),
+            headers={},
+        )
+
+    async def list(self, viewset, request):
+        """
+        List like ConditionalRequestMixin and CachedListMixin do
+        :param viewset:
+        :param request:
+        :return:
+        """
+        user_id = viewset.request.user.id
+        version = await cache.aget_version(user_id)
+        viewset.request._recipe_cache_version = version
+        etag = _make_etag(user_id, version, request.get_full_path())
+        last_modified = await cache.aget_changed_at(user_id)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            key = data = None
+            if getattr(viewset, 'cache_prefix', None):
+                key = cache.make_key(
+                    user_id, version, viewset.cache_prefix,
+                    viewset.request.query_params,
+                )
+                data = await cache.alookup(key)
+            if data is None:
+                data = await self.paginate(viewset)
+                if key is not None:
+                    await cache.astore(
+                        key, {**data, 'results': list(data['results'])}
+                    )
+            response = self.render(data)
+        return viewset._set_validators(response, etag, last_modified)
+
+    async def paginate(self, viewset):
+        """
+        Return the serialized page of the viewset's filtered queryset
+        :param viewset:
+        :return:
+        """
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        paginator = viewset.paginator
+        if isinstance(viewset, CompiledListMixin):
+            plan = viewset.get_serializer_plan()
+            page = await paginator.apaginate_queryset(
+                plan.rows(queryset), viewset.request, view=viewset
+            )
+            data = await plan.arender(page, viewset.get_serializer_context())
+        else:
+            page = await paginator.apaginate_queryset(
+                queryset, viewset.request, view=viewset
+            )
+            data = viewset.get_serializer(page, many=True).data
+        return paginator.get_paginated_response(data).data
+
+    async def retrieve(self, viewset, request):
+        """
+        Retrieve like ConditionalRequestMixin does
+        :param viewset:
+        :param request:
+        :return:
+        """
+        lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        pk = viewset.kwargs[lookup_url_kwarg]
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        try:
+            queryset = queryset.filter(**{viewset.lookup_field: pk})
+            if (
+                'HTTP_IF_NONE_MATCH' in request.META
+                or 'HTTP_IF_MODIFIED_SINCE' in request.META
+            ):
+                updated_at = (
+                    await queryset.prefetch_related(None)
+                    .values_list('updated_at', flat=True)
+                    .afirst()
+                )
+                if updated_at is not None:
+                    etag, last_modified = viewset._validators_for(
+                        pk, updated_at
+                    )
+                    response = get_conditional_response(
+                        request, etag=etag, last_modified=last_modified
+                    )
+                    if response is not None:
+                        return viewset._set_validators(
+                            response, etag, last_modified
+                        )
+            instance = await queryset.afirst()
+        except (TypeError, ValueError, DjangoValidationError):
+            instance = None
+        if instance is None:
+            raise exceptions.NotFound()
+        response = self.render(viewset.get_serializer(instance).data)
+        validators = viewset._validators_for(instance.pk, instance.updated_at)
+        return viewset._set_validators(response, *validators)
+
+    def render(self, data, status=200):
+        response = HttpResponse(
+            self.renderer.render(data),
+            status=status,
+            content_type='application/json',
+        )
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def handle_exception(self, exc):
+        """
+        Render an API exception as the viewset would
+        :param exc:
+        :return:
+        """
+        if isinstance(
+            exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+        ):
+            exc.auth_header = self.authentication.authenticate_header(None)
+        handled = exception_handler(exc, {'view': self})
+        response = self.render(handled.data, status=handled.status_code)
+        for header, value in handled.items():
+            response[header] = value
+        return response
+
+
+def _dispatch(async_view, sync_view):
+    """
+    Route GET and HEAD to the async view and other methods to the viewset
+    :param async_view:
+    :param sync_view:
+    :return:
+    """
+    sync_view = sync_to_async(sync_view)
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+
+    return view
+
+
+def with_async_reads(patterns):
+    """
+    Return router URL patterns with the list and retrieve actions served
+    by AsyncReadView; names and arguments are unchanged
+    :param patterns:
+    :return:
+    """
+    result = []
+    for pattern in patterns:
+        action = getattr(pattern.callback, 'actions', {}).get('get')
+        if action in ('list', 'retrieve'):
+            async_view = AsyncReadView.as_view(
+                viewset_class=pattern.callback.cls, action=action
+            )
+            callback = _dispatch(async_view, pattern.callback)
+            # Middleware finds the viewset's query budget through these.
+            callback.cls = pattern.callback.cls
+            callback.actions = pattern.callback.actions
+            pattern = URLPattern(
+                pattern.pattern, callback, pattern.default_args, pattern.name
+            )
+        result.append(pattern)
+    return result
@@ -0,0 +1,180 @@
+"""
+Helpers shared by the benchmark management commands
+"""
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import summary
+
+SEED_BATCH_SIZE = 5000
+
+
+def seed_recipes(size, tags=3, ingredients=0, tags_per_recipe=None,
+                 ingredients_per_recipe=None, seed=0, email=None):
+    """
+    Create a throwaway user owning `size` recipes.
+
+    Each recipe links `tags_per_recipe` of the user's `tags` and
+    `ingredients_per_recipe` of the `ingredients`, picked at random
+    (all of them when not given). Call inside a transaction that is
+    rolled back afterwards.
+    :return: the user
+    """
+    rng = random.Random(seed)
+    user = get_user_model().objects.create_user(
+        email=email or f'benchmark-{size}@example.com', password=None
+    )
+    tag_ids = [tag.id for tag in Tag.objects.bulk_create(
+        [Tag(user=user, name=f'tag{i}') for i in range(tags)]
+    )]
+    ingredient_ids = [ingredient.id for ingredient in (
+        Ingredient.objects.bulk_create([
+            Ingredient(user=user, name=f'ingredient{i}')
+            for i in range(ingredients)
+        ])
+    )]
+    tag_through = Recipe.tag.through
+    ingredient_through = Recipe.ingredients.through
+    for start in range(0, size, SEED_BATCH_SIZE):
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                user=user, title=f'Recipe {i}', time_minutes=10,
+                price=Decimal('9.99'), description='x' * 200,
+            )
+            for i in range(start, min(start + SEED_BATCH_SIZE, size))
+        ])
+        tag_through.objects.bulk_create([
+            tag_through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe in recipes
+            for tag_id in _pick(rng, tag_ids, tags_per_recipe)
+        ])
+        ingredient_through.objects.bulk_create([
+            ingredient_through(
+                recipe_id=recipe.id, ingredient_id=ingredient_id,
+            )
+            for recipe in recipes
+            for ingredient_id in _pick(
+                rng, ingredient_ids, ingredients_per_recipe
+            )
+        ])
+        summary.update_summaries(
+            Recipe.objects.filter(pk__in=[recipe.id for recipe in recipes])
+        )
+    return user
+
+
+def _pick(rng, ids, count):
+    if count is None:
+        return ids
+    return rng.sample(ids, min(count, len(ids)))
+
+
+async def _request(host, port, raw):
+    """
+    Send one request on a fresh connection and return its status code
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(raw)
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+async def http_load(host, port, path, headers, concurrency, duration):
+    """
+    Keep `concurrency` requests in flight for `duration` seconds.
+
+    Every request opens its own connection, as gunicorn's sync workers do
+    not keep connections alive, which keeps servers comparable.
+    :return: (requests, errors, sorted latencies in seconds, elapsed seconds)
+    """
+    raw = (
+        f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n'
+        + ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+        + '\r\n'
+    ).encode('latin1')
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            sent = time.perf_counter()
+            try:
+                ok = await _request(host, port, raw) == 200
+            except (OSError, ValueError, IndexError):
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - sent)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return len(latencies) + errors, errors, sorted(latencies), elapsed
+
+
+def percentile(values, fraction):
+    """
+    Return the value at the given fraction of a sorted list
+    :param values:
+    :param fraction:
+    :return:
+    """
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def start_server(argv, host, port, env=None):
+    """
+    Start a server process and wait until it accepts connections. The
+    host is added to ALLOWED_HOSTS for it.
+    :param argv:
+    :param host:
+    :param port:
+    :param env: extra environment variables
+    :return: the process
+    """
+    env = {**os.environ, 'ALLOWED_HOSTS': host, **(env or {})}
+    try:
+        process = subprocess.Popen(argv, stdout=subprocess.DEVNULL, env=env)
+    except FileNotFoundError:
+        raise CommandError(f'{argv[0]} is not installed')
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(
+                f'{argv[0]} exited with status {process.returncode}'
+            )
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise CommandError(f'{argv[0]} did not start listening')
+
+
+def stop_server(process):
+    """
+    Stop a server started with start_server()
+    :param process:
+    :return:
+    """
+    process.terminate()
+    process.wait(timeout=60)
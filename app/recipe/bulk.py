@@ -0,0 +1,304 @@
+"""
+Streaming bulk import and export of recipes
+"""
+import codecs
+import csv
+import json
+
+from django.db import transaction
+
+from core import fastjson, models
+from . import compiled, search, summary
+from .signals import invalidate_user
+
+READ_SIZE = 64 * 1024
+DEFAULT_CHUNK_SIZE = 500
+EXPORT_CSV_FIELDS = [
+    'id', 'title', 'time_minutes', 'price', 'link', 'description', 'tags',
+    'ingredients',
+]
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class MalformedPayload(ValueError):
+    """
+    Raised when the body can not be parsed any further
+    """
+
+
+def _iter_text(stream, read_size):
+    """
+    Read the stream in fixed size blocks, decoding UTF-8 incrementally
+    :param stream:
+    :param read_size:
+    :return:
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        block = stream.read(read_size)
+        if not block:
+            tail = decoder.decode(b'', final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(block)
+
+
+def iter_ndjson(stream, read_size=READ_SIZE):
+    """
+    Yield one parsed object, or the parse error, per non blank line
+    :param stream:
+    :param read_size:
+    :return:
+    """
+    buffer = ''
+    for text in _iter_text(stream, read_size):
+        buffer += text
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                yield _loads(line)
+    if buffer.strip():
+        yield _loads(buffer)
+
+
+def _loads(line):
+    """
+    Parse a single line, returning the error instead of raising it
+    :param line:
+    :return:
+    """
+    try:
+        return fastjson.loads(line)
+    except ValueError as exc:
+        return MalformedPayload(str(exc))
+
+
+def iter_json_array(stream, read_size=READ_SIZE):
+    """
+    Yield the items of a top level JSON array without loading it whole
+    :param stream:
+    :param read_size:
+    :return:
+    """
+    chunks = _iter_text(stream, read_size)
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        try:
+            buffer = buffer[pos:] + next(chunks)
+        except StopIteration:
+            buffer = buffer[pos:]
+            eof = True
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if buffer[pos:pos + 1] != '[':
+        raise MalformedPayload('Expected a JSON array.')
+    pos += 1
+    expect_value = False
+    while True:
+        skip_whitespace()
+        if eof and pos >= len(buffer):
+            raise MalformedPayload('Unterminated JSON array.')
+        if buffer[pos] == ']' and not expect_value:
+            return
+        try:
+            item, end = _decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof:
+                raise MalformedPayload('Invalid JSON array item.')
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            # A scalar may continue in the next block, so read on first.
+            fill()
+            continue
+        pos = end
+        yield item
+        skip_whitespace()
+        if buffer[pos:pos + 1] == ',':
+            pos += 1
+            expect_value = True
+        elif buffer[pos:pos + 1] == ']':
+            return
+        else:
+            raise MalformedPayload('Expected "," or "]" after array item.')
+
+
+def _write_chunk(user, validated_rows):
+    """
+    Insert the validated recipes with their tags and ingredients in bulk
+    :param user:
+    :param validated_rows:
+    :return:
+    """
+    recipes = []
+    tag_names = []
+    ingredient_names = []
+    for data in validated_rows:
+        data = dict(data)
+        tags = [tag['name'] for tag in data.pop('tag', [])]
+        ingredients = [
+            ingredient['name'] for ingredient in data.pop('ingredients', [])
+        ]
+        tag_names.append(tags)
+        ingredient_names.append(ingredients)
+        recipes.append(models.Recipe(user=user, **data))
+
+    with transaction.atomic():
+        models.Recipe.objects.bulk_create(recipes)
+        tags = models.Tag.objects.resolve_names(
+            user, [name for names in tag_names for name in names]
+        )
+        ingredients = models.Ingredient.objects.resolve_names(
+            user, [name for names in ingredient_names for name in names]
+        )
+        tag_through = models.Recipe.tag.through
+        ingredient_through = models.Recipe.ingredients.through
+        tag_through.objects.bulk_create([
+            tag_through(recipe_id=recipe.id, tag_id=tags[name].id)
+            for recipe, names in zip(recipes, tag_names)
+            for name in dict.fromkeys(names)
+        ])
+        ingredient_through.objects.bulk_create([
+            ingredient_through(
+                recipe_id=recipe.id, ingredient_id=ingredients[name].id,
+            )
+            for recipe, names in zip(recipes, ingredient_names)
+            for name in dict.fromkeys(names)
+        ])
+        # Bulk inserts bypass the model signals, so do their work explicitly.
+        inserted = models.Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes]
+        )
+        search.update_search_vector(inserted)
+        summary.update_summaries(inserted)
+        invalidate_user(user.id)
+    return recipes
+
+
+def import_recipes(
+    user, rows, serializer_class, context, chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """
+    Validate and insert rows chunk by chunk, yielding one result per row
+    in input order.
+
+    Invalid rows are reported and skipped; they never abort the batch.
+    :param user:
+    :param rows:
+    :param serializer_class:
+    :param context:
+    :param chunk_size:
+    :return:
+    """
+    results = []
+    valid = []
+
+    def flush():
+        recipes = (
+            _write_chunk(user, [data for _, data in valid]) if valid else []
+        )
+        for (result, _), recipe in zip(valid, recipes):
+            result.update(status='created', id=recipe.id)
+        chunk = list(results)
+        results.clear()
+        valid.clear()
+        return chunk
+
+    row = -1
+    try:
+        for row, item in enumerate(rows):
+            result = {'row': row}
+            results.append(result)
+            if isinstance(item, MalformedPayload):
+                result.update(
+                    status='error', errors={'non_field_errors': [str(item)]}
+                )
+            else:
+                serializer = serializer_class(data=item, context=context)
+                if serializer.is_valid():
+                    valid.append((result, serializer.validated_data))
+                else:
+                    result.update(status='error', errors=serializer.errors)
+            if len(results) >= chunk_size:
+                yield from flush()
+    except MalformedPayload as exc:
+        yield from flush()
+        yield {
+            'row': row + 1,
+            'status': 'error',
+            'errors': {'non_field_errors': [str(exc)]},
+        }
+        return
+    yield from flush()
+
+
+def iter_export_rows(
+    queryset, serializer_class, chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """
+    Serialize recipes one at a time from a server side cursor, through the
+    compiled plan of the serializer class.
+
+    Relations are fetched per chunk, so memory stays bounded by the chunk
+    size rather than the number of recipes.
+    :param queryset:
+    :param serializer_class:
+    :param chunk_size:
+    :return:
+    """
+    return compiled.compile_serializer(serializer_class).iterate(
+        queryset, chunk_size=chunk_size
+    )
+
+
+def iter_ndjson_export(rows):
+    """
+    Encode rows as NDJSON lines
+    :param rows:
+    :return:
+    """
+    for row in rows:
+        yield fastjson.dumps(row) + b'\n'
+
+
+class _Echo:
+    """
+    File-like object handing back what the csv writer writes
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_export(rows):
+    """
+    Encode rows as CSV, joining tag and ingredient names with "|"
+    :param rows:
+    :return:
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_CSV_FIELDS)
+    for row in rows:
+        row = dict(row)
+        row['tags'] = '|'.join(tag['name'] for tag in row.get('tags', []))
+        row['ingredients'] = '|'.join(
+            ingredient['name'] for ingredient in row.get('ingredients', [])
+        )
+        yield writer.writerow([row.get(field) for field in EXPORT_CSV_FIELDS])
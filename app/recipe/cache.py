@@ -0,0 +1,236 @@
+"""
+Per-user response cache for recipe listings.
+
+Entries are keyed on the user, the query parameters and a per-user change
+version kept in the shared cache. Writes bump the version, so stale
+entries are never read again and simply age out of both tiers. Versions
+expire after VERSION_TIMEOUT; the version seeded in their place starts a
+new set of keys and list ETags.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core import metrics
+from core.cache import LRUCache
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'VERSION_TIMEOUT': 24 * 60 * 60,
+    'LOCAL_MAX_ENTRIES': 1024,
+}
+
+
+def get_setting(name):
+    """
+    Return a RECIPE_LIST_CACHE setting, falling back to the default
+    :param name:
+    :return:
+    """
+    return getattr(settings, 'RECIPE_LIST_CACHE', {}).get(name, DEFAULTS[name])
+
+
+class CacheStats:
+    """
+    Hit and miss counters for the list cache
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.local_hits = 0
+            self.shared_hits = 0
+            self.misses = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+        metrics.RECIPE_LIST_CACHE.inc(result=name)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'local_hits': self.local_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+            }
+
+
+local_cache = LRUCache(get_setting('LOCAL_MAX_ENTRIES'))
+stats = CacheStats()
+
+
+def _shared_cache():
+    return caches[get_setting('ALIAS')]
+
+
+def _version_key(user_id):
+    return f'recipe:version:{user_id}'
+
+
+def _changed_at_key(user_id):
+    return f'recipe:changed-at:{user_id}'
+
+
+def get_version(user_id):
+    """
+    Return the user's change version, seeding it if the shared cache lost it.
+
+    The seed is time based so a reset version never collides with keys
+    written before it was evicted.
+    :param user_id:
+    :return:
+    """
+    cache = _shared_cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(
+            _version_key(user_id), time.time_ns(),
+            timeout=get_setting('VERSION_TIMEOUT'),
+        )
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def bump_version(user_id):
+    """
+    Invalidate every cached listing for the user
+    :param user_id:
+    :return:
+    """
+    cache = _shared_cache()
+    timeout = get_setting('VERSION_TIMEOUT')
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.add(_version_key(user_id), time.time_ns(), timeout=timeout)
+    cache.set(_changed_at_key(user_id), int(time.time()), timeout=timeout)
+
+
+def get_changed_at(user_id):
+    """
+    Return the timestamp of the user's last change, if still known
+    :param user_id:
+    :return:
+    """
+    return _shared_cache().get(_changed_at_key(user_id))
+
+
+def get_request_version(request):
+    """
+    Return the requesting user's version, reading it once per request
+    :param request:
+    :return:
+    """
+    if not hasattr(request, '_recipe_cache_version'):
+        request._recipe_cache_version = get_version(request.user.id)
+    return request._recipe_cache_version
+
+
+def make_key(user_id, version, prefix, query_params):
+    """
+    Build a cache key from the user, version and sorted query parameters
+    :param user_id:
+    :param version:
+    :param prefix:
+    :param query_params:
+    :return:
+    """
+    params = sorted(
+        (key, tuple(values)) for key, values in query_params.lists()
+    )
+    digest = hashlib.sha1(repr(params).encode()).hexdigest()
+    return f'recipe:{prefix}:{user_id}:{version}:{digest}'
+
+
+def lookup(key):
+    """
+    Look the key up in the local tier, then the shared tier
+    :param key:
+    :return:
+    """
+    value = local_cache.get(key)
+    if value is not None:
+        stats.incr('local_hits')
+        return value
+    value = _shared_cache().get(key)
+    if value is not None:
+        stats.incr('shared_hits')
+        local_cache.set(key, value)
+        return value
+    stats.incr('misses')
+    return None
+
+
+def store(key, value):
+    """
+    Store the value in both tiers
+    :param key:
+    :param value:
+    :return:
+    """
+    local_cache.set(key, value)
+    _shared_cache().set(key, value, timeout=get_setting('TIMEOUT'))
+
+
+async def aget_version(user_id):
+    """
+    Async version of get_version()
+    :param user_id:
+    :return:
+    """
+    cache = _shared_cache()
+    version = await cache.aget(_version_key(user_id))
+    if version is None:
+        await cache.aadd(
+            _version_key(user_id), time.time_ns(),
+            timeout=get_setting('VERSION_TIMEOUT'),
+        )
+        version = await cache.aget(_version_key(user_id))
+    return version
+
+
+async def aget_changed_at(user_id):
+    """
+    Async version of get_changed_at()
+    :param user_id:
+    :return:
+    """
+    return await _shared_cache().aget(_changed_at_key(user_id))
+
+
+async def alookup(key):
+    """
+    Async version of lookup()
+    :param key:
+    :return:
+    """
+    value = local_cache.get(key)
+    if value is not None:
+        stats.incr('local_hits')
+        return value
+    value = await _shared_cache().aget(key)
+    if value is not None:
+        stats.incr('shared_hits')
+        local_cache.set(key, value)
+        return value
+    stats.incr('misses')
+    return None
+
+
+async def astore(key, value):
+    """
+    Async version of store()
+    :param key:
+    :param value:
+    :return:
+    """
+    local_cache.set(key, value)
+    await _shared_cache().aset(key, value, timeout=get_setting('TIMEOUT'))
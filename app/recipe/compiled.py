@@ -0,0 +1,260 @@
+"""
+Compiled rendering of recipe listings.
+
+DRF's ModelSerializer deep copies its fields for every serializer and
+walks them generically for every recipe and every nested tag or
+ingredient, after the ORM has built a model instance for each row. For
+read-only listings `compile_serializer()` turns a serializer class into a
+flat plan once: the columns to select, in output order, with the function
+rendering each one, or none when the database value is already what DRF
+would output. Rows are read with `values_list()`, many-to-many relations
+with one query each on the through table, and rendered into the same
+dicts as `serializer_class(instances, many=True).data`.
+
+A plan can render a subset of the fields, as sparse fieldsets ask for,
+and then selects only their columns and reads only their relations.
+
+Only plain model fields, RenditionsField and nested serializers of
+many-to-many relations are supported; anything else raises
+ImproperlyConfigured when the plan is compiled. Nested items are ordered
+by primary key, as `setup_eager_loading()` prefetches them.
+"""
+import functools
+from itertools import islice
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+
+from .serializers import RenditionsField, rendition_urls
+
+# Fields whose to_representation() returns database values of their type
+# unchanged.
+_AS_IS = {
+    serializers.IntegerField.to_representation,
+    serializers.CharField.to_representation,
+    serializers.BooleanField.to_representation,
+}
+# Fields rendering objects, or more than one column, rather than a value.
+_UNSUPPORTED = (
+    serializers.BaseSerializer,
+    serializers.RelatedField,
+    serializers.ManyRelatedField,
+    serializers.SerializerMethodField,
+    serializers.FileField,
+)
+
+
+def _not_compiled(serializer_class, field):
+    return ImproperlyConfigured(
+        f'{serializer_class.__name__}.{field.field_name} can not be compiled.'
+    )
+
+
+def _converter(field, serializer_class):
+    """
+    Return the function rendering a non-null value of the field, None when
+    the value is rendered as is, or the RenditionsField marker
+    :param field:
+    :param serializer_class:
+    :return:
+    """
+    if isinstance(field, _UNSUPPORTED) or len(field.source_attrs) != 1:
+        raise _not_compiled(serializer_class, field)
+    if isinstance(field, RenditionsField):
+        return RenditionsField
+    if type(field).to_representation in _AS_IS:
+        return None
+    if isinstance(field, serializers.ChoiceField):
+        # Text choices map to themselves; others go through the field.
+        values = field.choice_strings_to_values.values()
+        if all(isinstance(value, str) for value in values):
+            return None
+    return field.to_representation
+
+
+class Relation:
+    """
+    A nested serializer of a many-to-many relation, read from the through
+    table joined to the related model
+    """
+
+    def __init__(self, model_field, child, serializer_class):
+        through = model_field.remote_field.through
+        self.manager = through._base_manager
+        source_name = model_field.m2m_field_name()
+        self.source = through._meta.get_field(source_name).attname
+        target = model_field.m2m_reverse_field_name()
+        target_attname = through._meta.get_field(target).attname
+        target_pk = model_field.related_model._meta.pk.name
+        self.order = target_attname
+        self.columns = []
+        self.fields = []
+        for field in child._readable_fields:
+            source = field.source
+            if source == target_pk or source == 'pk':
+                self.columns.append(target_attname)
+            else:
+                self.columns.append(f'{target}__{source}')
+            convert = _converter(field, serializer_class)
+            if convert is RenditionsField:
+                raise _not_compiled(serializer_class, field)
+            self.fields.append(
+                (field.field_name, len(self.fields) + 1, convert)
+            )
+
+    def queryset(self, keys):
+        """
+        Return the rows of the relation for the given keys, the key first
+        :param keys:
+        :return:
+        """
+        return (
+            self.manager.filter(**{f'{self.source}__in': keys})
+            .order_by(self.order)
+            .values_list(self.source, *self.columns)
+        )
+
+    def group(self, rows):
+        """
+        Render rows of queryset() into lists of items by key
+        :param rows:
+        :return:
+        """
+        items = {}
+        fields = self.fields
+        for row in rows:
+            item = {}
+            for name, index, convert in fields:
+                value = row[index]
+                if value is not None and convert is not None:
+                    value = convert(value)
+                item[name] = value
+            items.setdefault(row[0], []).append(item)
+        return items
+
+
+class SerializerPlan:
+    """
+    The columns and relations a serializer renders, in output order
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        serializer = (
+            serializer_class()
+            if fields is None
+            else serializer_class(fields=fields)
+        )
+        model = serializer_class.Meta.model
+        self.pk_name = model._meta.pk.name
+        self.columns = [self.pk_name]
+        self.relations = {}
+        self.fields = []
+        for field in serializer._readable_fields:
+            if isinstance(field, serializers.ListSerializer):
+                model_field = model._meta.get_field(field.source)
+                if not model_field.many_to_many or not isinstance(
+                    field.child, serializers.ModelSerializer
+                ):
+                    raise _not_compiled(serializer_class, field)
+                self.relations[field.field_name] = Relation(
+                    model_field, field.child, serializer_class
+                )
+                self.fields.append((field.field_name, 0, field.field_name))
+                continue
+            convert = _converter(field, serializer_class)
+            source = self.pk_name if field.source == 'pk' else field.source
+            if source not in self.columns:
+                self.columns.append(source)
+            self.fields.append(
+                (field.field_name, self.columns.index(source), convert)
+            )
+
+    def rows(self, queryset):
+        """
+        Return the queryset selecting the plan's columns as named tuples,
+        which keyset pagination reads like instances
+        :param queryset:
+        :return:
+        """
+        return queryset.prefetch_related(None).values_list(
+            *self.columns, named=True
+        )
+
+    def render(self, rows, context=None):
+        """
+        Render rows of rows() as the serializer would render their instances
+        :param rows:
+        :param context: the serializer context; the request is used for URLs
+        :return:
+        """
+        rows = list(rows)
+        keys = [row[0] for row in rows]
+        related = {
+            name: relation.group(relation.queryset(keys)) if keys else {}
+            for name, relation in self.relations.items()
+        }
+        return self._build(rows, related, context)
+
+    async def arender(self, rows, context=None):
+        """
+        Render rows like render(), reading the relations with the async ORM
+        :param rows:
+        :param context:
+        :return:
+        """
+        rows = list(rows)
+        keys = [row[0] for row in rows]
+        related = {name: {} for name in self.relations}
+        if keys:
+            for name, relation in self.relations.items():
+                linked = [row async for row in relation.queryset(keys)]
+                related[name] = relation.group(linked)
+        return self._build(rows, related, context)
+
+    def iterate(self, queryset, context=None, chunk_size=500):
+        """
+        Render the queryset from a server side cursor, reading the relations
+        once per chunk of rows
+        :param queryset:
+        :param context:
+        :param chunk_size:
+        :return:
+        """
+        rows = self.rows(queryset).iterator(chunk_size=chunk_size)
+        while chunk := list(islice(rows, chunk_size)):
+            yield from self.render(chunk, context)
+
+    def _build(self, rows, related, context):
+        request = (context or {}).get('request')
+        steps = []
+        for name, index, convert in self.fields:
+            if name in self.relations:
+                convert = functools.partial(_children, related[name])
+            elif convert is RenditionsField:
+                convert = functools.partial(rendition_urls, request=request)
+            steps.append((name, index, convert))
+        data = []
+        for row in rows:
+            item = {}
+            for name, index, convert in steps:
+                value = row[index]
+                if value is not None and convert is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+        return data
+
+
+def _children(items, key):
+    return items.get(key, [])
+
+
+@functools.lru_cache(maxsize=None)
+def compile_serializer(serializer_class, fields=None):
+    """
+    Return the plan of a serializer class, compiled on first use
+    :param serializer_class:
+    :param fields: a tuple of the fields to render, when not all of them
+    :return:
+    """
+    return SerializerPlan(serializer_class, fields)
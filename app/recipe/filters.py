@@ -0,0 +1,81 @@
+"""
+Query parameter filters for the recipe API.
+
+Relation filters compile to EXISTS subqueries against the M2M through
+tables, so they never multiply rows and need no distinct().
+"""
+from django.db.models import Exists, OuterRef
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from core.models import Recipe
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+RELATIONS = {
+    'tags': (Recipe.tag.through, 'tag_id'),
+    'ingredients': (Recipe.ingredients.through, 'ingredient_id'),
+}
+
+
+def parse_ids(value, param):
+    """
+    Convert a comma separated string of ids to a list of integers
+    :param value:
+    :param param:
+    :return:
+    """
+    try:
+        ids = (int(part) for part in value.split(',') if part.strip())
+        return list(dict.fromkeys(ids))
+    except ValueError:
+        raise serializers.ValidationError(
+            {param: [_('Expected a comma separated list of ids.')]}
+        )
+
+
+def filter_recipes(queryset, query_params):
+    """
+    Apply the `tags`, `ingredients` and `match` (any/all) parameters
+    :param queryset:
+    :param query_params:
+    :return:
+    """
+    match = query_params.get('match', MATCH_ANY)
+    if match not in (MATCH_ANY, MATCH_ALL):
+        raise serializers.ValidationError(
+            {'match': [_('Expected "any" or "all".')]}
+        )
+    for param, (through, column) in RELATIONS.items():
+        if not query_params.get(param):
+            continue
+        ids = parse_ids(query_params[param], param)
+        links = through.objects.filter(recipe_id=OuterRef('pk'))
+        if match == MATCH_ANY:
+            queryset = queryset.filter(
+                Exists(links.filter(**{f'{column}__in': ids}))
+            )
+        else:
+            for related_id in ids:
+                queryset = queryset.filter(
+                    Exists(links.filter(**{column: related_id}))
+                )
+    return queryset
+
+
+def filter_assigned_only(queryset, query_params, relation):
+    """
+    Keep only tags or ingredients linked to at least one recipe when
+    `assigned_only` is set
+    :param queryset:
+    :param query_params:
+    :param relation:
+    :return:
+    """
+    if query_params.get('assigned_only', '0') in ('', '0', 'false', 'False'):
+        return queryset
+    through, column = RELATIONS[relation]
+    return queryset.filter(
+        Exists(through.objects.filter(**{column: OuterRef('pk')}))
+    )
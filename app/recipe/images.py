@@ -0,0 +1,293 @@
+"""
+Background processing of uploaded recipe images.
+
+Uploads are stored as-is on the request thread; resized renditions are
+produced afterwards by an executor, which also rewrites the original
+without its EXIF and XMP metadata (camera details, GPS position).
+Processing is idempotent: renditions have deterministic names and the
+result is only recorded if the recipe still points at the image that was
+processed. The files of a replaced image are deleted once the upload
+replacing it commits.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from core.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': (160, 160),
+    'medium': (640, 640),
+    'large': (1280, 1280),
+}
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {
+        'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True,
+    },
+}
+# Options for rewriting originals without metadata; others become PNG.
+ORIGINAL_FORMATS = {
+    'JPEG': {'quality': 95},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 95},
+}
+
+
+def rendition_path(image_name, rendition, extension):
+    """
+    Return the storage path of a rendition of the given image
+    :param image_name:
+    :param rendition:
+    :param extension:
+    :return:
+    """
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory, 'renditions', stem, f'{rendition}.{extension}'
+    )
+
+
+def _strip_metadata(source, image_name):
+    """
+    Return the name and content of the original rewritten without its
+    metadata, or None when it carries none.
+
+    Orientation is applied to the pixels before the EXIF holding it is
+    dropped; the ICC profile is kept.
+    :param source:
+    :param image_name:
+    :return:
+    """
+    with Image.open(source) as image:
+        if not image.getexif() and 'xmp' not in image.info \
+                and 'XML:com.adobe.xmp' not in image.info:
+            return None
+        image_format = image.format
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+    name = image_name
+    if image_format not in ORIGINAL_FORMATS:
+        image_format = 'PNG'
+        name = f'{os.path.splitext(image_name)[0]}.png'
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    elif image_format != 'JPEG' and image.mode == 'CMYK':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(
+        buffer, format=image_format, icc_profile=icc_profile,
+        **ORIGINAL_FORMATS[image_format],
+    )
+    return name, buffer.getvalue()
+
+
+def _render(source):
+    """
+    Decode the source once and yield (rendition, extension, bytes) tuples.
+
+    JPEG sources are decoded with draft() at the smallest scale still
+    larger than the biggest rendition, which skips most of the IDCT work.
+    Orientation is applied from EXIF and no metadata is written back.
+    :param source:
+    :return:
+    """
+    with Image.open(source) as image:
+        largest = max(RENDITIONS.values())
+        if image.format == 'JPEG':
+            image.draft('RGB', largest)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            mode = 'RGBA' if 'transparency' in image.info else 'RGB'
+            image = image.convert(mode)
+        renditions = sorted(
+            RENDITIONS.items(), key=lambda item: item[1], reverse=True
+        )
+        for name, size in renditions:
+            image = image.copy()
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+            for extension, options in FORMATS.items():
+                if options['format'] == 'JPEG':
+                    output = image.convert('RGB')
+                else:
+                    output = image
+                buffer = io.BytesIO()
+                output.save(buffer, **options)
+                yield name, extension, buffer.getvalue()
+
+
+def process_recipe_image(recipe_id):
+    """
+    Produce the renditions of a recipe's current image and record them
+    :param recipe_id:
+    :return:
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'user', 'image', 'image_status', 'image_renditions'
+    ).first()
+    if recipe is None or not recipe.image:
+        return
+    image_name = recipe.image.name
+    if recipe.image_status == Recipe.ImageStatus.READY \
+            and recipe.image_renditions.get('source') == image_name:
+        return
+    _update(recipe, image_status=Recipe.ImageStatus.PROCESSING)
+    stored = image_name
+    try:
+        with recipe.image.open('rb') as source:
+            original = io.BytesIO(source.read())
+        stripped = _strip_metadata(original, image_name)
+        if stripped is not None:
+            # Saved next to the original, which is only deleted once the
+            # copy is recorded, so the image never goes missing.
+            name, content = stripped
+            stored = default_storage.save(name, ContentFile(content))
+        renditions = {'source': stored}
+        original.seek(0)
+        for name, extension, content in _render(original):
+            path = rendition_path(stored, name, extension)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            renditions.setdefault(name, {})[extension] = default_storage.save(
+                path, ContentFile(content)
+            )
+    except Exception:
+        logger.exception(
+            'Processing image %s of recipe %s failed', image_name, recipe_id
+        )
+        if stored != image_name:
+            default_storage.delete(stored)
+        _update(recipe, image_status=Recipe.ImageStatus.FAILED)
+        return
+    recorded = _update(
+        recipe, image=stored, image_status=Recipe.ImageStatus.READY,
+        image_renditions=renditions,
+    )
+    if not recorded:
+        # A newer upload replaced the image while it was processed.
+        delete_image_files(stored, renditions)
+    elif stored != image_name:
+        default_storage.delete(image_name)
+
+
+def _update(recipe, **fields):
+    """
+    Record processing state unless a newer image has been uploaded since
+    :param recipe:
+    :param fields:
+    :return: whether the state was recorded
+    """
+    from .signals import invalidate_user
+
+    updated = Recipe.objects.filter(
+        pk=recipe.pk, image=recipe.image.name
+    ).update(updated_at=timezone.now(), **fields)
+    if updated:
+        invalidate_user(recipe.user_id)
+    return bool(updated)
+
+
+def delete_image_files(image_name, renditions):
+    """
+    Delete an image and its renditions from storage
+    :param image_name:
+    :param renditions: the image_renditions recorded for it
+    :return:
+    """
+    paths = [image_name] if image_name else []
+    for name, formats in renditions.items():
+        if name != 'source':
+            paths.extend(formats.values())
+    for path in paths:
+        default_storage.delete(path)
+
+
+class ImmediateExecutor:
+    """
+    Run jobs inline; used by the tests
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+class ThreadExecutor:
+    """
+    Run jobs on a lazily created, process wide thread pool
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix='recipe-image'
+                )
+        return self._pool.submit(self._run, fn, *args, **kwargs)
+
+    def _run(self, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            connections.close_all()
+
+
+_executors = {}
+
+
+def get_executor():
+    """
+    Return the executor named by settings.RECIPE_IMAGE_EXECUTOR
+    :return:
+    """
+    name = getattr(settings, 'RECIPE_IMAGE_EXECUTOR', 'thread')
+    if name not in _executors:
+        if name == 'immediate':
+            _executors[name] = ImmediateExecutor()
+        elif name == 'thread':
+            _executors[name] = ThreadExecutor(
+                getattr(settings, 'RECIPE_IMAGE_WORKERS', 2)
+            )
+        else:
+            raise ValueError(f'Unknown recipe image executor {name!r}')
+    return _executors[name]
+
+
+def schedule_processing(recipe, replaced=None):
+    """
+    Mark the recipe's image pending and process it once the upload
+    commits, deleting the files of the image it replaced
+    :param recipe:
+    :param replaced: the (image name, image_renditions) of the previous
+        image
+    :return:
+    """
+    recipe.image_status = Recipe.ImageStatus.PENDING
+    recipe.image_renditions = {}
+    _update(
+        recipe, image_status=Recipe.ImageStatus.PENDING, image_renditions={}
+    )
+
+    def submit():
+        executor = get_executor()
+        if replaced and replaced[0] and replaced[0] != recipe.image.name:
+            executor.submit(delete_image_files, *replaced)
+        executor.submit(process_recipe_image, recipe.pk)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,101 @@
+"""
+Django command to measure the CPU cost and savings of response compression
+"""
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from core import compression, fastjson
+from core.models import Recipe
+from recipe import bulk, compiled
+from recipe.benchmarks import seed_recipes
+from recipe.serializers import RecipeSerializer, RecipeDetailsSerializer
+
+LEVELS = {'gzip': [1, 6, 9], 'br': [1, 4, 6, 11], 'zstd': [1, 3, 9, 19]}
+
+
+class Command(BaseCommand):
+    """
+    Compress recipe list pages and an NDJSON export with every installed
+    coding at several levels, and report the bytes saved and the time
+    spent per body.
+
+    Pages are compressed whole, the export as a stream, the way
+    CompressionMiddleware does. Data is created inside a transaction that
+    is rolled back afterwards.
+    """
+    help = 'Benchmark CPU cost against bytes saved of response compression'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--page-sizes', nargs='+', type=int, default=[20, 100]
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = seed_recipes(
+                options['recipes'], tags=20, ingredients=50,
+                tags_per_recipe=3, ingredients_per_recipe=6,
+            )
+            queryset = Recipe.objects.filter(user=user).order_by('-id')
+            payloads = []
+            plan = compiled.compile_serializer(RecipeSerializer)
+            for page_size in options['page_sizes']:
+                page = plan.render(plan.rows(queryset)[:page_size])
+                body = fastjson.dumps({'results': page})
+                payloads.append((f'list page {page_size}', False, body))
+            rows = bulk.iter_export_rows(queryset, RecipeDetailsSerializer)
+            chunks = list(bulk.iter_ndjson_export(rows))
+            payloads.append((f'export {options["recipes"]}', True, chunks))
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f'{"payload":<16} {"coding":<6} {"level":>5} {"bytes in":>11} '
+            f'{"bytes out":>10} {"saved":>6} {"ms":>9} {"MB/s":>7}'
+        )
+        for name, streaming, body in payloads:
+            size = (
+                sum(len(chunk) for chunk in body) if streaming else len(body)
+            )
+            for coding, levels in LEVELS.items():
+                if not compression.Encoder.available(coding):
+                    continue
+                for level in levels:
+                    encoder = compression.Encoder(
+                        coding, level, compression.DEFAULTS['FLUSH_SIZE']
+                    )
+                    if streaming:
+                        cpu, out = self._time(
+                            lambda: sum(
+                                map(len, encoder.compress_stream(body))
+                            ),
+                            options['repeat'],
+                        )
+                    else:
+                        cpu, out = self._time(
+                            lambda: len(encoder.compress(body)),
+                            options['repeat'],
+                        )
+                    self.stdout.write(
+                        f'{name:<16} {coding:<6} {level:>5} {size:>11} '
+                        f'{out:>10} {1 - out / size:>6.1%} '
+                        f'{cpu * 1000:>9.2f} {size / cpu / 2 ** 20:>7.1f}'
+                    )
+
+    def _time(self, func, repeat):
+        """
+        Return the best time in seconds of func, and its result
+        :param func:
+        :param repeat:
+        :return:
+        """
+        best = result = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
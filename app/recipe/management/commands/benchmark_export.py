@@ -0,0 +1,124 @@
+"""
+Django command to measure memory use of the streaming recipe export
+"""
+import argparse
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from core.models import Recipe
+from recipe import bulk
+from recipe.benchmarks import seed_recipes
+from recipe.serializers import RecipeDetailsSerializer
+
+
+class Command(BaseCommand):
+    """
+    Export increasing numbers of recipes and report peak memory for each.
+
+    Seeding a million recipes takes far more memory than exporting them,
+    and the maximum RSS of a process never goes down, so each export runs
+    in a fresh process started with `--owner`. It reports its peak RSS
+    once Django is set up and after the export, the growth between the two
+    being what the export itself needs. The seed data is committed for
+    that process to see, and deleted afterwards.
+    """
+    help = 'Benchmark memory use of the streaming recipe export'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int,
+            default=[1000, 10000, 100000, 1000000],
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=bulk.DEFAULT_CHUNK_SIZE
+        )
+        # Set on the process measuring a single export.
+        parser.add_argument('--owner', type=int, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['owner'] is not None:
+            self.measure(options['owner'], options['chunk_size'])
+            return
+        self.stdout.write(
+            f'{"recipes":>10} {"seconds":>8} {"bytes":>12} '
+            f'{"py peak KiB":>12} {"base RSS KiB":>12} '
+            f'{"max RSS KiB":>12}'
+        )
+        for size in options['sizes']:
+            user = seed_recipes(size)
+            try:
+                result = subprocess.run(
+                    [
+                        sys.executable, str(settings.BASE_DIR / 'manage.py'),
+                        'benchmark_export', '--owner', str(user.id),
+                        '--chunk-size', str(options['chunk_size']),
+                    ],
+                    stdout=subprocess.PIPE, text=True,
+                )
+            finally:
+                user.delete()
+            if result.returncode:
+                raise CommandError(
+                    f'Exporting {size} recipes exited with status '
+                    f'{result.returncode}'
+                )
+            elapsed, written, peak, base_rss, max_rss = result.stdout.split()
+            self.stdout.write(
+                f'{size:>10} {float(elapsed):>8.2f} {written:>12} '
+                f'{int(peak) // 1024:>12} {base_rss:>12} {max_rss:>12}'
+            )
+
+    def measure(self, owner, chunk_size):
+        """
+        Export the recipes of a user and write the elapsed seconds,
+        characters written, traced peak bytes and the RSS in KiB before
+        and after
+        :param owner: the id of the user
+        :param chunk_size:
+        :return:
+        """
+        queryset = RecipeDetailsSerializer.setup_eager_loading(
+            Recipe.objects.filter(user_id=owner).order_by('-id')
+        )
+        base_rss = self._peak_rss()
+        started = time.perf_counter()
+        written = self._export(queryset, chunk_size)
+        elapsed = time.perf_counter() - started
+        max_rss = self._peak_rss()
+        # Tracing slows the export down and takes memory of its own, so
+        # measure Python allocations on a second pass.
+        tracemalloc.start()
+        self._export(queryset, chunk_size)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f'{elapsed} {written} {peak} {base_rss} {max_rss}')
+
+    def _peak_rss(self):
+        """
+        Return the peak RSS of the process in KiB. Unlike ru_maxrss, which
+        carries over the peak of the parent process, it starts over when
+        the process is started.
+        :return:
+        """
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+        raise CommandError('Peak RSS is only measured on Linux')
+
+    def _export(self, queryset, chunk_size):
+        """
+        Consume the NDJSON export, returning the number of characters written
+        :param queryset:
+        :param chunk_size:
+        :return:
+        """
+        rows = bulk.iter_export_rows(
+            queryset, RecipeDetailsSerializer, chunk_size=chunk_size
+        )
+        return sum(len(line) for line in bulk.iter_ndjson_export(rows))
@@ -0,0 +1,95 @@
+"""
+Django command to time tag and ingredient filters on a large account
+"""
+import time
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import filters
+from recipe.benchmarks import seed_recipes
+
+
+class Command(BaseCommand):
+    """
+    Seed one user with many recipes and time the first page and a full
+    count for each filter combination.
+
+    Data is created inside a transaction that is rolled back afterwards.
+    """
+    help = 'Benchmark recipe filtering by tags and ingredients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument(
+            '--explain', action='store_true',
+            help='Print the query plan of each case',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = seed_recipes(
+                options['size'], tags=20, ingredients=50, tags_per_recipe=3,
+                ingredients_per_recipe=6,
+            )
+            tags = list(
+                Tag.objects.filter(user=user).values_list('id', flat=True)[:2]
+            )
+            ingredients = list(
+                Ingredient.objects.filter(user=user)
+                .values_list('id', flat=True)[:2]
+            )
+            cases = {
+                'tags any': f'tags={tags[0]},{tags[1]}',
+                'tags all': f'tags={tags[0]},{tags[1]}&match=all',
+                'ingredients any':
+                    f'ingredients={ingredients[0]},{ingredients[1]}',
+                'tags + ingredients':
+                    f'tags={tags[0]}&ingredients={ingredients[0]}',
+            }
+            self.stdout.write(
+                f'{options["size"]} recipes, best of {options["repeat"]}'
+            )
+            self.stdout.write(
+                f'{"case":<20} {"page ms":>8} {"count ms":>9} {"rows":>8} '
+                f'{"queries":>8}'
+            )
+            for name, query in cases.items():
+                queryset = filters.filter_recipes(
+                    Recipe.objects.filter(user=user).order_by('-id'),
+                    QueryDict(query),
+                )
+                page_ms, queries = self._time(
+                    lambda: list(queryset[:options['page_size']]),
+                    options['repeat'],
+                )
+                count_ms, _ = self._time(queryset.count, options['repeat'])
+                self.stdout.write(
+                    f'{name:<20} {page_ms:>8.2f} {count_ms:>9.2f} '
+                    f'{queryset.count():>8} {queries:>8}'
+                )
+                if options['explain']:
+                    page = queryset[:options['page_size']]
+                    self.stdout.write(page.explain())
+            transaction.set_rollback(True)
+
+    def _time(self, func, repeat):
+        """
+        Return the best wall time in milliseconds and the query count of func
+        :param func:
+        :param repeat:
+        :return:
+        """
+        best = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                func()
+                elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, len(queries)
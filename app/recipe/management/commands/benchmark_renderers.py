@@ -0,0 +1,91 @@
+"""
+Django command to compare DRF's and the fast JSON renderer and parser
+"""
+import io
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core import fastjson
+from core.models import Recipe
+from recipe import compiled
+from recipe.benchmarks import seed_recipes
+from recipe.serializers import RecipeDetailsSerializer
+
+
+class Command(BaseCommand):
+    """
+    Render increasing numbers of serialized recipes to JSON with DRF's
+    renderer and with FastJSONRenderer, parse the result back with each
+    parser, and report the best time of each.
+
+    Data is created inside a transaction that is rolled back afterwards.
+    """
+    help = 'Benchmark DRF against the fast JSON renderer and parser'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[1000, 10000, 100000]
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if fastjson.orjson is None:
+            self.stdout.write(
+                'orjson is not installed, timing the stdlib fallback'
+            )
+        self.stdout.write(
+            f'{"recipes":>8} {"bytes":>11} {"drf render s":>13} '
+            f'{"fast render s":>14} {"drf parse s":>12} {"fast parse s":>13}'
+        )
+        for size in options['sizes']:
+            with transaction.atomic():
+                user = seed_recipes(
+                    size, tags=20, ingredients=50, tags_per_recipe=3,
+                    ingredients_per_recipe=6,
+                )
+                plan = compiled.compile_serializer(RecipeDetailsSerializer)
+                recipes = Recipe.objects.filter(user=user).order_by('-id')
+                data = {'results': list(plan.iterate(recipes))}
+                transaction.set_rollback(True)
+
+            drf_render, expected = self._time(
+                lambda: JSONRenderer().render(data), options['repeat']
+            )
+            fast_render, body = self._time(
+                lambda: fastjson.FastJSONRenderer().render(data),
+                options['repeat'],
+            )
+            if body != expected:
+                raise CommandError(
+                    'FastJSONRenderer renders differently from JSONRenderer'
+                )
+            drf_parse, _ = self._time(
+                lambda: JSONParser().parse(io.BytesIO(body)), options['repeat']
+            )
+            fast_parse, _ = self._time(
+                lambda: fastjson.FastJSONParser().parse(io.BytesIO(body)),
+                options['repeat'],
+            )
+            self.stdout.write(
+                f'{size:>8} {len(body):>11} {drf_render:>13.3f} '
+                f'{fast_render:>14.3f} {drf_parse:>12.3f} {fast_parse:>13.3f}'
+            )
+
+    def _time(self, func, repeat):
+        """
+        Return the best wall time in seconds of func, and its result
+        :param func:
+        :param repeat:
+        :return:
+        """
+        best = result = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,155 @@
+"""
+Django command to pick gunicorn worker defaults for a core count
+"""
+import asyncio
+import os
+import shutil
+
+from django.core.management import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.models import AuthToken
+from recipe.benchmarks import (
+    seed_recipes, http_load, percentile, start_server, stop_server,
+)
+
+
+class Command(BaseCommand):
+    """
+    Run gunicorn with gunicorn.conf.py, pinned to `--cores` CPUs, over a
+    grid of worker classes, worker and thread counts. Each candidate serves
+    a warm-up pass and then a measured pass of the recipe list. The fastest
+    candidate per worker class whose p99 latency stays within `--max-p99`
+    is reported as the environment to deploy with.
+
+    The seed data is fixed, so runs on the same hardware are comparable.
+    It is committed for the servers to see, and deleted afterwards.
+    """
+    help = (
+        'Benchmark gunicorn worker settings and recommend defaults for a '
+        'core count'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cores', type=int, default=len(os.sched_getaffinity(0))
+        )
+        parser.add_argument(
+            '--worker-classes', nargs='+',
+            default=['sync', 'gthread', 'uvicorn'],
+        )
+        parser.add_argument('--concurrency', type=int, default=128)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--warmup', type=float, default=2)
+        parser.add_argument(
+            '--max-p99', type=float, default=250,
+            help='Latency budget in milliseconds',
+        )
+        parser.add_argument('--size', type=int, default=1000)
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8766)
+
+    def candidates(self, worker_class, cores):
+        """
+        Return the (workers, threads) pairs to try for a worker class
+        :param worker_class:
+        :param cores:
+        :return:
+        """
+        if worker_class == 'sync':
+            return [(cores + 1, 1), (2 * cores + 1, 1), (4 * cores + 1, 1)]
+        if worker_class == 'gthread':
+            return [
+                (workers, threads)
+                for workers in (cores, cores + 1) for threads in (2, 4, 8)
+            ]
+        if worker_class == 'uvicorn':
+            return [(cores, 1), (2 * cores, 1)]
+        raise CommandError(f'Unknown worker class {worker_class!r}')
+
+    def handle(self, *args, **options):
+        cores = options['cores']
+        prefix = []
+        if cores < len(os.sched_getaffinity(0)):
+            if not shutil.which('taskset'):
+                raise CommandError(
+                    'taskset is needed to pin the server to fewer cores'
+                )
+            prefix = ['taskset', '--cpu-list', f'0-{cores - 1}']
+        host, port = options['host'], options['port']
+
+        user = seed_recipes(
+            options['size'], tags=10, ingredients=20, tags_per_recipe=3,
+            ingredients_per_recipe=5,
+        )
+        try:
+            _, key = AuthToken.objects.create_token(user)
+            headers = {
+                'Authorization': f'Token {key}',
+                'Accept': 'application/json',
+            }
+            path = reverse('recipe:recipe-list')
+            self.stdout.write(
+                f'{cores} cores, {options["concurrency"]} concurrent, '
+                f'{options["duration"]}s per case'
+            )
+            self.stdout.write(
+                f'{"class":<8} {"workers":>7} {"threads":>7} {"req/s":>9} '
+                f'{"p99 ms":>8} {"errors":>7}'
+            )
+            best = {}
+            for worker_class in options['worker_classes']:
+                for workers, threads in self.candidates(worker_class, cores):
+                    env = {
+                        'GUNICORN_WORKER_CLASS': worker_class,
+                        'GUNICORN_WORKERS': str(workers),
+                        'GUNICORN_THREADS': str(threads),
+                        'GUNICORN_BIND': f'{host}:{port}',
+                        'GUNICORN_ACCESS_LOG': '',
+                    }
+                    process = start_server(
+                        prefix + ['gunicorn', '--config', 'gunicorn.conf.py'],
+                        host, port, env,
+                    )
+                    try:
+                        asyncio.run(http_load(
+                            host, port, path, headers, options['concurrency'],
+                            options['warmup'],
+                        ))
+                        total, errors, latencies, elapsed = asyncio.run(
+                            http_load(
+                                host, port, path, headers,
+                                options['concurrency'], options['duration'],
+                            )
+                        )
+                    finally:
+                        stop_server(process)
+                    rate = (total - errors) / elapsed
+                    p99 = percentile(latencies, 0.99) * 1000
+                    self.stdout.write(
+                        f'{worker_class:<8} {workers:>7} {threads:>7} '
+                        f'{rate:>9.1f} {p99:>8.1f} {errors:>7}'
+                    )
+                    fastest = best.get(worker_class, (0,))[0]
+                    if (not errors and p99 <= options['max_p99']
+                            and rate > fastest):
+                        best[worker_class] = (rate, workers, threads)
+        finally:
+            user.delete()
+
+        self.stdout.write(
+            f'\nRecommended for {cores} cores '
+            f'(p99 <= {options["max_p99"]:.0f} ms):'
+        )
+        for worker_class in options['worker_classes']:
+            if worker_class not in best:
+                self.stdout.write(
+                    f'  {worker_class}: no candidate met the latency budget'
+                )
+                continue
+            rate, workers, threads = best[worker_class]
+            self.stdout.write(
+                f'  GUNICORN_WORKER_CLASS={worker_class} '
+                f'GUNICORN_WORKERS={workers} GUNICORN_THREADS={threads}  '
+                f'({rate:.0f} req/s)'
+            )
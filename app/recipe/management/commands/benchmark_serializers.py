@@ -0,0 +1,87 @@
+"""
+Django command to compare DRF and compiled rendering of recipe listings
+"""
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Recipe
+from recipe import compiled
+from recipe.benchmarks import seed_recipes
+from recipe.serializers import RecipeSerializer, RecipeDetailsSerializer
+
+
+class Command(BaseCommand):
+    """
+    Render increasing numbers of recipes with each serializer, through DRF
+    and through its compiled plan, and report the best time of each.
+
+    Both read the rows and relations chunk by chunk, as the export does, so
+    the times include the queries. Data is created inside a transaction
+    that is rolled back afterwards.
+    """
+    help = 'Benchmark DRF against compiled serializer rendering'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[1000, 10000, 100000]
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"serializer":<24} {"recipes":>8} {"drf s":>8} '
+            f'{"compiled s":>11} {"speedup":>8}'
+        )
+        for size in options['sizes']:
+            with transaction.atomic():
+                user = seed_recipes(
+                    size, tags=20, ingredients=50, tags_per_recipe=3,
+                    ingredients_per_recipe=6,
+                )
+                queryset = Recipe.objects.filter(user=user).order_by('-id')
+                for serializer_class in (RecipeSerializer,
+                                         RecipeDetailsSerializer):
+                    plan = compiled.compile_serializer(serializer_class)
+                    eager = serializer_class.setup_eager_loading(queryset)
+                    chunk_size = options['chunk_size']
+                    drf, expected = self._time(
+                        lambda: [
+                            serializer_class(recipe).data
+                            for recipe in eager.iterator(chunk_size)
+                        ],
+                        options['repeat'],
+                    )
+                    fast, data = self._time(
+                        lambda: list(
+                            plan.iterate(queryset, chunk_size=chunk_size)
+                        ),
+                        options['repeat'],
+                    )
+                    name = serializer_class.__name__
+                    if data != expected:
+                        raise CommandError(
+                            f'{name} renders differently when compiled'
+                        )
+                    self.stdout.write(
+                        f'{name:<24} {size:>8} {drf:>8.3f} {fast:>11.3f} '
+                        f'{drf / fast:>7.1f}x'
+                    )
+                transaction.set_rollback(True)
+
+    def _time(self, func, repeat):
+        """
+        Return the best wall time in seconds of func, and its result
+        :param func:
+        :param repeat:
+        :return:
+        """
+        best = result = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
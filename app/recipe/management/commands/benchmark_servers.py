@@ -0,0 +1,115 @@
+"""
+Django command to compare recipe API throughput under WSGI and ASGI
+"""
+import asyncio
+import os
+import shlex
+
+from django.core.management import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.models import AuthToken
+from recipe.benchmarks import (
+    seed_recipes, http_load, percentile, start_server, stop_server,
+)
+
+SERVERS = {
+    'wsgi': 'gunicorn app.wsgi:application --bind {host}:{port} '
+            '--workers {workers} --worker-class sync',
+    'asgi': 'uvicorn app.asgi:application --host {host} --port {port} '
+            '--workers {workers} --no-access-log',
+}
+
+
+class Command(BaseCommand):
+    """
+    Start each server against the configured database, load the read-only
+    recipe endpoints at high concurrency and report throughput and latency.
+
+    Unlike the other benchmarks the data has to be committed for the
+    servers to see it; the benchmark user is deleted afterwards.
+    """
+    help = (
+        'Benchmark WSGI (gunicorn sync) against ASGI (uvicorn) on the recipe '
+        'read endpoints'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--servers',
+            nargs='+',
+            default=list(SERVERS),
+            metavar='NAME[=COMMAND]',
+            help='Server names, or name=command templates using {host}, '
+                 '{port} and {workers}',
+        )
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--concurrency', type=int, default=256)
+        parser.add_argument('--duration', type=float, default=15)
+        parser.add_argument('--size', type=int, default=1000)
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        servers = []
+        for server in options['servers']:
+            name, _, command = server.partition('=')
+            if not command and name not in SERVERS:
+                raise CommandError(
+                    f'Unknown server {name!r}, pass {name}=<command>'
+                )
+            servers.append((name, command or SERVERS[name]))
+
+        user = seed_recipes(
+            options['size'], tags=10, ingredients=20, tags_per_recipe=3,
+            ingredients_per_recipe=5,
+        )
+        try:
+            _, key = AuthToken.objects.create_token(user)
+            headers = {
+                'Authorization': f'Token {key}',
+                'Accept': 'application/json',
+            }
+            paths = {
+                'recipes': reverse('recipe:recipe-list'),
+                'recipe': reverse(
+                    'recipe:recipe-detail',
+                    args=[user.recipe_set.values_list('id', flat=True)[0]],
+                ),
+                'tags': reverse('recipe:tag-list'),
+            }
+            self.stdout.write(
+                f'{options["workers"]} workers, '
+                f'{options["concurrency"]} concurrent, '
+                f'{options["duration"]}s per case'
+            )
+            self.stdout.write(
+                f'{"server":<8} {"path":<8} {"req/s":>9} {"p50 ms":>8} '
+                f'{"p99 ms":>8} {"errors":>7}'
+            )
+            for name, command in servers:
+                argv = shlex.split(command.format(
+                    host=options['host'], port=options['port'],
+                    workers=options['workers'],
+                ))
+                process = start_server(argv, options['host'], options['port'])
+                try:
+                    for label, path in paths.items():
+                        total, errors, latencies, elapsed = asyncio.run(
+                            http_load(
+                                options['host'], options['port'], path,
+                                headers, options['concurrency'],
+                                options['duration'],
+                            )
+                        )
+                        rate = (total - errors) / elapsed
+                        p50 = percentile(latencies, 0.5) * 1000
+                        p99 = percentile(latencies, 0.99) * 1000
+                        self.stdout.write(
+                            f'{name:<8} {label:<8} {rate:>9.1f} {p50:>8.1f} '
+                            f'{p99:>8.1f} {errors:>7}'
+                        )
+                finally:
+                    stop_server(process)
+        finally:
+            user.delete()
@@ -0,0 +1,34 @@
+"""
+Django command to produce renditions for unprocessed recipe images
+"""
+from django.core.management import BaseCommand
+
+from core.models import Recipe
+from recipe.images import process_recipe_image
+
+
+class Command(BaseCommand):
+    """
+    Process pending (and optionally failed) recipe images on this process
+    """
+    help = 'Produce renditions for recipe images that have not been processed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Also retry images that failed',
+        )
+
+    def handle(self, *args, **options):
+        statuses = [Recipe.ImageStatus.PENDING, Recipe.ImageStatus.PROCESSING]
+        if options['retry_failed']:
+            statuses.append(Recipe.ImageStatus.FAILED)
+        recipes = Recipe.objects.filter(image_status__in=statuses)
+        recipe_ids = recipes.values_list('pk', flat=True)
+        processed = 0
+        for recipe_id in recipe_ids.iterator():
+            process_recipe_image(recipe_id)
+            processed += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Processed {processed} recipe images')
+        )
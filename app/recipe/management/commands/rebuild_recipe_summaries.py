@@ -0,0 +1,60 @@
+"""
+Django command to verify and rebuild the denormalized recipe summaries
+"""
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+
+from core.models import Recipe
+from recipe import summary
+from recipe.signals import invalidate_user, touch_recipes
+
+
+class Command(BaseCommand):
+    """
+    Compare every recipe's tag and ingredient summaries with its relations,
+    a range of ids at a time, and recompute the ones that differ.
+
+    Fixed recipes are touched and their owners' listings invalidated, as a
+    signal would have done. With --verify nothing is written and the
+    command fails when any summary is stale.
+    """
+    help = 'Verify and rebuild the tag and ingredient summaries of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true', help='Only report stale summaries'
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        bounds = Recipe.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        size = options['chunk_size']
+        checked = stale = 0
+        if bounds['low'] is not None:
+            for start in range(bounds['low'], bounds['high'] + 1, size):
+                recipes = Recipe.objects.filter(
+                    pk__gte=start, pk__lt=start + size
+                )
+                with transaction.atomic():
+                    checked += recipes.count()
+                    rows = list(
+                        summary.stale_summaries(recipes)
+                        .values_list('pk', 'user_id')
+                    )
+                    stale += len(rows)
+                    if rows and not options['verify']:
+                        stale_ids = [pk for pk, _ in rows]
+                        touch_recipes(Recipe.objects.filter(pk__in=stale_ids))
+                        for user_id in {user_id for _, user_id in rows}:
+                            invalidate_user(user_id)
+
+        if options['verify'] and stale:
+            raise CommandError(
+                f'{stale} of {checked} recipes have stale summaries'
+            )
+        elif options['verify']:
+            message = f'The summaries of {checked} recipes are up to date'
+        else:
+            message = f'Rebuilt {stale} stale summaries of {checked} recipes'
+        self.stdout.write(self.style.SUCCESS(message))
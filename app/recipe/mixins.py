@@ -0,0 +1,326 @@
+"""
+Viewset mixins shared by the recipe API
+"""
+import functools
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers, status
+from rest_framework.response import Response
+
+from . import cache, compiled
+
+
+def _make_etag(*parts):
+    """
+    Build a strong, quoted ETag from the given parts
+    :param parts:
+    :return:
+    """
+    value = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.sha1(value.encode()).hexdigest())
+
+
+class CachedListMixin:
+    """
+    Serve list responses from the per-user recipe cache
+    """
+    cache_prefix = None
+
+    def list(self, request, *args, **kwargs):
+        """
+        List objects, serving repeated reads from the cache.
+        :param request:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        version = cache.get_request_version(request)
+        key = cache.make_key(
+            request.user.id, version, self.cache_prefix, request.query_params
+        )
+        data = cache.lookup(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.store(
+                key,
+                {**response.data, 'results': list(response.data['results'])},
+            )
+        return response
+
+
+class CompiledListMixin:
+    """
+    Render list pages with the compiled plan of the serializer class,
+    from column tuples instead of model instances; see recipe/compiled.py
+    """
+
+    def get_serializer_plan(self):
+        return compiled.compile_serializer(self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        """
+        List objects through the serializer plan.
+        :param request:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        plan = self.get_serializer_plan()
+        queryset = plan.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                plan.render(page, self.get_serializer_context())
+            )
+        return Response(plan.render(queryset, self.get_serializer_context()))
+
+
+@functools.lru_cache(maxsize=None)
+def _field_columns(serializer_class):
+    """
+    Return the model columns each field of a serializer renders
+    :param serializer_class:
+    :return:
+    """
+    model_meta = serializer_class.Meta.model._meta
+    columns = {}
+    for name, field in serializer_class().fields.items():
+        try:
+            model_field = model_meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+        if (
+            model_field.concrete
+            and not model_field.primary_key
+            and not model_field.many_to_many
+        ):
+            columns[name] = model_field.attname
+    return columns
+
+
+class SparseFieldsetMixin:
+    """
+    Let reads ask for a subset of the serializer's fields with
+    `?fields=id,title` and leave some out with `?omit=description`.
+
+    Left out columns are deferred, except those the pagination orders by;
+    the relations of left out fields are not prefetched, see
+    setup_eager_loading().
+    """
+    sparse_fieldset_actions = ('list', 'retrieve')
+
+    def get_sparse_fields(self):
+        """
+        Return the names of the fields to render, in the serializer's
+        order, or None to render all of them
+        :return:
+        """
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = None
+            params = (
+                self.request.query_params if self.request is not None else {}
+            )
+            if self.action in self.sparse_fieldset_actions and (
+                'fields' in params or 'omit' in params
+            ):
+                available = self.get_serializer_class().Meta.fields
+                requested = self._parse_fields(params, 'fields', available)
+                omitted = self._parse_fields(params, 'omit', available)
+                self._sparse_fields = tuple(
+                    name
+                    for name in available
+                    if (requested is None or name in requested)
+                    and name not in omitted
+                )
+        return self._sparse_fields
+
+    def _parse_fields(self, params, param, available):
+        if param not in params:
+            return None if param == 'fields' else ()
+        names = [
+            name.strip() for name in params[param].split(',') if name.strip()
+        ]
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            message = _(
+                'Unknown fields: %(unknown)s. Expected some of %(available)s.'
+            ) % {
+                'unknown': ', '.join(unknown),
+                'available': ', '.join(available),
+            }
+            raise serializers.ValidationError({param: [message]})
+        return names
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_serializer_plan(self):
+        return compiled.compile_serializer(
+            self.get_serializer_class(), self.get_sparse_fields()
+        )
+
+    def filter_queryset(self, queryset):
+        """
+        Filter the queryset, deferring the columns of left out fields
+        :param queryset:
+        :return:
+        """
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        columns = _field_columns(self.get_serializer_class())
+        kept = {columns[name] for name in fields if name in columns}
+        kept.update(order.lstrip('-') for order in ordering)
+        deferred = sorted(set(columns.values()) - kept)
+        return queryset.defer(*deferred) if deferred else queryset
+
+
+class ConditionalRequestMixin:
+    """
+    Strong ETag and Last-Modified validators for list and detail actions.
+
+    List validators come from the per-user change version, detail ones from
+    the object's `updated_at`, so neither needs the payload to be serialized.
+    `If-Match` on update and delete gives optimistic concurrency; it also
+    takes the weak tags CompressionMiddleware sends with compressed bodies,
+    which name the same version.
+    """
+
+    def list(self, request, *args, **kwargs):
+        """
+        Answer `304 Not Modified` before the queryset is evaluated.
+        :param request:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        etag = _make_etag(
+            request.user.id,
+            cache.get_request_version(request),
+            request.get_full_path(),
+        )
+        last_modified = cache.get_changed_at(request.user.id)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return self._set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve an object; conditional requests are answered from its
+        `updated_at` alone.
+        :param request:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        if (
+            'HTTP_IF_NONE_MATCH' in request.META
+            or 'HTTP_IF_MODIFIED_SINCE' in request.META
+        ):
+            etag, last_modified = self.get_object_validators()
+            if etag is not None:
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=last_modified
+                )
+                if response is not None:
+                    return self._set_validators(response, etag, last_modified)
+        instance = self.get_object()
+        response = Response(self.get_serializer(instance).data)
+        return self._set_validators(
+            response, *self._validators_for(instance.pk, instance.updated_at)
+        )
+
+    def update(self, request, *args, **kwargs):
+        response = self._conditional_write(
+            super().update, request, *args, **kwargs
+        )
+        if response.status_code == status.HTTP_200_OK:
+            etag, last_modified = self.get_object_validators()
+            response = self._set_validators(response, etag, last_modified)
+        return response
+
+    def destroy(self, request, *args, **kwargs):
+        return self._conditional_write(
+            super().destroy, request, *args, **kwargs
+        )
+
+    def get_object_validators(self, lock=False):
+        """
+        Return the ETag and Last-Modified timestamp of the requested object,
+        or (None, None) when it does not exist.
+        :param lock: lock the row until the end of the transaction
+        :return:
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.prefetch_related(None)
+        if lock:
+            queryset = queryset.select_for_update()
+        updated_at = queryset.filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        ).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None, None
+        return self._validators_for(self.kwargs[lookup_url_kwarg], updated_at)
+
+    def _validators_for(self, pk, updated_at):
+        etag = _make_etag(
+            self.queryset.model._meta.label, pk, updated_at.isoformat()
+        )
+        return etag, int(updated_at.timestamp())
+
+    def _conditional_write(self, handler, request, *args, **kwargs):
+        """
+        Run the write only if the `If-Match`/`If-Unmodified-Since`
+        preconditions hold, keeping the row locked in between.
+        :param handler:
+        :param request:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        if (
+            'HTTP_IF_MATCH' not in request.META
+            and 'HTTP_IF_UNMODIFIED_SINCE' not in request.META
+        ):
+            return handler(request, *args, **kwargs)
+        if_match = request.META.get('HTTP_IF_MATCH')
+        if if_match:
+            request.META['HTTP_IF_MATCH'] = ', '.join(
+                tag.removeprefix('W/') for tag in parse_etags(if_match)
+            )
+        with transaction.atomic():
+            etag, last_modified = self.get_object_validators(lock=True)
+            if etag is not None:
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=last_modified
+                )
+                if response is not None:
+                    return response
+            return handler(request, *args, **kwargs)
+
+    def _set_validators(self, response, etag, last_modified):
+        if etag is not None and response.status_code in (
+            status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED,
+        ):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
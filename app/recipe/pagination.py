@@ -0,0 +1,64 @@
+"""
+Pagination for the recipe API
+"""
+from asgiref.sync import sync_to_async
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class BaseCursorPagination(CursorPagination):
+    """
+    Keyset pagination with a client configurable page size.
+
+    The async views page through DRF's own paginate_queryset() in a
+    worker thread; the page's single query gains nothing from the async
+    ORM, and the cursor logic stays DRF's.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return await sync_to_async(self.paginate_queryset)(
+            queryset, request, view=view
+        )
+
+
+class RecipeCursorPagination(BaseCursorPagination):
+    """
+    Paginate recipes newest first
+    """
+    ordering = '-id'
+
+
+class NameCursorPagination(BaseCursorPagination):
+    """
+    Paginate tags and ingredients by name.
+
+    The cursor records only the name, which is unique within a user's
+    tags and ingredients, so it never needs a tie breaker. The trailing id
+    just keeps the ordering in line with the user and name indexes.
+    """
+    ordering = ('-name', '-id')
+
+
+class RecipeSearchPagination(LimitOffsetPagination):
+    """
+    Paginate search results, which are ordered by rank
+    """
+    default_limit = 20
+    max_limit = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        if self.count == 0 or self.offset > self.count:
+            return []
+        page = queryset[self.offset:self.offset + self.limit]
+        return [obj async for obj in page.aiterator(chunk_size=self.limit)]
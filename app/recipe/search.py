@@ -0,0 +1,128 @@
+"""
+Full-text recipe search.
+
+On PostgreSQL recipes carry a weighted `search_vector` (title, description,
+ingredient names) backed by a GIN index and ranked with ts_rank. Other
+databases fall back to case-insensitive matching so tests run on SQLite.
+
+Signal handlers only schedule recipes for an update; the vectors of every
+recipe scheduled in a transaction are recomputed by a single UPDATE once it
+commits.
+"""
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.models import (
+    Case, Exists, F, IntegerField, OuterRef, Q, Subquery, TextField, Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+
+from core.models import Recipe, Ingredient
+
+SEARCH_CONFIG = 'english'
+
+
+def is_postgres(queryset):
+    """
+    Return True when the queryset runs against PostgreSQL
+    :param queryset:
+    :return:
+    """
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def update_search_vector(queryset):
+    """
+    Recompute the search vector of the recipes in the queryset
+    :param queryset:
+    :return:
+    """
+    if not is_postgres(queryset):
+        return
+    from django.contrib.postgres.aggregates import StringAgg
+    from django.contrib.postgres.search import SearchVector
+
+    ingredient_names = (
+        Ingredient.objects.filter(recipes=OuterRef('pk'))
+        .order_by()
+        .values('recipes')
+        .annotate(names=StringAgg('name', delimiter=' '))
+        .values('names')
+    )
+    queryset.order_by().update(search_vector=(
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(
+                Subquery(ingredient_names), Value(''),
+                output_field=TextField(),
+            ),
+            weight='C',
+            config=SEARCH_CONFIG,
+        )
+    ))
+
+
+def schedule_search_update(recipe_ids, using='default'):
+    """
+    Recompute the search vectors of the recipes when the current
+    transaction commits, together with any others scheduled in it
+    :param recipe_ids:
+    :param using:
+    :return:
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    pending = connection.__dict__.setdefault('pending_search_updates', set())
+    pending.update(recipe_ids)
+    # Registered on every call: a callback registered inside a savepoint
+    # that is rolled back never runs, and the later ones find the set
+    # already flushed.
+    transaction.on_commit(partial(_flush_search_updates, using), using=using)
+
+
+def _flush_search_updates(using):
+    connection = connections[using]
+    recipe_ids = connection.__dict__.pop('pending_search_updates', None)
+    if recipe_ids:
+        update_search_vector(
+            Recipe.objects.using(using).filter(pk__in=recipe_ids)
+        )
+
+
+def search_recipes(queryset, text):
+    """
+    Filter the queryset to recipes matching the text, best matches first
+    :param queryset:
+    :param text:
+    :return:
+    """
+    if is_postgres(queryset):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(
+            text, search_type='websearch', config=SEARCH_CONFIG
+        )
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(rank=SearchRank(F('search_vector'), query))
+            .order_by('-rank', '-id')
+        )
+    in_ingredients = Exists(Ingredient.objects.filter(
+        recipes=OuterRef('pk'), name__icontains=text
+    ))
+    return (
+        queryset.filter(
+            Q(title__icontains=text) | Q(description__icontains=text)
+            | in_ingredients
+        )
+        .annotate(rank=Case(
+            When(title__icontains=text, then=Value(3)),
+            When(description__icontains=text, then=Value(2)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ))
+        .order_by('-rank', '-id')
+    )
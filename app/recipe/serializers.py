@@ -1,11 +1,24 @@
 
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
 
 from core import  models
 
 
+class SparseModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer rendering only the named `fields`, when given
+    """
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
-class IngredientSerializer(serializers.ModelSerializer):
+
+class IngredientSerializer(SparseModelSerializer):
     """
     Serializer for the Ingredient object
     """
@@ -14,7 +27,8 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
         read_only_fields = ('id',)
 
-class TagSerializer(serializers.ModelSerializer):
+
+class TagSerializer(SparseModelSerializer):
     """
     Serializer for the Tag object
     """
@@ -24,49 +38,95 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseModelSerializer):
     """
     Serializer for the Recipe object
     """
     ingredients = IngredientSerializer(many=True, required=False)
-    tags = TagSerializer(many=True, required=False)
+    tags = TagSerializer(many=True, required=False, source='tag')
     class Meta:
         model = models.Recipe
-        fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients']
-        read_only_fields = ('id',)
+        fields = [
+            'id', 'title', 'time_minutes', 'price', 'link', 'tags',
+            'ingredients', *models.Recipe.SUMMARY_FIELDS,
+        ]
+        read_only_fields = ('id', *models.Recipe.SUMMARY_FIELDS)
+        prefetch_related_fields = ('tag', 'ingredients')
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """
+        Prefetch the relations rendered by this serializer, ordered by
+        primary key like the compiled plan renders them
+        :param queryset:
+        :param fields: the fields rendered, when not all of them
+        :return:
+        """
+        names = cls.Meta.prefetch_related_fields
+        if fields is not None:
+            sources = {
+                field.source for field in cls(fields=fields).fields.values()
+            }
+            names = [name for name in names if name in sources]
+        model_meta = cls.Meta.model._meta
+        related = {
+            name: model_meta.get_field(name).related_model for name in names
+        }
+        return queryset.prefetch_related(*(
+            Prefetch(name, queryset=model.objects.order_by('pk'))
+            for name, model in related.items()
+        ))
 
     def _get_or_crate_tag(self, tags, recipe):
         """
-        Crate a tag if it exists
-        :param tag:
+        Crate the missing tags in bulk and link them to the recipe
+        :param tags:
         :param recipe:
         :return:
         """
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_object, created = models.Tag.objects.get_or_create(user=auth_user, *tag)
-            recipe.tag.add(tag_object)
+        tag_objects = models.Tag.objects.resolve_names(
+            auth_user, [tag['name'] for tag in tags]
+        )
+        if tag_objects:
+            recipe.tag.add(*tag_objects.values())
 
     def _get_or_crate_ingredients(self, ingredients, recipe):
         """
-        Crate ingredients if it exists
+        Crate the missing ingredients in bulk and link them to the recipe
         :param ingredients:
         :param recipe:
         :return:
         """
         auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_object, created = models.Ingredient.objects.get_or_create(user=auth_user, **ingredient)
-            recipe.ingredients.add(ingredient_object)
+        ingredient_objects = models.Ingredient.objects.resolve_names(
+            auth_user, [ingredient['name'] for ingredient in ingredients]
+        )
+        if ingredient_objects:
+            recipe.ingredients.add(*ingredient_objects.values())
+
+    def _refresh_summaries(self, recipe, linked):
+        """
+        Reload the summaries the signals recomputed in SQL when tags or
+        ingredients were linked
+        :param recipe:
+        :param linked:
+        :return:
+        """
+        if linked:
+            recipe.refresh_from_db(fields=models.Recipe.SUMMARY_FIELDS)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients', [])
-        tags = validated_data.pop('tags', [])
+        tags = validated_data.pop('tag', [])
         recipe = models.Recipe.objects.create(**validated_data)
         self._get_or_crate_ingredients(ingredients, recipe)
         self._get_or_crate_tag(tags, recipe)
+        self._refresh_summaries(recipe, tags or ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         Update and return an existing `Recipe` instance.
@@ -75,18 +135,59 @@ class RecipeSerializer(serializers.ModelSerializer):
         :return:
         """
         ingredients = validated_data.pop('ingredients', [])
-        tags = validated_data.pop('tags', [])
+        tags = validated_data.pop('tag', [])
         recipe = super(RecipeSerializer, self).update(instance, validated_data)
         self._get_or_crate_ingredients(ingredients, recipe)
         self._get_or_crate_tag(tags, recipe)
+        self._refresh_summaries(recipe, tags or ingredients)
         return recipe
 
+
+class RenditionsField(serializers.ReadOnlyField):
+    """
+    Render the processed image renditions as {name: {format: url}}
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'image_renditions')
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return rendition_urls(value, self.context.get('request'))
+
+
+def rendition_urls(value, request=None):
+    """
+    Return the URLs of stored renditions, absolute when there is a request
+    :param value: the recipe's image_renditions
+    :param request:
+    :return:
+    """
+    renditions = {}
+    for name, formats in value.items():
+        if name == 'source':
+            continue
+        renditions[name] = {}
+        for extension, path in formats.items():
+            url = default_storage.url(path)
+            renditions[name][extension] = (
+                request.build_absolute_uri(url) if request else url
+            )
+    return renditions
+
+
 class RecipeDetailsSerializer(RecipeSerializer):
     """
     Serializer for the Recipe object
     """
+    renditions = RenditionsField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image_status', 'renditions',
+        ]
+        read_only_fields = RecipeSerializer.Meta.read_only_fields + (
+            'image_status',
+        )
 
 
 
@@ -94,10 +195,12 @@ class RecipeImageSerializer(serializers.ModelSerializer):
     """
     Serializer for the Recipe Image object
     """
+    renditions = RenditionsField()
+
     class Meta:
         model = models.Recipe
-        fields = ['id', 'image']
-        read_only_fields = ('id',)
+        fields = ['id', 'image', 'image_status', 'renditions']
+        read_only_fields = ('id', 'image_status')
         extra_kwargs = {'image': {'required': 'True'}}
 
 
@@ -0,0 +1,146 @@
+"""
+Signal handlers keeping cached recipe listings and validators fresh
+"""
+from django.db import transaction
+from django.db.models.signals import (
+    post_save, post_delete, pre_delete, m2m_changed,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+from . import cache, search, summary
+
+
+def invalidate_user(user_id):
+    """
+    Bump the user's version now and again once the transaction commits.
+
+    The first bump stops readers using entries cached before the write;
+    the second drops anything cached from data read before the commit.
+    :param user_id:
+    :return:
+    """
+    cache.bump_version(user_id)
+    transaction.on_commit(lambda: cache.bump_version(user_id))
+
+
+def touch_recipes(queryset):
+    """
+    Move `updated_at` forward on recipes whose rendered relations changed,
+    recomputing their tag and ingredient summaries in the same update
+    :param queryset:
+    :return:
+    """
+    queryset.update(updated_at=timezone.now(), **summary.summary_values())
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_on_change(sender, instance, **kwargs):
+    """
+    Invalidate listings when a recipe, tag or ingredient changes
+    """
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def touch_on_rename(sender, instance, created, **kwargs):
+    """
+    Touch the recipes rendering a renamed tag or ingredient
+    """
+    if not created:
+        relation = 'tag' if sender is Tag else 'ingredients'
+        touch_recipes(Recipe.objects.filter(**{relation: instance}))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_recipes_on_delete(sender, instance, **kwargs):
+    # Read by touch_on_delete() and update_search_on_ingredient_delete().
+    instance._recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def touch_on_delete(sender, instance, **kwargs):
+    """
+    Touch the recipes that rendered a deleted tag or ingredient, once its
+    links are gone
+    """
+    recipe_ids = getattr(instance, '_recipe_ids', [])
+    touch_recipes(Recipe.objects.filter(pk__in=recipe_ids))
+
+
+@receiver(m2m_changed, sender=Recipe.tag.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_on_relation_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    Invalidate listings and touch recipes when tags or ingredients are
+    linked or unlinked
+    """
+    if reverse:
+        if action == 'pre_clear':
+            recipe_ids = instance.recipes.values_list('pk', flat=True)
+            instance._recipe_ids = list(recipe_ids)
+        elif action == 'post_clear':
+            touch_recipes(Recipe.objects.filter(pk__in=instance._recipe_ids))
+        elif action in ('post_add', 'post_remove'):
+            touch_recipes(Recipe.objects.filter(pk__in=pk_set))
+    elif action.startswith('post_'):
+        touch_recipes(Recipe.objects.filter(pk=instance.pk))
+    if action.startswith('post_'):
+        invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_on_save(
+    sender, instance, using, update_fields=None, **kwargs
+):
+    """
+    Refresh the search vector when a recipe's text may have changed
+    """
+    if update_fields is None or {'title', 'description'} & set(update_fields):
+        search.schedule_search_update([instance.pk], using)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_search_on_ingredient_rename(
+    sender, instance, created, using, **kwargs
+):
+    """
+    Refresh the search vectors of recipes using a renamed ingredient
+    """
+    if not created:
+        recipe_ids = instance.recipes.values_list('pk', flat=True)
+        search.schedule_search_update(recipe_ids, using)
+
+
+@receiver(post_delete, sender=Ingredient)
+def update_search_on_ingredient_delete(sender, instance, using, **kwargs):
+    """
+    Refresh the search vectors of recipes that used a deleted ingredient
+    """
+    recipe_ids = getattr(instance, '_recipe_ids', [])
+    search.schedule_search_update(recipe_ids, using)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_search_on_ingredients_change(
+    sender, instance, action, reverse, pk_set, using, **kwargs
+):
+    """
+    Refresh search vectors when ingredients are linked or unlinked
+    """
+    if not reverse:
+        if action.startswith('post_'):
+            search.schedule_search_update([instance.pk], using)
+    elif action == 'post_clear':
+        # Remembered on pre_clear by invalidate_on_relation_change().
+        search.schedule_search_update(instance._recipe_ids, using)
+    elif action in ('post_add', 'post_remove'):
+        search.schedule_search_update(pk_set, using)
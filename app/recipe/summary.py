@@ -0,0 +1,92 @@
+"""
+Denormalized tag and ingredient summaries of recipes.
+
+Recipes carry `tag_count`, `ingredient_count`, `tag_names` and
+`ingredient_names`, so list cards render without reading the through
+tables. They are recomputed in SQL whenever signals.touch_recipes() moves
+a recipe's `updated_at`, which happens on every link, unlink, rename and
+delete of its tags and ingredients; bulk inserts, which bypass the
+signals, call update_summaries() themselves. Names are ordered by
+primary key, like the rendered tags and ingredients, and stored as JSON
+arrays built by the database: ARRAY() converted to jsonb on PostgreSQL,
+JSON_GROUP_ARRAY() on SQLite.
+
+Recipe.save() leaves the summaries of existing rows alone, so only these
+updates write them; `manage.py rebuild_recipe_summaries` finds and fixes
+any drift.
+"""
+from django.db.models import (
+    Count, F, IntegerField, JSONField, OuterRef, Q, Subquery, Value,
+)
+from django.db.models.functions import Coalesce
+
+from core.models import Recipe, Tag, Ingredient
+
+SUMMARY_FIELDS = Recipe.SUMMARY_FIELDS
+
+
+class _NameArray(Subquery):
+    """
+    The names selected by a subquery as a JSON array, in its order
+    """
+    template = '(SELECT JSON_GROUP_ARRAY(name) FROM (%(subquery)s))'
+    output_field = JSONField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template='TO_JSONB(ARRAY(%(subquery)s))',
+            **extra_context
+        )
+
+
+def _count(through):
+    links = (
+        through.objects.filter(recipe_id=OuterRef('pk'))
+        .order_by()
+        .values('recipe_id')
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    return Coalesce(Subquery(links, output_field=IntegerField()), Value(0))
+
+
+def _names(model):
+    names = model.objects.filter(recipes=OuterRef('pk')).order_by('pk')
+    return _NameArray(names.values('name'))
+
+
+def summary_values():
+    """
+    Return the expressions computing each summary column of a recipe
+    :return:
+    """
+    return {
+        'tag_count': _count(Recipe.tag.through),
+        'ingredient_count': _count(Recipe.ingredients.through),
+        'tag_names': _names(Tag),
+        'ingredient_names': _names(Ingredient),
+    }
+
+
+def update_summaries(queryset):
+    """
+    Recompute the summaries of the recipes in the queryset
+    :param queryset:
+    :return: the number of recipes updated
+    """
+    return queryset.order_by().update(**summary_values())
+
+
+def stale_summaries(queryset):
+    """
+    Return the recipes of the queryset whose stored summaries differ from
+    their tags and ingredients
+    :param queryset:
+    :return:
+    """
+    computed = {
+        f'computed_{name}': value for name, value in summary_values().items()
+    }
+    return queryset.alias(**computed).exclude(
+        Q(*(Q(**{name: F(f'computed_{name}')}) for name in SUMMARY_FIELDS))
+    )
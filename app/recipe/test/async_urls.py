@@ -0,0 +1,11 @@
+"""
+URLconf serving the recipe API with async reads, as app/asgi.py does
+"""
+from django.urls import include, path
+
+from recipe.async_views import with_async_reads
+from recipe.urls import router
+
+urlpatterns = [
+    path('api/v1/', include((with_async_reads(router.urls), 'recipe'))),
+]
@@ -0,0 +1,78 @@
+"""
+Data builders shared by the recipe tests
+"""
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import summary
+
+
+def create_recipe(user, **params):
+    """
+    Create a recipe with default values
+    :param user:
+    :param params:
+    :return:
+    """
+    defaults = {
+        'title': 'Test Recipe',
+        'time_minutes': 10,
+        'price': Decimal('10.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_owner(recipes, tags=3, ingredients=0, tags_per_recipe=None,
+                 ingredients_per_recipe=None, seed=0, email=None):
+    """
+    Create a user owning `recipes` recipes, each linking `tags_per_recipe`
+    of the user's `tags` and `ingredients_per_recipe` of the `ingredients`,
+    picked at random (all of them when not given)
+    :return: the user
+    """
+    rng = random.Random(seed)
+    user = get_user_model().objects.create_user(
+        email=email or f'owner-{recipes}@example.com', password=None
+    )
+    tag_ids = [tag.id for tag in Tag.objects.bulk_create(
+        [Tag(user=user, name=f'tag{i}') for i in range(tags)]
+    )]
+    ingredient_ids = [ingredient.id for ingredient in (
+        Ingredient.objects.bulk_create([
+            Ingredient(user=user, name=f'ingredient{i}')
+            for i in range(ingredients)
+        ])
+    )]
+    created = Recipe.objects.bulk_create([
+        Recipe(
+            user=user, title=f'Recipe {i}', time_minutes=10,
+            price=Decimal('9.99'), description='x' * 200,
+        )
+        for i in range(recipes)
+    ])
+    Recipe.tag.through.objects.bulk_create([
+        Recipe.tag.through(recipe_id=recipe.id, tag_id=tag_id)
+        for recipe in created
+        for tag_id in _pick(rng, tag_ids, tags_per_recipe)
+    ])
+    Recipe.ingredients.through.objects.bulk_create([
+        Recipe.ingredients.through(
+            recipe_id=recipe.id, ingredient_id=ingredient_id,
+        )
+        for recipe in created
+        for ingredient_id in _pick(
+            rng, ingredient_ids, ingredients_per_recipe
+        )
+    ])
+    summary.update_summaries(Recipe.objects.filter(user=user))
+    return user
+
+
+def _pick(rng, ids, count):
+    if count is None:
+        return ids
+    return rng.sample(ids, min(count, len(ids)))
@@ -0,0 +1,229 @@
+"""
+Testing the async read path of the recipe API
+"""
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.middleware import MetricsMiddleware, QueryBudgetMiddleware
+from core.models import AuthToken, Recipe, Tag, Ingredient
+from recipe import cache
+from recipe.test.helpers import create_recipe
+from user import authentication
+
+ASYNC_URLCONF = 'recipe.test.async_urls'
+
+User = get_user_model()
+
+
+class AsyncReadTests(TestCase):
+    """
+    Test the async views answer like the viewsets
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        cache.local_cache.clear()
+        authentication.local_cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com', password='password'
+        )
+        _, self.key = AuthToken.objects.create_token(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+        dinner = Tag.objects.create(user=self.user, name='dinner')
+        salt = Ingredient.objects.create(user=self.user, name='salt')
+        with self.captureOnCommitCallbacks(execute=True):
+            for title in ('Soup', 'Stew', 'Salad'):
+                recipe = create_recipe(self.user, title=title)
+                recipe.tag.add(dinner)
+                recipe.ingredients.add(salt)
+        self.recipe = recipe
+
+    def aget(self, url, key=None, **headers):
+        """
+        GET the url through the async URLconf
+        :param url:
+        :param key:
+        :param headers:
+        :return:
+        """
+        headers['Authorization'] = f'Token {key or self.key}'
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            return async_to_sync(self.async_client.get)(url, headers=headers)
+
+    def sync_then_async(self, url):
+        """
+        Return the sync and async responses to the same request, clearing
+        the list cache in between so the async view builds its own page
+        :param url:
+        :return:
+        """
+        sync = self.client.get(url)
+        caches['default'].clear()
+        cache.local_cache.clear()
+        return sync, self.aget(url)
+
+    def test_list_matches_viewset(self):
+        """
+        Test the async recipe list returns the viewset's page
+        :return:
+        """
+        sync, res = self.sync_then_async(reverse('recipe:recipe-list'))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), sync.json())
+
+    def test_list_queries(self):
+        """
+        Test the async list prefetches relations instead of querying per row
+        :return:
+        """
+        self.aget(reverse('recipe:tag-list'))
+        with self.assertNumQueries(3):
+            self.aget(reverse('recipe:recipe-list'))
+
+    def test_middleware_stays_async(self):
+        """
+        Test the instrumenting middleware runs on the event loop and still
+        records the queries of the async view
+        :return:
+        """
+        async def get_response(request):
+            return None
+
+        for middleware_class in (QueryBudgetMiddleware, MetricsMiddleware):
+            middleware = middleware_class(get_response)
+            self.assertTrue(iscoroutinefunction(middleware))
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(import_string(path).async_capable, path)
+        self.aget(reverse('recipe:tag-list'))
+        res = self.aget(reverse('recipe:recipe-list'))
+        self.assertIn('desc="3 queries', res['Server-Timing'])
+
+    def test_list_follows_cursor(self):
+        """
+        Test the next link of an async page leads to the following page
+        :return:
+        """
+        first = self.aget(
+            reverse('recipe:recipe-list') + '?page_size=2'
+        ).json()
+        second = self.aget(
+            first['next'].replace('http://testserver', '')
+        ).json()
+        titles = [r['title'] for r in first['results'] + second['results']]
+        self.assertEqual(titles, ['Salad', 'Stew', 'Soup'])
+
+    def test_search_uses_offset_pagination(self):
+        """
+        Test ranked search results are paged by offset
+        :return:
+        """
+        res = self.aget(reverse('recipe:recipe-list') + '?q=stew').json()
+        self.assertEqual(res['count'], 1)
+        self.assertEqual(res['results'][0]['title'], 'Stew')
+
+    def test_invalid_filter_rejected(self):
+        """
+        Test filter validation errors are returned as 400
+        :return:
+        """
+        res = self.aget(reverse('recipe:recipe-list') + '?tags=abc')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_not_modified(self):
+        """
+        Test the list ETag matches the viewset's and is answered with 304
+        :return:
+        """
+        etag = self.aget(reverse('recipe:recipe-list'))['ETag']
+        self.assertEqual(
+            self.client.get(reverse('recipe:recipe-list'))['ETag'], etag
+        )
+        res = self.aget(reverse('recipe:recipe-list'), If_None_Match=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_retrieve_matches_viewset(self):
+        """
+        Test the async detail matches the viewset's
+        :return:
+        """
+        sync, res = self.sync_then_async(
+            reverse('recipe:recipe-detail', args=[self.recipe.id])
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), sync.json())
+        self.assertEqual(res['ETag'], sync['ETag'])
+
+    def test_retrieve_not_modified(self):
+        """
+        Test a conditional retrieve is answered with 304
+        :return:
+        """
+        url = reverse('recipe:recipe-detail', args=[self.recipe.id])
+        etag = self.aget(url)['ETag']
+        self.assertEqual(
+            self.aget(url, If_None_Match=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+    def test_retrieve_other_users_recipe_not_found(self):
+        """
+        Test another user's recipe is not found
+        :return:
+        """
+        other = User.objects.create_user(
+            email='other@example.com', password='password'
+        )
+        recipe = create_recipe(other)
+        res = self.aget(reverse('recipe:recipe-detail', args=[recipe.id]))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.aget(reverse('recipe:recipe-detail', args=['abc']))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tags_and_ingredients(self):
+        """
+        Test tags and ingredients are listed asynchronously
+        :return:
+        """
+        Tag.objects.create(user=self.user, name='unused')
+        res = self.aget(reverse('recipe:tag-list') + '?assigned_only=1').json()
+        self.assertEqual([t['name'] for t in res['results']], ['dinner'])
+        res = self.aget(reverse('recipe:ingredient-list')).json()
+        self.assertEqual([i['name'] for i in res['results']], ['salt'])
+
+    def test_authentication_required(self):
+        """
+        Test missing and invalid tokens are rejected
+        :return:
+        """
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            res = async_to_sync(self.async_client.get)(
+                reverse('recipe:recipe-list')
+            )
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+        res = self.aget(reverse('recipe:recipe-list'), key='invalid')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_writes_go_to_viewset(self):
+        """
+        Test other methods are still handled by the viewset
+        :return:
+        """
+        with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+            res = async_to_sync(self.async_client.post)(
+                reverse('recipe:recipe-list'),
+                {'title': 'Pie', 'time_minutes': 5, 'price': '5.00'},
+                headers={'Authorization': f'Token {self.key}'},
+            )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(
+            Recipe.objects.filter(user=self.user, title='Pie').exists()
+        )
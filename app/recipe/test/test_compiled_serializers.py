@@ -0,0 +1,145 @@
+"""
+Test the compiled serializer plans render exactly what DRF renders
+"""
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import compiled
+from recipe.serializers import (
+    RecipeSerializer, RecipeDetailsSerializer, RecipeImageSerializer,
+)
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class CompiledSerializerTests(TestCase):
+    """
+    Test plans against the serializers they are compiled from
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('vegan', 'dinner', 'quick')
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('salt', 'kale')
+        ]
+        Recipe.objects.create(
+            user=self.user, title='Plain', time_minutes=1, price=Decimal('5')
+        )
+        soup = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=30,
+            price=Decimal('10.5'), link='https://example.com/soup',
+            description='Hot', image_status=Recipe.ImageStatus.READY,
+            image_renditions={
+                'source': 'uploads/soup.jpg',
+                'thumb': {'webp': 'uploads/soup-thumb.webp'},
+            },
+        )
+        soup.tag.add(tags[2], tags[0])
+        soup.ingredients.add(*ingredients)
+        salad = Recipe.objects.create(
+            user=self.user, title='Salad', time_minutes=5,
+            price=Decimal('0.01'),
+        )
+        salad.tag.add(tags[1])
+        self.queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+
+    def assertParity(self, serializer_class, context=None):
+        """
+        Assert the plan renders the queryset to the same JSON as DRF
+        :param serializer_class:
+        :param context:
+        :return:
+        """
+        expected = serializer_class(
+            serializer_class.setup_eager_loading(self.queryset), many=True,
+            context=context or {},
+        ).data
+        plan = compiled.compile_serializer(serializer_class)
+        data = plan.render(plan.rows(self.queryset), context)
+        self.assertEqual(
+            JSONRenderer().render(data), JSONRenderer().render(expected)
+        )
+        return data
+
+    def test_recipe_serializer(self):
+        data = self.assertParity(RecipeSerializer)
+        self.assertEqual(data[0]['price'], '0.01')
+        self.assertEqual(
+            [tag['name'] for tag in data[1]['tags']], ['vegan', 'quick']
+        )
+        self.assertEqual(data[2]['tags'], [])
+
+    def test_details_serializer(self):
+        self.assertParity(RecipeDetailsSerializer)
+
+    def test_details_serializer_with_request(self):
+        request = Request(APIRequestFactory().get('/'))
+        data = self.assertParity(RecipeDetailsSerializer, {'request': request})
+        thumb = data[1]['renditions']['thumb']['webp']
+        self.assertTrue(thumb.startswith('http://testserver/'))
+
+    def test_async_render(self):
+        plan = compiled.compile_serializer(RecipeSerializer)
+        rows = list(plan.rows(self.queryset))
+
+        self.assertEqual(async_to_sync(plan.arender)(rows), plan.render(rows))
+
+    def test_iterate_in_chunks(self):
+        plan = compiled.compile_serializer(RecipeDetailsSerializer)
+
+        self.assertEqual(
+            list(plan.iterate(self.queryset, chunk_size=2)),
+            plan.render(plan.rows(self.queryset)),
+        )
+
+    def test_queries(self):
+        """
+        Test one query per relation, and none for an empty page
+        :return:
+        """
+        plan = compiled.compile_serializer(RecipeSerializer)
+        with self.assertNumQueries(3):
+            plan.render(plan.rows(self.queryset))
+        with self.assertNumQueries(0):
+            self.assertEqual(plan.render([]), [])
+
+    def test_unsupported_field(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compiled.SerializerPlan(RecipeImageSerializer)
+
+    def test_list_pages(self):
+        """
+        Test every page of the list endpoint matches DRF's rendering
+        :return:
+        """
+        client = APIClient()
+        client.force_authenticate(self.user)
+        expected = RecipeSerializer(
+            RecipeSerializer.setup_eager_loading(self.queryset), many=True
+        ).data
+        results = []
+        url = f'{RECIPES_URL}?page_size=2'
+        while url:
+            res = client.get(url)
+            results.extend(res.data['results'])
+            url = res.data['next']
+
+        self.assertEqual(
+            JSONRenderer().render(results), JSONRenderer().render(expected)
+        )
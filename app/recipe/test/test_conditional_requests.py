@@ -0,0 +1,148 @@
+"""
+Testing ETag and conditional request support
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe import cache
+from recipe.test.helpers import create_recipe
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAG_URL = reverse('recipe:tag-list')
+
+User = get_user_model()
+
+
+def recipe_details(recipe_id):
+    """
+    Return recipe detail url
+    :param recipe_id:
+    :return:
+    """
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ConditionalRequestTests(TestCase):
+    """
+    Test conditional GET and optimistic concurrency on the recipe api
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        cache.local_cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def test_list_not_modified(self):
+        """
+        Test a matching If-None-Match answers 304 without touching the database
+        :return:
+        """
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', res)
+        etag = res['ETag']
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_list_etag_changes_after_write(self):
+        """
+        Test the list ETag changes once a recipe is added
+        :return:
+        """
+        etag = self.client.get(RECIPE_URL)['ETag']
+        create_recipe(self.user, title='Another')
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_list_etag_depends_on_query(self):
+        """
+        Test different pages get different ETags
+        :return:
+        """
+        first = self.client.get(RECIPE_URL)['ETag']
+        second = self.client.get(RECIPE_URL, {'page_size': 1})['ETag']
+        self.assertNotEqual(first, second)
+
+    def test_detail_not_modified(self):
+        """
+        Test a matching If-None-Match on a recipe only reads its timestamp
+        :return:
+        """
+        res = self.client.get(recipe_details(self.recipe.id))
+        self.assertIn('Last-Modified', res)
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                recipe_details(self.recipe.id), HTTP_IF_NONE_MATCH=res['ETag']
+            )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_with_tags(self):
+        """
+        Test linking a tag changes the recipe ETag
+        :return:
+        """
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            updated_at=self.recipe.updated_at.replace(year=2000)
+        )
+        etag = self.client.get(recipe_details(self.recipe.id))['ETag']
+        self.recipe.tag.add(Tag.objects.create(user=self.user, name='dinner'))
+        res = self.client.get(
+            recipe_details(self.recipe.id), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_patch_with_stale_if_match_fails(self):
+        """
+        Test a PATCH against an outdated ETag is rejected
+        :return:
+        """
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            updated_at=self.recipe.updated_at.replace(year=2000)
+        )
+        etag = self.client.get(recipe_details(self.recipe.id))['ETag']
+        self.client.patch(recipe_details(self.recipe.id), {'title': 'First'})
+        res = self.client.patch(
+            recipe_details(self.recipe.id),
+            {'title': 'Second'},
+            HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'First')
+
+    def test_patch_with_current_if_match(self):
+        """
+        Test a PATCH against the current ETag succeeds and returns the new one
+        :return:
+        """
+        etag = self.client.get(recipe_details(self.recipe.id))['ETag']
+        res = self.client.patch(
+            recipe_details(self.recipe.id),
+            {'title': 'New'},
+            HTTP_IF_MATCH=etag,
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', res)
+
+    def test_tag_list_not_modified(self):
+        """
+        Test conditional GET on the tag list
+        :return:
+        """
+        Tag.objects.create(user=self.user, name='dinner')
+        etag = self.client.get(TAG_URL)['ETag']
+        res = self.client.get(TAG_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -1,10 +1,12 @@
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
 from rest_framework import status
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 
 User = get_user_model()
@@ -77,7 +79,7 @@ class PrivateIngredientApiTests(TestCase):
         ingredients = Ingredient.objects.all().order_by('-name')
         serializer = IngredientSerializer(ingredients, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
 
     def test_ingredients_details(self):
@@ -89,4 +91,18 @@ class PrivateIngredientApiTests(TestCase):
         res = self.client.get(ingredient_details_url(ingredient.id))
         serializer = IngredientSerializer(ingredient)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data['name'], serializer.data['name'])
\ No newline at end of file
+        self.assertEqual(res.data['name'], serializer.data['name'])
+
+    def test_filter_ingredients_assigned_only(self):
+        """
+        Test listing only ingredients assigned to recipes
+        :return:
+        """
+        salt = create_ingredient(name='salt', user=self.user)
+        create_ingredient(name='pepper', user=self.user)
+        recipe = Recipe.objects.create(
+            user=self.user, title='Eggs', time_minutes=5, price=Decimal('2.00')
+        )
+        recipe.ingredients.add(salt)
+        res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+        self.assertEqual([i['name'] for i in res.data['results']], ['salt'])
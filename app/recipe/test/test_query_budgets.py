@@ -0,0 +1,169 @@
+"""
+Test every endpoint stays within its query budget.
+
+Recipes carry many tags and ingredients, and pages are full, so a lazy
+relation in a serializer runs far more queries than the budget allows.
+The token cache is cleared before each request, so authentication costs
+what it does on a cold cache. The tests run outside a test transaction, so
+work deferred to transaction.on_commit() runs within the request and
+counts towards its budget, as it does in production.
+"""
+import io
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import AuthToken
+from recipe import cache
+from recipe.test.helpers import create_owner
+from user import authentication
+
+
+def detail(name, pk):
+    return reverse(f'recipe:{name}-detail', args=[pk])
+
+
+def names(prefix, count):
+    return [{'name': f'{prefix}{number}'} for number in range(count)]
+
+
+@override_settings(QUERY_BUDGET={'ENFORCE': True, 'SERVER_TIMING': True})
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Test the declared query budgets hold
+    """
+
+    def setUp(self):
+        self.user = create_owner(
+            30, tags=12, ingredients=12, tags_per_recipe=6,
+            ingredients_per_recipe=6,
+        )
+        self.token, key = AuthToken.objects.create_token(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        self.recipe = self.user.recipe_set.order_by('id').first()
+        self.tag = self.user.tag_set.order_by('id').first()
+        self.ingredient = self.user.ingredient_set.order_by('id').first()
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        if self.recipe.image:
+            self.recipe.image.delete()
+
+    def request(self, method, url, data=None, **kwargs):
+        """
+        Send a request on cold caches and return the response
+        :param method:
+        :param url:
+        :param data:
+        :param kwargs:
+        :return:
+        """
+        caches['default'].clear()
+        cache.local_cache.clear()
+        authentication.local_cache.clear()
+        res = getattr(self.client, method)(url, data, **kwargs)
+        self.assertIn('Server-Timing', res)
+        return res
+
+    def test_recipe_reads(self):
+        res = self.request(
+            'get', reverse('recipe:recipe-list'), {'page_size': 30}
+        )
+        self.assertEqual(len(res.data['results']), 30)
+        self.request('get', reverse('recipe:recipe-list'), {
+            'tags': self.tag.id, 'match': 'all',
+        })
+        self.request('get', detail('recipe', self.recipe.id))
+        res = self.request('get', reverse('recipe:recipe-export'))
+        b''.join(res.streaming_content)
+
+    def test_recipe_writes(self):
+        res = self.request('post', reverse('recipe:recipe-list'), {
+            'title': 'Stew', 'time_minutes': 30, 'price': '9.50',
+            'tags': names('tag', 12),
+            'ingredients': names('new ingredient', 12),
+        }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res = self.request('put', detail('recipe', self.recipe.id), {
+            'title': 'Broth', 'time_minutes': 20, 'price': '4.00',
+            'tags': names('other tag', 12),
+            'ingredients': names('ingredient', 12),
+        }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.request(
+            'patch', detail('recipe', self.recipe.id),
+            {'tags': names('tag', 12)}, format='json',
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        last = self.user.recipe_set.order_by('-id').first()
+        res = self.request('delete', detail('recipe', last.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_recipe_image_upload(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+        upload = SimpleUploadedFile(
+            'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+        )
+        # Processing runs on the image executor, off the request.
+        with patch('recipe.images.get_executor') as get_executor:
+            res = self.request(
+                'post',
+                reverse('recipe:recipe-upload-image', args=[self.recipe.id]),
+                {'image': upload}, format='multipart',
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        get_executor.return_value.submit.assert_called()
+
+    def test_tags_and_ingredients(self):
+        self.request('get', reverse('recipe:tag-list'), {'assigned_only': 1})
+        self.request('get', detail('tag', self.tag.id))
+        res = self.request(
+            'post', reverse('recipe:tag-list'), {'name': 'New tag'}
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res = self.request(
+            'patch', detail('tag', self.tag.id), {'name': 'Renamed'}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.request('delete', detail('tag', self.tag.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.request(
+            'get', reverse('recipe:ingredient-list'), {'assigned_only': 1}
+        )
+        self.request('get', detail('ingredient', self.ingredient.id))
+
+    def test_user_endpoints(self):
+        self.request('get', reverse('user:me'))
+        res = self.request('patch', reverse('user:me'), {
+            'name': 'New name', 'password': 'newpass123',
+        })
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.request('post', reverse('user:token'), {
+            'email': self.user.email, 'password': 'newpass123',
+        })
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {res.data["token"]}'
+        )
+        self.request('get', reverse('user:tokens'))
+        other, _ = AuthToken.objects.create_token(self.user, device='phone')
+        res = self.request(
+            'delete', reverse('user:token-detail', args=[other.id])
+        )
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        res = self.request('delete', reverse('user:tokens'))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.client.credentials()
+        res = self.request('post', reverse('user:create'), {
+            'email': 'new@example.com', 'password': 'newpass123',
+            'name': 'New',
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
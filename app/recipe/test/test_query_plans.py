@@ -0,0 +1,127 @@
+"""
+Test the recipe API's queries are served by indexes.
+
+Every query an endpoint runs is explained against a database where the
+user owns a small slice of each table, and the test fails if any table
+larger than SEQ_SCAN_MIN_ROWS would be read in full.
+"""
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.explain import (
+    SEQ_SCAN_MIN_ROWS, capture_selects, sequential_scans,
+)
+from core.models import AuthToken
+from recipe import cache
+from recipe.test.helpers import create_owner
+
+USERS = 30
+RECIPES_PER_USER = 60
+
+
+class QueryPlanTests(TestCase):
+    """
+    Test the plans of every read endpoint's queries
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(USERS):
+            user = create_owner(
+                RECIPES_PER_USER, tags=40, ingredients=40,
+                tags_per_recipe=3, ingredients_per_recipe=5, seed=number,
+                email=f'plans-{number}@example.com',
+            )
+        cls.user = user
+        cls.recipe = user.recipe_set.order_by('id').first()
+        cls.tag_ids = list(user.tag_set.values_list('id', flat=True)[:2])
+        cls.ingredient_ids = list(
+            user.ingredient_set.values_list('id', flat=True)[:2]
+        )
+        _, cls.key = AuthToken.objects.create_token(user)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        caches['default'].clear()
+        cache.local_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+
+    def assertIndexed(self, url, params=None):
+        """
+        Request the URL and fail on any sequential scan of a large table
+        :param url:
+        :param params:
+        :return:
+        """
+        with capture_selects(connection) as queries:
+            res = self.client.get(url, params)
+            if res.streaming:
+                b''.join(res.streaming_content)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(queries)
+        scans = sequential_scans(connection, queries)
+        self.assertFalse(scans, '\n'.join(
+            f'{table} ({rows} rows > {SEQ_SCAN_MIN_ROWS}) scanned by: {sql}'
+            for sql, table, rows in scans
+        ))
+        return res
+
+    def test_recipe_list(self):
+        res = self.assertIndexed(reverse('recipe:recipe-list'))
+        self.assertIndexed(res.data['next'])
+
+    def test_recipe_list_filtered(self):
+        tags = ','.join(str(tag_id) for tag_id in self.tag_ids)
+        ingredients = ','.join(
+            str(ingredient_id) for ingredient_id in self.ingredient_ids
+        )
+        self.assertIndexed(reverse('recipe:recipe-list'), {'tags': tags})
+        self.assertIndexed(
+            reverse('recipe:recipe-list'),
+            {'tags': tags, 'ingredients': ingredients, 'match': 'all'},
+        )
+
+    def test_recipe_search(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest(
+                'Substring search scans without the PostgreSQL GIN index'
+            )
+        self.assertIndexed(reverse('recipe:recipe-list'), {'q': 'recipe'})
+
+    def test_recipe_detail(self):
+        self.assertIndexed(
+            reverse('recipe:recipe-detail', args=[self.recipe.id])
+        )
+
+    def test_recipe_export(self):
+        self.assertIndexed(reverse('recipe:recipe-export'))
+
+    def test_tag_list(self):
+        res = self.assertIndexed(reverse('recipe:tag-list'))
+        self.assertIndexed(res.data['next'])
+        self.assertIndexed(reverse('recipe:tag-list'), {'assigned_only': 1})
+
+    def test_tag_detail(self):
+        self.assertIndexed(
+            reverse('recipe:tag-detail', args=[self.tag_ids[0]])
+        )
+
+    def test_ingredient_list(self):
+        self.assertIndexed(reverse('recipe:ingredient-list'))
+        self.assertIndexed(
+            reverse('recipe:ingredient-list'), {'assigned_only': 1}
+        )
+
+    def test_ingredient_detail(self):
+        self.assertIndexed(
+            reverse('recipe:ingredient-detail', args=[self.ingredient_ids[0]])
+        )
+
+    def test_user_tokens(self):
+        self.assertIndexed(reverse('user:tokens'))
@@ -3,11 +3,13 @@ import tempfile
 from PIL import Image
 import os
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from core.models import Recipe, Ingredient
+from core.models import Recipe, Ingredient, Tag
 from recipe.serializers import RecipeSerializer, RecipeDetailsSerializer
 
 RECIPE_URL = reverse('recipe:recipe-list')
@@ -96,7 +98,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_limited_to_user(self):
         """
@@ -113,7 +115,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_recipe_detail(self):
         """
@@ -233,6 +235,289 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_create_recipe_with_tags(self):
+        """
+        Test creating a new recipe with tags
+        :return:
+        """
+        payload = {
+            'title': 'Test Recipe',
+            'time_minutes': 10,
+            'price': Decimal('10.00'),
+            'tags': [{'name': 'tag1'}, {'name': 'tag2'}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tag.count(), 2)
+        self.assertEqual(len(res.data['tags']), 2)
+
+    def test_create_recipe_reuses_existing_tags_and_ingredients(self):
+        """
+        Test nested names resolve to existing objects instead of duplicates
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='dinner')
+        ingredient = Ingredient.objects.create(user=self.user, name='salt')
+        payload = {
+            'title': 'Test Recipe',
+            'time_minutes': 10,
+            'price': Decimal('10.00'),
+            'tags': [{'name': 'dinner'}, {'name': 'quick'}, {'name': 'quick'}],
+            'ingredients': [{'name': 'salt'}, {'name': 'pepper'}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertIn(tag, recipe.tag.all())
+        self.assertIn(ingredient, recipe.ingredients.all())
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 2)
+
+    def test_create_recipe_nested_queries_do_not_scale_with_items(self):
+        """
+        Test nested tags and ingredients are written in batches
+        :return:
+        """
+        def payload(count):
+            return {
+                'title': 'Test Recipe',
+                'time_minutes': 10,
+                'price': Decimal('10.00'),
+                'ingredients': [
+                    {'name': f'ingredient{count}-{i}'} for i in range(count)
+                ],
+            }
+
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(RECIPE_URL, payload(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(RECIPE_URL, payload(30), format='json')
+        self.assertEqual(len(small), len(large))
+
+    def test_list_recipes_query_count_is_constant(self):
+        """
+        Test listing recipes runs a fixed number of queries, whatever the
+        page size
+        :return:
+        """
+        for i in range(10):
+            recipe = create_recipe(self.user, title=f'Recipe {i}')
+            recipe.tag.add(Tag.objects.create(user=self.user, name=f'tag{i}'))
+            ingredient = Ingredient.objects.create(
+                user=self.user, name=f'ingredient{i}'
+            )
+            recipe.ingredients.add(ingredient)
+
+        # One query for recipes plus one prefetch each for tags and
+        # ingredients.
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 10)
+        self.assertEqual(len(res.data['results'][0]['tags']), 1)
+        self.assertEqual(len(res.data['results'][0]['ingredients']), 1)
+
+        with CaptureQueriesContext(connection) as small:
+            res = self.client.get(RECIPE_URL, {'page_size': 2})
+        self.assertEqual(len(res.data['results']), 2)
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.get(RECIPE_URL, {'page_size': 8})
+        self.assertEqual(len(res.data['results']), 8)
+        self.assertEqual(len(small), 3)
+        self.assertEqual(len(small), len(large))
+
+    def test_list_recipes_paginated_by_cursor(self):
+        """
+        Test recipes are paginated newest first with a stable cursor
+        :return:
+        """
+        recipes = [
+            create_recipe(self.user, title=f'Recipe {i}') for i in range(5)
+        ]
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [recipes[4].id, recipes[3].id],
+        )
+        self.assertIsNone(res.data['previous'])
+
+        create_recipe(self.user, title='Inserted while paging')
+        res = self.client.get(res.data['next'])
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [recipes[2].id, recipes[1].id],
+        )
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual(
+            [r['id'] for r in res.data['results']], [recipes[0].id]
+        )
+        self.assertIsNone(res.data['next'])
+
+    def test_filter_by_tags_any(self):
+        """
+        Test filtering recipes having any of the given tags
+        :return:
+        """
+        vegan = Tag.objects.create(user=self.user, name='vegan')
+        quick = Tag.objects.create(user=self.user, name='quick')
+        r1 = create_recipe(self.user, title='Curry')
+        r1.tag.add(vegan, quick)
+        r2 = create_recipe(self.user, title='Salad')
+        r2.tag.add(quick)
+        create_recipe(self.user, title='Steak')
+
+        res = self.client.get(RECIPE_URL, {'tags': f'{vegan.id},{quick.id}'})
+        self.assertEqual(
+            [r['title'] for r in res.data['results']], ['Salad', 'Curry']
+        )
+
+    def test_filter_by_tags_all(self):
+        """
+        Test filtering recipes having every given tag
+        :return:
+        """
+        vegan = Tag.objects.create(user=self.user, name='vegan')
+        quick = Tag.objects.create(user=self.user, name='quick')
+        r1 = create_recipe(self.user, title='Curry')
+        r1.tag.add(vegan, quick)
+        r2 = create_recipe(self.user, title='Salad')
+        r2.tag.add(quick)
+
+        res = self.client.get(
+            RECIPE_URL, {'tags': f'{vegan.id},{quick.id}', 'match': 'all'}
+        )
+        self.assertEqual([r['title'] for r in res.data['results']], ['Curry'])
+
+    def test_filter_by_tags_and_ingredients_single_query(self):
+        """
+        Test combined filters run as one query without duplicate rows
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='vegan')
+        salt = Ingredient.objects.create(user=self.user, name='salt')
+        pepper = Ingredient.objects.create(user=self.user, name='pepper')
+        recipe = create_recipe(self.user, title='Curry')
+        recipe.tag.add(tag)
+        recipe.ingredients.add(salt, pepper)
+        other = create_recipe(self.user, title='Salad')
+        other.ingredients.add(salt)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                RECIPE_URL,
+                {'tags': str(tag.id), 'ingredients': f'{salt.id},{pepper.id}'},
+            )
+        self.assertEqual([r['title'] for r in res.data['results']], ['Curry'])
+        recipe_queries = [
+            q['sql'] for q in queries if 'FROM "core_recipe"' in q['sql']
+        ]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertIn('EXISTS', recipe_queries[0])
+        self.assertNotIn('DISTINCT', recipe_queries[0])
+
+    def test_filter_invalid_ids(self):
+        """
+        Test non numeric ids are rejected
+        :return:
+        """
+        res = self.client.get(RECIPE_URL, {'tags': '1,abc'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes(self):
+        """
+        Test searching recipes by title, description and ingredient names
+        :return:
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.user, title='Green curry', description='Spicy')
+            create_recipe(
+                self.user, title='Rice bowl',
+                description='Goes well with curry',
+            )
+            salted = create_recipe(
+                self.user, title='Pretzel', description='Baked'
+            )
+            salted.ingredients.add(
+                Ingredient.objects.create(user=self.user, name='salt')
+            )
+            create_recipe(self.user, title='Pancakes', description='Sweet')
+
+        res = self.client.get(RECIPE_URL, {'q': 'curry'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['title'] for r in res.data['results']],
+            ['Green curry', 'Rice bowl'],
+        )
+        self.assertEqual(res.data['count'], 2)
+
+        res = self.client.get(RECIPE_URL, {'q': 'salt'})
+        self.assertEqual(
+            [r['title'] for r in res.data['results']], ['Pretzel']
+        )
+
+    def test_search_follows_ingredient_changes(self):
+        """
+        Test search reflects renamed ingredients
+        :return:
+        """
+        recipe = create_recipe(self.user, title='Pretzel', description='Baked')
+        ingredient = Ingredient.objects.create(user=self.user, name='salt')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.ingredients.add(ingredient)
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.name = 'sesame'
+            ingredient.save()
+
+        res = self.client.get(RECIPE_URL, {'q': 'sesame'})
+        self.assertEqual(
+            [r['title'] for r in res.data['results']], ['Pretzel']
+        )
+        res = self.client.get(RECIPE_URL, {'q': 'salt'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_search_vector_updated_once_per_write(self):
+        """
+        Test a write changing a recipe's text and ingredients recomputes its
+        search vector once, after the commit
+        :return:
+        """
+        if connection.vendor != 'postgresql':
+            self.skipTest('Search vectors are only kept on PostgreSQL')
+        recipe = create_recipe(self.user, title='Pretzel')
+        payload = {
+            'title': 'Salted pretzel', 'time_minutes': 20, 'price': '3.00',
+            'ingredients': [{'name': 'salt'}, {'name': 'flour'}],
+        }
+
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.put(recipe_details(recipe.id), payload, format='json')
+        updates = [
+            q['sql'] for q in queries if 'SET "search_vector"' in q['sql']
+        ]
+        self.assertEqual(len(updates), 1)
+        res = self.client.get(RECIPE_URL, {'q': 'flour'})
+        self.assertEqual(res.data['results'][0]['title'], 'Salted pretzel')
+
+    def test_view_recipe_detail_query_count(self):
+        """
+        Test retrieving a recipe prefetches its relations
+        :return:
+        """
+        recipe = create_recipe(self.user)
+        recipe.tag.add(Tag.objects.create(user=self.user, name='tag'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='ingredient')
+        )
+
+        with self.assertNumQueries(3):
+            res = self.client.get(recipe_details(recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'tag')
+
 
 
 class ImageUploadTest(TestCase):
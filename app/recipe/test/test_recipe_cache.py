@@ -0,0 +1,152 @@
+"""
+Testing the recipe list cache
+"""
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, SimpleTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from recipe import cache
+from recipe.test.helpers import create_recipe
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+User = get_user_model()
+
+
+class LRUCacheTests(SimpleTestCase):
+    """
+    Test the in-process cache tier
+    """
+
+    def test_evicts_least_recently_used(self):
+        """
+        Test the oldest untouched entry is evicted first
+        :return:
+        """
+        lru = cache.LRUCache(max_entries=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(len(lru), 2)
+
+
+class RecipeListCacheTests(TestCase):
+    """
+    Test caching and invalidation of recipe listings
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        cache.local_cache.clear()
+        cache.stats.reset()
+        self.user = User.objects.create_user(
+            email='test@example.com', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user, title='Soup')
+
+    def test_repeated_list_served_from_cache(self):
+        """
+        Test a repeated list request runs no queries
+        :return:
+        """
+        first = self.client.get(RECIPE_URL)
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPE_URL)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(
+            cache.stats.snapshot(),
+            {'local_hits': 1, 'shared_hits': 0, 'misses': 1},
+        )
+
+    def test_query_params_are_part_of_the_key(self):
+        """
+        Test different query parameters are cached separately
+        :return:
+        """
+        self.client.get(RECIPE_URL)
+        self.client.get(RECIPE_URL, {'page_size': 1})
+        self.assertEqual(cache.stats.snapshot()['misses'], 2)
+
+    def test_shared_tier_used_when_local_empty(self):
+        """
+        Test another worker's entry is read from the shared tier
+        :return:
+        """
+        self.client.get(RECIPE_URL)
+        cache.local_cache.clear()
+        self.client.get(RECIPE_URL)
+        self.assertEqual(cache.stats.snapshot()['shared_hits'], 1)
+
+    def test_create_recipe_invalidates(self):
+        """
+        Test creating a recipe invalidates the listing
+        :return:
+        """
+        self.client.get(RECIPE_URL)
+        self.client.post(
+            RECIPE_URL, {'title': 'Salad', 'time_minutes': 5, 'price': '5.00'}
+        )
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(
+            [r['title'] for r in res.data['results']], ['Salad', 'Soup']
+        )
+
+    def test_delete_recipe_invalidates(self):
+        """
+        Test deleting a recipe invalidates the listing
+        :return:
+        """
+        self.client.get(RECIPE_URL)
+        self.client.delete(
+            reverse('recipe:recipe-detail', args=[self.recipe.id])
+        )
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.data['results'], [])
+
+    def test_tag_rename_invalidates(self):
+        """
+        Test renaming a linked tag invalidates the listing
+        :return:
+        """
+        tag = Tag.objects.create(user=self.user, name='dinner')
+        self.recipe.tag.add(tag)
+        self.client.get(RECIPE_URL)
+        self.client.patch(
+            reverse('recipe:tag-detail', args=[tag.id]), {'name': 'supper'}
+        )
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], 'supper')
+
+    def test_other_users_writes_do_not_invalidate(self):
+        """
+        Test another user's writes leave the cached listing alone
+        :return:
+        """
+        self.client.get(RECIPE_URL)
+        other = User.objects.create_user(
+            email='other@example.com', password='password'
+        )
+        create_recipe(other)
+        self.client.get(RECIPE_URL)
+        self.assertEqual(cache.stats.snapshot()['local_hits'], 1)
+
+    def test_version_expires(self):
+        """
+        Test a version is dropped after VERSION_TIMEOUT, starting new keys
+        :return:
+        """
+        version = cache.get_version(self.user.id)
+        later = time.time() + cache.get_setting('VERSION_TIMEOUT') + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertNotEqual(cache.get_version(self.user.id), version)
@@ -0,0 +1,95 @@
+"""
+Testing the streaming recipe export api
+"""
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient
+from recipe.test.helpers import create_recipe
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+User = get_user_model()
+
+
+class PrivateRecipeExportTests(TestCase):
+    """
+    Test exporting recipes
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(
+            self.user, title='Soup', description='Test description'
+        )
+        self.recipe.tag.add(Tag.objects.create(user=self.user, name='dinner'))
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='salt')
+        )
+        other = User.objects.create_user(
+            email='other@example.com', password='password'
+        )
+        create_recipe(other, title='Not mine')
+
+    def test_export_ndjson(self):
+        """
+        Test exporting the user's recipes as NDJSON
+        :return:
+        """
+        create_recipe(self.user, title='Salad')
+        res = self.client.get(EXPORT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        body = b''.join(res.streaming_content).decode()
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Salad', 'Soup'])
+        self.assertEqual(rows[1]['price'], '10.00')
+        self.assertEqual(rows[1]['tags'][0]['name'], 'dinner')
+        self.assertEqual(rows[1]['description'], 'Test description')
+
+    def test_export_csv(self):
+        """
+        Test exporting the user's recipes as CSV
+        :return:
+        """
+        res = self.client.get(EXPORT_URL, {'output': 'csv'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        reader = csv.DictReader(
+            io.StringIO(b''.join(res.streaming_content).decode())
+        )
+        rows = list(reader)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Soup')
+        self.assertEqual(rows[0]['tags'], 'dinner')
+        self.assertEqual(rows[0]['ingredients'], 'salt')
+
+    def test_export_queries_per_chunk(self):
+        """
+        Test relations are prefetched per chunk rather than per recipe
+        :return:
+        """
+        for i in range(9):
+            create_recipe(self.user, title=f'Recipe {i}')
+        res = self.client.get(EXPORT_URL)
+        # One query for the recipes plus two prefetches for the single chunk.
+        with self.assertNumQueries(3):
+            b''.join(res.streaming_content)
+
+    def test_export_invalid_output(self):
+        """
+        Test an unknown output format is rejected
+        :return:
+        """
+        res = self.client.get(EXPORT_URL, {'output': 'xml'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,192 @@
+"""
+Testing the recipe image processing pipeline
+"""
+import io
+import os
+import shutil
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import images
+
+User = get_user_model()
+
+
+def image_upload_url(recipe_id):
+    """
+    Return the image upload url of a recipe
+    :param recipe_id:
+    :return:
+    """
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def make_jpeg(size=(2000, 1500), orientation=None):
+    """
+    Return an uploaded JPEG with camera and GPS EXIF tags, optionally with
+    an orientation tag
+    :param size:
+    :param orientation:
+    :return:
+    """
+    image = Image.new('RGB', size, color=(200, 100, 50))
+    exif = Image.Exif()
+    exif[0x010F] = 'Test camera'
+    exif.get_ifd(0x8825)[2] = (52.0, 22.0, 1.0)
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', exif=exif)
+    return SimpleUploadedFile(
+        'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+@override_settings(RECIPE_IMAGE_EXECUTOR='immediate')
+class RecipeImagePipelineTests(TestCase):
+    """
+    Test uploads are processed into renditions
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10,
+            price=Decimal('5.00'),
+        )
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        if self.recipe.image:
+            renditions = os.path.dirname(
+                images.rendition_path(self.recipe.image.path, 'x', 'y')
+            )
+            shutil.rmtree(renditions, ignore_errors=True)
+            self.recipe.image.delete()
+
+    def upload(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(self.recipe.id), {'image': upload},
+                format='multipart',
+            )
+        self.recipe.refresh_from_db()
+        return res
+
+    def test_upload_is_pending_then_ready(self):
+        """
+        Test the upload returns pending and the worker records renditions
+        :return:
+        """
+        res = self.upload(make_jpeg())
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['image_status'], Recipe.ImageStatus.PENDING
+        )
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.READY)
+
+        detail = self.client.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id])
+        )
+        self.assertEqual(
+            detail.data['image_status'], Recipe.ImageStatus.READY
+        )
+        self.assertEqual(
+            set(detail.data['renditions']), set(images.RENDITIONS)
+        )
+        thumbnail = detail.data['renditions']['thumbnail']['webp']
+        self.assertTrue(thumbnail.startswith('http://testserver/'))
+
+    def test_renditions_resized_and_stripped(self):
+        """
+        Test renditions fit their box, follow EXIF orientation and drop EXIF
+        :return:
+        """
+        # Orientation 6 means the camera was rotated, so the stored image
+        # is portrait.
+        self.upload(make_jpeg(orientation=6))
+        for name, box in images.RENDITIONS.items():
+            for extension in images.FORMATS:
+                path = self.recipe.image_renditions[name][extension]
+                path = self.recipe.image.storage.path(path)
+                with Image.open(path) as rendition:
+                    self.assertLessEqual(rendition.width, box[0])
+                    self.assertLessEqual(rendition.height, box[1])
+                    self.assertGreater(rendition.height, rendition.width)
+                    self.assertEqual(len(rendition.getexif()), 0)
+
+    def test_original_stripped(self):
+        """
+        Test the stored original loses its EXIF, GPS position included,
+        keeps its orientation and replaces the uploaded file
+        :return:
+        """
+        with patch('recipe.images.process_recipe_image'):
+            self.upload(make_jpeg(size=(300, 200), orientation=6))
+        uploaded = self.recipe.image.path
+        images.process_recipe_image(self.recipe.id)
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.image.path, uploaded)
+        self.assertFalse(os.path.exists(uploaded))
+        with Image.open(self.recipe.image.path) as original:
+            self.assertEqual(len(original.getexif()), 0)
+            self.assertEqual(original.size, (200, 300))
+
+    def test_replaced_image_files_deleted(self):
+        """
+        Test uploading a new image deletes the previous one and its
+        renditions
+        :return:
+        """
+        self.upload(make_jpeg(size=(300, 200)))
+        old = [self.recipe.image.path] + [
+            self.recipe.image.storage.path(path)
+            for name, formats in self.recipe.image_renditions.items()
+            if name != 'source'
+            for path in formats.values()
+        ]
+        self.assertTrue(all(os.path.exists(path) for path in old))
+
+        self.upload(make_jpeg(size=(400, 300)))
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.READY)
+        self.assertFalse(any(os.path.exists(path) for path in old))
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_processing_is_idempotent(self):
+        """
+        Test processing an already processed image does nothing
+        :return:
+        """
+        self.upload(make_jpeg(size=(300, 200)))
+        with patch('recipe.images._render') as render:
+            images.process_recipe_image(self.recipe.id)
+        render.assert_not_called()
+
+    def test_failed_processing_is_recorded(self):
+        """
+        Test a decoding failure marks the image failed
+        :return:
+        """
+        with patch('recipe.images._render', side_effect=OSError('broken')), \
+                self.assertLogs('recipe.images', level='ERROR'):
+            self.upload(make_jpeg(size=(300, 200)))
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.FAILED)
+        directory = os.path.dirname(self.recipe.image.path)
+        files = [
+            name for name in os.listdir(directory)
+            if os.path.isfile(os.path.join(directory, name))
+        ]
+        self.assertEqual(files, [os.path.basename(self.recipe.image.path)])
@@ -0,0 +1,187 @@
+"""
+Testing the bulk recipe import api
+"""
+import io
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import bulk
+from recipe.views import RecipeViewSet
+
+IMPORT_URL = reverse('recipe:recipe-bulk-import')
+
+User = get_user_model()
+
+
+def recipe_payload(**params):
+    """
+    Return a valid recipe row
+    :param params:
+    :return:
+    """
+    defaults = {
+        'title': 'Test Recipe',
+        'time_minutes': 10,
+        'price': '10.00',
+    }
+    defaults.update(params)
+    return defaults
+
+
+def read_results(res):
+    """
+    Collect the NDJSON results of a streaming response
+    :param res:
+    :return:
+    """
+    body = b''.join(res.streaming_content).decode()
+    return [json.loads(line) for line in body.splitlines()]
+
+
+class StreamParserTests(SimpleTestCase):
+    """
+    Test the incremental body parsers
+    """
+
+    def test_json_array_split_across_reads(self):
+        """
+        Test array items are parsed when they straddle read boundaries
+        :return:
+        """
+        items = [{'title': 'café %d' % i, 'n': i * 1000} for i in range(20)]
+        stream = io.BytesIO(json.dumps(items).encode())
+        self.assertEqual(
+            list(bulk.iter_json_array(stream, read_size=7)), items
+        )
+
+    def test_json_array_empty(self):
+        """
+        Test an empty array yields nothing
+        :return:
+        """
+        self.assertEqual(list(bulk.iter_json_array(io.BytesIO(b' [ ] '))), [])
+
+    def test_json_array_malformed(self):
+        """
+        Test a body that is not an array is rejected
+        :return:
+        """
+        with self.assertRaises(bulk.MalformedPayload):
+            list(bulk.iter_json_array(io.BytesIO(b'{"title": "x"}')))
+
+    def test_ndjson_reports_bad_lines(self):
+        """
+        Test a bad NDJSON line is reported without stopping the parser
+        :return:
+        """
+        stream = io.BytesIO(b'{"a": 1}\nnot json\n\n{"a": 2}')
+        rows = list(bulk.iter_ndjson(stream, read_size=3))
+        self.assertEqual(rows[0], {'a': 1})
+        self.assertIsInstance(rows[1], bulk.MalformedPayload)
+        self.assertEqual(rows[2], {'a': 2})
+
+
+class PrivateRecipeImportTests(TestCase):
+    """
+    Test importing recipes in bulk
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='test@example.com', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_import_ndjson(self):
+        """
+        Test importing recipes with tags and ingredients from NDJSON
+        :return:
+        """
+        Tag.objects.create(user=self.user, name='dinner')
+        rows = [
+            recipe_payload(
+                title='One',
+                tags=[{'name': 'dinner'}],
+                ingredients=[{'name': 'salt'}],
+            ),
+            recipe_payload(
+                title='Two',
+                tags=[{'name': 'quick'}],
+                ingredients=[{'name': 'salt'}],
+            ),
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows)
+        res = self.client.generic(
+            'POST', IMPORT_URL, body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = read_results(res)
+        self.assertEqual(
+            [r['status'] for r in results], ['created', 'created']
+        )
+
+        recipe = Recipe.objects.get(id=results[0]['id'], user=self.user)
+        self.assertEqual(recipe.title, 'One')
+        self.assertEqual([t.name for t in recipe.tag.all()], ['dinner'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+
+    def test_import_json_array_bad_row_does_not_abort(self):
+        """
+        Test an invalid row is reported while the others are imported
+        :return:
+        """
+        rows = [
+            recipe_payload(title='One'),
+            {'title': 'Missing fields'},
+            recipe_payload(title='Three'),
+        ]
+        res = self.client.generic(
+            'POST', IMPORT_URL, json.dumps(rows),
+            content_type='application/json',
+        )
+        results = read_results(res)
+        self.assertEqual(
+            [r['status'] for r in results], ['created', 'error', 'created']
+        )
+        self.assertEqual(results[1]['row'], 1)
+        self.assertIn('time_minutes', results[1]['errors'])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_import_in_chunks(self):
+        """
+        Test rows are written in chunks of the configured size
+        :return:
+        """
+        rows = [recipe_payload(title=f'Recipe {i}') for i in range(5)]
+        body = '\n'.join(json.dumps(row) for row in rows)
+        spy = patch('recipe.bulk._write_chunk', wraps=bulk._write_chunk)
+        with patch.object(RecipeViewSet, 'import_chunk_size', 2), \
+                spy as write_chunk:
+            res = self.client.generic(
+                'POST', IMPORT_URL, body, content_type='application/x-ndjson'
+            )
+            results = read_results(res)
+        self.assertEqual(write_chunk.call_count, 3)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+
+    def test_import_unsupported_media_type(self):
+        """
+        Test other content types are rejected
+        :return:
+        """
+        res = self.client.generic(
+            'POST', IMPORT_URL, 'title,price', content_type='text/csv'
+        )
+        self.assertEqual(
+            res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
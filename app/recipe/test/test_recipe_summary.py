@@ -0,0 +1,160 @@
+"""
+Test the denormalized tag and ingredient summaries of recipes
+"""
+import json
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import summary
+
+RECIPES_URL = reverse('recipe:recipe-list')
+IMPORT_URL = reverse('recipe:recipe-bulk-import')
+
+
+def summary_of(recipe):
+    recipe.refresh_from_db()
+    return (
+        recipe.tag_count, recipe.ingredient_count,
+        recipe.tag_names, recipe.ingredient_names,
+    )
+
+
+class RecipeSummaryTests(TestCase):
+    """
+    Test summaries follow every change of a recipe's tags and ingredients
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10, price=Decimal('5')
+        )
+        self.vegan = Tag.objects.create(user=self.user, name='vegan')
+        self.quick = Tag.objects.create(user=self.user, name='quick')
+        self.salt = Ingredient.objects.create(user=self.user, name='salt')
+
+    def test_link_and_unlink(self):
+        self.assertEqual(summary_of(self.recipe), (0, 0, [], []))
+
+        self.recipe.tag.add(self.quick, self.vegan)
+        self.recipe.ingredients.add(self.salt)
+        self.assertEqual(
+            summary_of(self.recipe), (2, 1, ['vegan', 'quick'], ['salt'])
+        )
+
+        self.recipe.tag.remove(self.vegan)
+        self.assertEqual(summary_of(self.recipe), (1, 1, ['quick'], ['salt']))
+
+        self.recipe.ingredients.clear()
+        self.assertEqual(summary_of(self.recipe), (1, 0, ['quick'], []))
+
+    def test_reverse_changes(self):
+        other = Recipe.objects.create(
+            user=self.user, title='Salad', time_minutes=5, price=Decimal('3')
+        )
+
+        self.vegan.recipes.add(self.recipe, other)
+        self.assertEqual(summary_of(other), (1, 0, ['vegan'], []))
+
+        self.vegan.recipes.clear()
+        self.assertEqual(summary_of(self.recipe), (0, 0, [], []))
+        self.assertEqual(summary_of(other), (0, 0, [], []))
+
+    def test_rename_and_delete(self):
+        self.recipe.tag.add(self.vegan, self.quick)
+        self.recipe.ingredients.add(self.salt)
+
+        self.vegan.name = 'plant based'
+        self.vegan.save()
+        self.salt.name = 'sea salt'
+        self.salt.save()
+        self.assertEqual(
+            summary_of(self.recipe),
+            (2, 1, ['plant based', 'quick'], ['sea salt']),
+        )
+
+        self.quick.delete()
+        self.salt.delete()
+        self.assertEqual(summary_of(self.recipe), (1, 0, ['plant based'], []))
+
+    def test_save_keeps_summaries(self):
+        """
+        Test saving a recipe loaded before its tags changed leaves the
+        summaries alone
+        :return:
+        """
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.recipe.tag.add(self.vegan)
+
+        recipe.title = 'Stew'
+        recipe.save()
+
+        self.assertEqual(summary_of(recipe), (1, 0, ['vegan'], []))
+        self.assertEqual(recipe.title, 'Stew')
+
+    def test_api(self):
+        """
+        Test recipes created through the API and bulk import render their
+        summaries, and lists of summaries read no relations
+        :return:
+        """
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = {
+            'title': 'Curry', 'time_minutes': 30, 'price': '8.00',
+            'tags': [{'name': 'vegan'}, {'name': 'spicy'}],
+            'ingredients': [{'name': 'rice'}],
+        }
+        res = client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(res.data['tag_count'], 2)
+        self.assertEqual(res.data['tag_names'], ['vegan', 'spicy'])
+        self.assertEqual(res.data['ingredient_names'], ['rice'])
+        res = client.generic(
+            'POST', IMPORT_URL, json.dumps([payload]),
+            content_type='application/json',
+        )
+        b''.join(res.streaming_content)
+
+        fields = 'title,tag_count,ingredient_count,tag_names,ingredient_names'
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get(RECIPES_URL, {'fields': fields})
+
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('core_recipe_tag', sql)
+        self.assertNotIn('core_recipe_ingredients', sql)
+        for item in res.data['results'][:2]:
+            self.assertEqual(item['tag_count'], 2)
+            self.assertEqual(item['ingredient_count'], 1)
+            self.assertEqual(sorted(item['tag_names']), ['spicy', 'vegan'])
+            self.assertEqual(item['ingredient_names'], ['rice'])
+
+    def test_rebuild_command(self):
+        self.recipe.tag.add(self.vegan)
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            tag_count=5, tag_names=['stale']
+        )
+        stale = summary.stale_summaries(Recipe.objects.all())
+        self.assertEqual(list(stale), [self.recipe])
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'rebuild_recipe_summaries', '--verify', stdout=StringIO()
+            )
+
+        call_command(
+            'rebuild_recipe_summaries', '--chunk-size', '1', stdout=StringIO()
+        )
+
+        self.assertEqual(summary_of(self.recipe), (1, 0, ['vegan'], []))
+        call_command('rebuild_recipe_summaries', '--verify', stdout=StringIO())
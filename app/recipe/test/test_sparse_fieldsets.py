@@ -0,0 +1,147 @@
+"""
+Test sparse fieldsets trim both the payload and the SQL
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class SparseFieldsetTests(TestCase):
+    """
+    Test ?fields= and ?omit= on the recipe, tag and ingredient reads
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tags = [
+            Tag.objects.create(user=self.user, name=f'tag{i}')
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'ingredient{i}')
+            for i in range(3)
+        ]
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=i,
+                price=Decimal('5.50'),
+                link='https://example.com/recipe',
+                description='A long description. ' * 20,
+            )
+            recipe.tag.add(*tags)
+            recipe.ingredients.add(*ingredients)
+        self.recipe = recipe
+
+    def get(self, url, params=None):
+        """
+        Return the response and the SQL it ran
+        :param url:
+        :param params:
+        :return:
+        """
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(url, params)
+        return res, [query['sql'] for query in context.captured_queries]
+
+    def test_list_fields(self):
+        full, full_queries = self.get(RECIPES_URL)
+        res, queries = self.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [list(item) for item in res.data['results']], [['id', 'title']] * 5
+        )
+        self.assertEqual(len(queries), len(full_queries) - 2)
+        self.assertNotIn('"price"', queries[-1])
+        self.assertLess(len(res.content), len(full.content) / 3)
+
+    def test_list_omit(self):
+        res, queries = self.get(RECIPES_URL, {'omit': 'ingredients,link'})
+
+        item = res.data['results'][0]
+        self.assertEqual(list(item), [
+            'id', 'title', 'time_minutes', 'price', 'tags', 'tag_count',
+            'ingredient_count', 'tag_names', 'ingredient_names',
+        ])
+        self.assertEqual(len(item['tags']), 3)
+        self.assertFalse(
+            any('core_recipe_ingredients' in sql for sql in queries)
+        )
+
+    def test_list_pages(self):
+        """
+        Test cursor pagination works with the ordering column left out
+        :return:
+        """
+        res = self.client.get(RECIPES_URL, {'fields': 'title', 'page_size': 2})
+        titles = [item['title'] for item in res.data['results']]
+        res = self.client.get(res.data['next'])
+        titles += [item['title'] for item in res.data['results']]
+
+        self.assertEqual(
+            titles, ['Recipe 4', 'Recipe 3', 'Recipe 2', 'Recipe 1']
+        )
+
+    def test_retrieve_defers_columns(self):
+        full, full_queries = self.get(detail_url(self.recipe.id))
+        res, queries = self.get(
+            detail_url(self.recipe.id), {'fields': 'id,title,price'}
+        )
+
+        self.assertEqual(
+            res.data,
+            {'id': self.recipe.id, 'title': 'Recipe 4', 'price': '5.50'},
+        )
+        self.assertEqual(len(queries), len(full_queries) - 2)
+        self.assertTrue(any('"description"' in sql for sql in full_queries))
+        self.assertFalse(any('"description"' in sql for sql in queries))
+        self.assertLess(len(res.content), len(full.content) / 5)
+
+    def test_tag_and_ingredient_lists(self):
+        for url in (TAGS_URL, INGREDIENTS_URL):
+            with self.subTest(url=url):
+                res, queries = self.get(url, {'fields': 'id', 'page_size': 2})
+
+                self.assertEqual(
+                    [list(item) for item in res.data['results']],
+                    [['id'], ['id']],
+                )
+                self.assertEqual(len(queries), 1)
+                res = self.client.get(res.data['next'])
+                self.assertEqual(len(res.data['results']), 1)
+
+    def test_unknown_field(self):
+        res = self.client.get(RECIPES_URL, {'fields': 'id,secret'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+
+    def test_writes_ignore_fields(self):
+        res = self.client.patch(
+            f'{detail_url(self.recipe.id)}?fields=id', {'title': 'Renamed'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Renamed')
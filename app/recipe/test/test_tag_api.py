@@ -1,12 +1,14 @@
 """
 Testing tag api
 """
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
-from core.models import Tag
+from core.models import Recipe, Tag
 from recipe.serializers import TagSerializer
 TAG_URL = reverse('recipe:tag-list')
 
@@ -65,7 +67,7 @@ class PrivateTagApiTests(TestCase):
         tags = Tag.objects.all().order_by('-name')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
 
     def test_tags_limited_to_user(self):
@@ -81,7 +83,7 @@ class PrivateTagApiTests(TestCase):
         user_tags = Tag.objects.filter(user=self.user).order_by('-name')
         serializer = TagSerializer(user_tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
 
 
@@ -97,6 +99,44 @@ class PrivateTagApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_tags_paginated_by_name(self):
+        """
+        Test tags are paginated by name with a configurable page size
+        :return:
+        """
+        for name in ['a', 'b', 'c']:
+            create_tag(name, user=self.user)
+        res = self.client.get(TAG_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([t['name'] for t in res.data['results']], ['c', 'b'])
+        res = self.client.get(res.data['next'])
+        self.assertEqual([t['name'] for t in res.data['results']], ['a'])
+        self.assertIsNone(res.data['next'])
 
-
-
+    def test_create_duplicate_tag_rejected(self):
+        """
+        Test creating a tag with an existing name fails validation
+        :return:
+        """
+        create_tag('tag1', user=self.user)
+        res = self.client.post(TAG_URL, {'name': 'tag1'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='tag1').count(), 1
+        )
+
+    def test_filter_tags_assigned_only(self):
+        """
+        Test listing only tags assigned to recipes
+        :return:
+        """
+        tag1 = create_tag('breakfast', user=self.user)
+        create_tag('lunch', user=self.user)
+        recipe = Recipe.objects.create(
+            user=self.user, title='Eggs', time_minutes=5, price=Decimal('2.00')
+        )
+        recipe.tag.add(tag1)
+        res = self.client.get(TAG_URL, {'assigned_only': 1})
+        self.assertEqual(
+            [t['name'] for t in res.data['results']], ['breakfast']
+        )
@@ -1,6 +1,8 @@
 from  rest_framework.routers import DefaultRouter
+from django.conf import settings
 from django.urls import path, include
 from . import  views
+from .async_views import with_async_reads
 app_name = 'recipe'
 
 router = DefaultRouter()
@@ -8,7 +10,11 @@ router = DefaultRouter()
 router.register('recipe', views.RecipeViewSet, basename='recipe')
 router.register('tag', views.TagViewSet, basename='tag')
 router.register('user', views.IngredientViewSet, basename='ingredient')
+router_urls = router.urls
+if settings.API_ASYNC_READS:
+    router_urls = with_async_reads(router_urls)
+
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(router_urls))
 
-]
\ No newline at end of file
+]
@@ -1,9 +1,26 @@
-from rest_framework import viewsets, permissions, authentication, mixins, status
+import io
 
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
+from rest_framework import viewsets, permissions, mixins, status, serializers
+
+from core import fastjson, metrics
 from core.models import Recipe, Tag, Ingredient
+from user.authentication import CachedTokenAuthentication
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from . import bulk, filters, images, search
+from .mixins import (
+    CachedListMixin,
+    CompiledListMixin,
+    ConditionalRequestMixin,
+    SparseFieldsetMixin,
+)
+from .pagination import (
+    RecipeCursorPagination, RecipeSearchPagination, NameCursorPagination,
+)
 from .serializers import RecipeSerializer, RecipeDetailsSerializer, TagSerializer, IngredientSerializer, \
     RecipeImageSerializer
 
@@ -11,17 +28,79 @@ from .serializers import RecipeSerializer, RecipeDetailsSerializer, TagSerialize
 # Create your views here.
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    SparseFieldsetMixin,
+    ConditionalRequestMixin,
+    CachedListMixin,
+    CompiledListMixin,
+    viewsets.ModelViewSet,
+):
     """
     API endpoint that allows users to be viewed or edited.
     """
-    queryset = Recipe.objects.all()
+    cache_prefix = 'recipe-list'
+    queryset = Recipe.objects.defer('search_vector')
     serializer_class = RecipeDetailsSerializer
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    pagination_class = RecipeCursorPagination
+    import_chunk_size = bulk.DEFAULT_CHUNK_SIZE
+    export_chunk_size = bulk.DEFAULT_CHUNK_SIZE
+    # Queries per request whatever the page size or number of tags and
+    # ingredients, with a cold token cache and on-commit work included;
+    # see core/queries.py. Imports grow with the number of chunks, and
+    # exports query while streaming, after the budget is checked, so
+    # neither has one.
+    query_budget = {
+        # Search results are offset paginated, which adds a count.
+        'list': 5,
+        'retrieve': 4,
+        'create': 16,
+        'update': 20,
+        'partial_update': 20,
+        'destroy': 7,
+        'upload_image': 5,
+    }
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        """
+        Return recipes for the authenticated user, eager loading the
+        relations rendered by the serializer in use.
+        :return:
+        """
+        queryset = self.queryset.filter(user=self.request.user).order_by('-id')
+        if self.action in ('list', 'export'):
+            queryset = filters.filter_recipes(
+                queryset, self.request.query_params
+            )
+            if self.request.query_params.get('q'):
+                queryset = search.search_recipes(
+                    queryset, self.request.query_params['q']
+                )
+        # The compiled list reads the relations it renders itself, and
+        # summary fields alone read none; see CompiledListMixin.
+        serializer_class = self.get_serializer_class()
+        if self.action != 'list' and hasattr(
+            serializer_class, 'setup_eager_loading'
+        ):
+            queryset = serializer_class.setup_eager_loading(
+                queryset, fields=self.get_sparse_fields()
+            )
+        return queryset
+
+    @property
+    def paginator(self):
+        """
+        Rank ordered search results can not be keyset paginated, so page
+        them by offset instead.
+        :return:
+        """
+        if not hasattr(self, '_paginator'):
+            if self.request is not None and self.request.query_params.get('q'):
+                self._paginator = RecipeSearchPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_serializer_class(self):
         """
@@ -53,21 +132,112 @@ class RecipeViewSet(viewsets.ModelViewSet):
         :return:
         """
         recipe = self.get_object()
+        replaced = recipe.image.name, recipe.image_renditions
         serializer = self.get_serializer(recipe, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            recipe = serializer.save()
+            images.schedule_processing(recipe, replaced=replaced)
+            metrics.IMAGE_UPLOADS.inc()
+            metrics.IMAGE_UPLOAD_BYTES.inc(
+                serializer.validated_data['image'].size
+            )
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request, *args, **kwargs):
+        """
+        Import recipes from an NDJSON or JSON array body.
+
+        The body is parsed as it is read and written in chunks; the response
+        streams one NDJSON result per input row.
+        :param request:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        stream = request.stream or io.BytesIO()
+        if request.content_type.startswith('application/json'):
+            rows = bulk.iter_json_array(stream)
+        elif request.content_type.startswith(
+            ('application/x-ndjson', 'application/jsonl')
+        ):
+            rows = bulk.iter_ndjson(stream)
+        else:
+            return Response(
+                {'detail': _(
+                    'Expected application/json or application/x-ndjson body.'
+                )},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        results = bulk.import_recipes(
+            request.user,
+            rows,
+            self.get_serializer_class(),
+            self.get_serializer_context(),
+            chunk_size=self.import_chunk_size,
+        )
+        return StreamingHttpResponse(
+            (fastjson.dumps(result) + b'\n' for result in results),
+            content_type='application/x-ndjson',
+        )
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request, *args, **kwargs):
+        """
+        Stream all of the user's recipes as NDJSON (default) or CSV.
+
+        Pick the encoding with `?output=csv`; `format` is reserved by DRF.
+        :param request:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in ('ndjson', 'csv'):
+            return Response(
+                {'output': [_('Expected "ndjson" or "csv".')]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        rows = bulk.iter_export_rows(
+            self.get_queryset(),
+            self.get_serializer_class(),
+            chunk_size=self.export_chunk_size,
+        )
+        if output == 'csv':
+            response = StreamingHttpResponse(
+                bulk.iter_csv_export(rows), content_type='text/csv'
+            )
+        else:
+            response = StreamingHttpResponse(
+                bulk.iter_ndjson_export(rows),
+                content_type='application/x-ndjson',
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{output}"'
+        )
+        return response
 
-class TagViewSet(viewsets.ModelViewSet):
+
+class TagViewSet(
+    SparseFieldsetMixin, ConditionalRequestMixin, viewsets.ModelViewSet
+):
     """
     Tag ApI view
     """
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    pagination_class = NameCursorPagination
+    query_budget = {
+        'list': 2,
+        'retrieve': 2,
+        'create': 2,
+        'update': 5,
+        'partial_update': 5,
+        'destroy': 6,
+    }
 
     def perform_create(self, serializer):
         """
@@ -75,28 +245,70 @@ class TagViewSet(viewsets.ModelViewSet):
         :param serializer:
         :return:
         """
-        serializer.save(user=self.request.user)
+        self._save_unique_name(serializer, user=self.request.user)
+
+    def perform_update(self, serializer):
+        """
+        Update a `Tag` instance.
+        :param serializer:
+        :return:
+        """
+        self._save_unique_name(serializer)
+
+    def _save_unique_name(self, serializer, **kwargs):
+        """
+        Save the tag, reporting a duplicate name as a validation error
+        :param serializer:
+        :param kwargs:
+        :return:
+        """
+        try:
+            with transaction.atomic():
+                serializer.save(**kwargs)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'name': [_('A tag with this name already exists.')]}
+            )
 
     def get_queryset(self):
         """
         Return appropriate tag queryset.
         :return:
         """
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        queryset = queryset.order_by('-name', '-id')
+        return filters.filter_assigned_only(
+            queryset, self.request.query_params, 'tags'
+        )
 
 
-class IngredientViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+class IngredientViewSet(
+    SparseFieldsetMixin,
+    ConditionalRequestMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
     """
     Ingredient ApI view
     """
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
+    pagination_class = NameCursorPagination
+    query_budget = {
+        'list': 2,
+        'retrieve': 2,
+    }
 
     def get_queryset(self):
         """
         Return appropriate ingredient queryset.
         :return:
         """
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        queryset = queryset.order_by('-name', '-id')
+        return filters.filter_assigned_only(
+            queryset, self.request.query_params, 'ingredients'
+        )
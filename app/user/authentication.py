@@ -0,0 +1,352 @@
+"""
+Token authentication backed by a token -> user cache.
+
+Tokens are looked up by the SHA-256 digest of the key sent by the client,
+first in a short lived in-process tier, then in the shared cache and only
+then in the database. Deleting a token or saving its user drops the cached
+entries; other processes may keep serving their local copy for at most
+AUTH_TOKEN_CACHE['LOCAL_TTL'] seconds. That bound needs a cache shared by
+the processes, which app/caches.py requires of more than one; with a
+process local cache, entries also expire after LOCAL_TTL. Tokens expire
+AUTH_TOKEN_LIFETIME after their last renewal, which happens at most every
+AUTH_TOKEN_RENEW_INTERVAL while the token is in use.
+
+Only plain data is cached: the token's digest, expiry and user id, and the
+user fields requests read. The password hash never leaves the database.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication, exceptions
+
+from core import metrics, routers
+from core.cache import LRUCache
+from core.models import AuthToken, token_lifetime
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'LOCAL_TTL': 10,
+    'LOCAL_MAX_ENTRIES': 4096,
+}
+
+
+def get_setting(name):
+    """
+    Return an AUTH_TOKEN_CACHE setting, falling back to the default
+    :param name:
+    :return:
+    """
+    return getattr(settings, 'AUTH_TOKEN_CACHE', {}).get(name, DEFAULTS[name])
+
+
+TOKEN_FIELDS = ('id', 'digest', 'user_id', 'device')
+# Other user fields are deferred and loaded from the database if read.
+USER_FIELDS = ('id', 'email', 'name', 'is_active', 'is_staff', 'is_superuser')
+
+# Every request builds its own token and user instances from an entry;
+# views are free to modify request.user.
+local_cache = LRUCache(
+    get_setting('LOCAL_MAX_ENTRIES'), ttl=get_setting('LOCAL_TTL')
+)
+
+
+def _shared_cache():
+    return caches[get_setting('ALIAS')]
+
+
+def _key(digest):
+    return f'auth:token:{digest}'
+
+
+def _dump(token):
+    """
+    Return the cache entry of a token and its user
+    :param token:
+    :return:
+    """
+    entry = {name: getattr(token, name) for name in TOKEN_FIELDS}
+    entry['expires_at'] = token.expires_at.isoformat()
+    entry['user'] = {name: getattr(token.user, name) for name in USER_FIELDS}
+    return entry
+
+
+def _instance(model, values):
+    names = [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return model.from_db(
+        DEFAULT_DB_ALIAS, names, [values[name] for name in names]
+    )
+
+
+def _load(entry):
+    """
+    Build the token and its user from a cache entry
+    :param entry:
+    :return:
+    """
+    values = {name: entry[name] for name in TOKEN_FIELDS}
+    values['expires_at'] = datetime.fromisoformat(entry['expires_at'])
+    token = _instance(AuthToken, values)
+    token.user = _instance(get_user_model(), entry['user'])
+    return token
+
+
+def get_token(digest):
+    """
+    Return the token with the given digest and its user, or None
+    :param digest:
+    :return:
+    """
+    cached = local_cache.get(digest)
+    result = 'local_hits'
+    if cached is None:
+        cached = _shared_cache().get(_key(digest))
+        result = 'shared_hits'
+        if cached is not None:
+            local_cache.set(digest, cached)
+    if cached is not None:
+        metrics.AUTH_TOKEN_CACHE.inc(result=result)
+        return _load(cached)
+
+    metrics.AUTH_TOKEN_CACHE.inc(result='misses')
+
+    tokens = AuthToken.objects.select_related('user').filter(digest=digest)
+    token = tokens.first()
+    if token is not None and token.user.is_active and not token.is_expired():
+        store(token)
+    return token
+
+
+def store(token):
+    """
+    Cache the token and its user in both tiers
+    :param token:
+    :return:
+    """
+    entry = _dump(token)
+    local_cache.set(token.digest, entry)
+    _shared_cache().set(
+        _key(token.digest), entry, timeout=get_setting('TIMEOUT')
+    )
+
+
+def _renewal_due(token, now):
+    renewed_at = token.expires_at - token_lifetime()
+    return now - renewed_at >= getattr(
+        settings, 'AUTH_TOKEN_RENEW_INTERVAL', timedelta(hours=1)
+    )
+
+
+def renew(token, now):
+    """
+    Slide the token's expiry forward once RENEW_INTERVAL has passed since
+    its last renewal, so an active client does not write on every request.
+    Return False if the token has been revoked meanwhile.
+    :param token:
+    :param now:
+    :return:
+    """
+    if not _renewal_due(token, now):
+        return True
+    token.expires_at = now + token_lifetime()
+    if not AuthToken.objects.filter(pk=token.pk).update(
+        expires_at=token.expires_at
+    ):
+        invalidate(token.digest)
+        return False
+    store(token)
+    return True
+
+
+async def aget_token(digest):
+    """
+    Async version of get_token()
+    :param digest:
+    :return:
+    """
+    cached = local_cache.get(digest)
+    result = 'local_hits'
+    if cached is None:
+        cached = await _shared_cache().aget(_key(digest))
+        result = 'shared_hits'
+        if cached is not None:
+            local_cache.set(digest, cached)
+    if cached is not None:
+        metrics.AUTH_TOKEN_CACHE.inc(result=result)
+        return _load(cached)
+
+    metrics.AUTH_TOKEN_CACHE.inc(result='misses')
+
+    tokens = AuthToken.objects.select_related('user').filter(digest=digest)
+    token = await tokens.afirst()
+    if token is not None and token.user.is_active and not token.is_expired():
+        await astore(token)
+    return token
+
+
+async def astore(token):
+    """
+    Async version of store()
+    :param token:
+    :return:
+    """
+    entry = _dump(token)
+    local_cache.set(token.digest, entry)
+    await _shared_cache().aset(
+        _key(token.digest), entry, timeout=get_setting('TIMEOUT')
+    )
+
+
+async def arenew(token, now):
+    """
+    Async version of renew()
+    :param token:
+    :param now:
+    :return:
+    """
+    if not _renewal_due(token, now):
+        return True
+    token.expires_at = now + token_lifetime()
+    if not await AuthToken.objects.filter(pk=token.pk).aupdate(
+        expires_at=token.expires_at
+    ):
+        await ainvalidate(token.digest)
+        return False
+    await astore(token)
+    return True
+
+
+def invalidate(*digests):
+    """
+    Drop the given tokens from both cache tiers
+    :param digests:
+    :return:
+    """
+    for digest in digests:
+        local_cache.delete(digest)
+    _shared_cache().delete_many([_key(digest) for digest in digests])
+
+
+async def ainvalidate(*digests):
+    """
+    Async version of invalidate()
+    :param digests:
+    :return:
+    """
+    for digest in digests:
+        local_cache.delete(digest)
+    await _shared_cache().adelete_many([_key(digest) for digest in digests])
+
+
+def invalidate_user(user_id):
+    """
+    Drop every cached token of the user
+    :param user_id:
+    :return:
+    """
+    digests = list(
+        AuthToken.objects.filter(user_id=user_id).values_list(
+            'digest', flat=True
+        )
+    )
+    if digests:
+        invalidate(*digests)
+
+
+class CachedTokenAuthentication(authentication.TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication using hashed, cached tokens.
+    `aauthenticate()` serves the async views.
+    """
+    model = AuthToken
+
+    def authenticate(self, request):
+        key = self.get_key(request)
+        if key is None:
+            return None
+        return self.authenticate_credentials(key)
+
+    async def aauthenticate(self, request):
+        """
+        Async version of authenticate()
+        :param request:
+        :return:
+        """
+        key = self.get_key(request)
+        if key is None:
+            return None
+        token = await aget_token(AuthToken.hash_key(key))
+        self._check(token)
+        now = timezone.now()
+        if token.is_expired(now):
+            await ainvalidate(token.digest)
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        if not await arenew(token, now):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        await routers.abind_user(token.user_id)
+        return token.user, token
+
+    def authenticate_credentials(self, key):
+        """
+        Return the user and token for the key
+        :param key:
+        :return:
+        """
+        token = get_token(AuthToken.hash_key(key))
+        self._check(token)
+        now = timezone.now()
+        if token.is_expired(now):
+            invalidate(token.digest)
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        if not renew(token, now):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        routers.bind_user(token.user_id)
+        return token.user, token
+
+    def get_key(self, request):
+        """
+        Return the key from the Authorization header, or None when the
+        header does not carry a token
+        :param request:
+        :return:
+        """
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. No credentials provided.')
+            )
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed(_(
+                'Invalid token header. '
+                'Token string should not contain spaces.'
+            ))
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_(
+                'Invalid token header. '
+                'Token string should not contain invalid characters.'
+            ))
+
+    def _check(self, token):
+        """
+        Reject unknown tokens and tokens of inactive users
+        :param token:
+        :return:
+        """
+        if token is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
@@ -0,0 +1,124 @@
+"""
+Password hashers tuned from settings.PASSWORD_HASHING.
+
+The cost parameters are read on every use, so changing them only needs a
+settings change: Django's `must_update()` sees hashes made with other
+parameters and `check_password()` re-encodes them on the next login.
+Verification is bounded by a per-process limiter so a burst of logins
+cannot occupy every worker thread.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import gettext as _
+from rest_framework import exceptions
+
+DEFAULTS = {
+    'ALGORITHM': 'scrypt',
+    'SCRYPT': {'work_factor': 2 ** 15, 'block_size': 8, 'parallelism': 1},
+    'ARGON2': {'time_cost': 2, 'memory_cost': 19456, 'parallelism': 1},
+    'MAX_CONCURRENT_VERIFICATIONS': 2,
+    'VERIFICATION_TIMEOUT': 2.0,
+}
+
+
+def get_setting(name):
+    """
+    Return a PASSWORD_HASHING setting, falling back to the default
+    :param name:
+    :return:
+    """
+    return getattr(settings, 'PASSWORD_HASHING', {}).get(name, DEFAULTS[name])
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """
+    scrypt with cost parameters from settings
+    """
+
+    @property
+    def work_factor(self):
+        return get_setting('SCRYPT')['work_factor']
+
+    @property
+    def block_size(self):
+        return get_setting('SCRYPT')['block_size']
+
+    @property
+    def parallelism(self):
+        return get_setting('SCRYPT')['parallelism']
+
+    @property
+    def maxmem(self):
+        # scrypt needs 128 * n * r bytes; OpenSSL refuses more than 32 MiB
+        # unless told otherwise. Older hashes verify with their own, smaller n.
+        return 2 * 128 * self.work_factor * self.block_size * self.parallelism
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """
+    argon2id with cost parameters from settings; needs argon2-cffi
+    """
+
+    @property
+    def time_cost(self):
+        return get_setting('ARGON2')['time_cost']
+
+    @property
+    def memory_cost(self):
+        return get_setting('ARGON2')['memory_cost']
+
+    @property
+    def parallelism(self):
+        return get_setting('ARGON2')['parallelism']
+
+
+class VerificationLimiter:
+    """
+    Bound the number of password verifications running in this process
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self.active = 0
+
+    @contextmanager
+    def slot(self, limit, timeout):
+        """
+        Hold a verification slot, waiting at most `timeout` seconds for one
+        :param limit:
+        :param timeout:
+        :return:
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self.active < limit, timeout
+            ):
+                raise exceptions.Throttled(
+                    wait=max(timeout, 1),
+                    detail=_('Too many logins in progress, please retry.'),
+                )
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.active -= 1
+                self._condition.notify()
+
+
+limiter = VerificationLimiter()
+
+
+def verification_slot():
+    """
+    Hold a slot of the process wide verification limiter
+    :return:
+    """
+    return limiter.slot(
+        get_setting('MAX_CONCURRENT_VERIFICATIONS'),
+        get_setting('VERIFICATION_TIMEOUT'),
+    )
@@ -0,0 +1,72 @@
+"""
+Django command to compare token authentication backends
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+
+from core.models import AuthToken
+from user import authentication
+
+
+class Command(BaseCommand):
+    """
+    Authenticate the same request repeatedly with each backend and report
+    queries and time per request.
+
+    Data is created inside a transaction that is rolled back afterwards.
+    """
+    help = 'Benchmark queries per request of the token authentication backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email='benchmark-auth@example.com', password='password'
+            )
+            plain = Token.objects.create(user=user)
+            token, key = AuthToken.objects.create_token(user)
+
+            def cold():
+                authentication.invalidate(token.digest)
+
+            cached = authentication.CachedTokenAuthentication()
+            cases = [
+                ('authtoken', TokenAuthentication(), plain.key, None),
+                ('cached, cold', cached, key, cold),
+                ('cached, shared', cached, key,
+                 authentication.local_cache.clear),
+                ('cached, local', cached, key, None),
+            ]
+            self.stdout.write(f'{options["requests"]} requests')
+            self.stdout.write(
+                f'{"backend":<16} {"queries/req":>12} {"us/req":>8}'
+            )
+            for name, backend, credentials, reset in cases:
+                header = f'Token {credentials}'
+                request = Request(factory.get('/', HTTP_AUTHORIZATION=header))
+                backend.authenticate(request)
+                elapsed = 0
+                with CaptureQueriesContext(connection) as queries:
+                    for _ in range(options['requests']):
+                        if reset:
+                            reset()
+                        started = time.perf_counter()
+                        backend.authenticate(request)
+                        elapsed += time.perf_counter() - started
+                self.stdout.write(
+                    f'{name:<16} {len(queries) / options["requests"]:>12.2f} '
+                    f'{elapsed / options["requests"] * 1e6:>8.1f}'
+                )
+            cold()
+            transaction.set_rollback(True)
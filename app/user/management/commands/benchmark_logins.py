@@ -0,0 +1,73 @@
+"""
+Django command to measure password verification cost per core
+"""
+import time
+
+from django.contrib.auth import hashers
+from django.core.management import BaseCommand
+from django.test.utils import override_settings
+
+from user.hashers import ScryptPasswordHasher, Argon2PasswordHasher
+
+
+class Command(BaseCommand):
+    """
+    Verify a password repeatedly with each hasher on a single thread and
+    report the time per login, logins per second per core and the memory
+    each verification needs.
+    """
+    help = 'Benchmark logins per core for the password hashers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--scrypt-work-factors', nargs='+', type=int,
+            default=[2 ** 14, 2 ** 15, 2 ** 16],
+        )
+        parser.add_argument(
+            '--argon2-memory-costs', nargs='+', type=int,
+            default=[19456, 65536],
+        )
+
+    def handle(self, *args, **options):
+        cases = [('pbkdf2', hashers.PBKDF2PasswordHasher(), {}, 0)]
+        for work_factor in options['scrypt_work_factors']:
+            params = {'SCRYPT': {
+                'work_factor': work_factor, 'block_size': 8, 'parallelism': 1,
+            }}
+            cases.append((
+                f'scrypt n={work_factor}', ScryptPasswordHasher(), params,
+                128 * work_factor * 8,
+            ))
+        try:
+            import argon2  # noqa: F401
+        except ImportError:
+            self.stdout.write('argon2-cffi is not installed, skipping argon2')
+        else:
+            for memory_cost in options['argon2_memory_costs']:
+                params = {'ARGON2': {
+                    'time_cost': 2, 'memory_cost': memory_cost,
+                    'parallelism': 1,
+                }}
+                cases.append((
+                    f'argon2 m={memory_cost}', Argon2PasswordHasher(), params,
+                    memory_cost * 1024,
+                ))
+
+        self.stdout.write(
+            f'{"hasher":<20} {"ms/login":>9} {"logins/s/core":>14} '
+            f'{"MiB/login":>10}'
+        )
+        for name, hasher, params, memory in cases:
+            with override_settings(PASSWORD_HASHING=params):
+                encoded = hasher.encode('benchmark password', hasher.salt())
+                best = None
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    hasher.verify('benchmark password', encoded)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(
+                f'{name:<20} {best * 1000:>9.1f} {1 / best:>14.1f} '
+                f'{memory / 2 ** 20:>10.1f}'
+            )
@@ -0,0 +1,44 @@
+"""
+Django command to delete expired authentication tokens
+"""
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from core.models import AuthToken
+
+
+class Command(BaseCommand):
+    """
+    Delete expired tokens in primary key ordered chunks, each in its own
+    short transaction, so rows are never locked for long.
+    """
+    help = 'Delete expired authentication tokens in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help='Seconds to pause between chunks',
+        )
+
+    def handle(self, *args, **options):
+        deleted = 0
+        while True:
+            ids = list(
+                AuthToken.objects.expired()
+                .order_by('pk')
+                .values_list('pk', flat=True)[: options['chunk_size']]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                deleted += AuthToken.objects.filter(pk__in=ids).delete()[0]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} expired tokens')
+        )
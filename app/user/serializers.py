@@ -2,6 +2,9 @@ from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
+from core.models import AuthToken
+from .hashers import verification_slot
+
 User = get_user_model()
 
 
@@ -31,13 +34,11 @@ class UserSerializer(serializers.ModelSerializer):
         :param validated_data:
         :return:
         """
-        password = self.validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
+        password = validated_data.pop('password', None)
         if password:
-            user.set_password(password)
-            user.save()
-
-        return user
+            instance.set_password(password)
+        # Saved once, which also drops the user's cached tokens.
+        return super().update(instance, validated_data)
 
 
 
@@ -50,6 +51,9 @@ class AuthTokenSerializer(serializers.Serializer):
         style={'input_type': 'password'},
         trim_whitespace=False
     )
+    device = serializers.CharField(
+        required=False, allow_blank=True, max_length=64
+    )
 
     def validate(self, attrs):
         """
@@ -59,14 +63,35 @@ class AuthTokenSerializer(serializers.Serializer):
         """
         email = attrs.get('email')
         password = attrs.get('password')
-        user = authenticate(
-            request=self.context.get('request'),
-            username=email,
-            password=password
-        )
+        with verification_slot():
+            user = authenticate(
+                request=self.context.get('request'),
+                username=email,
+                password=password
+            )
         if not user:
             msg = _('Unable to authenticate with provided credentials')
             raise serializers.ValidationError(msg, code='authorization')
         attrs['user'] = user
         return attrs
 
+
+class TokenSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the user's tokens; keys are never returned
+    """
+    current = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AuthToken
+        fields = ['id', 'device', 'created', 'expires_at', 'current']
+        read_only_fields = fields
+
+    def get_current(self, obj):
+        """
+        Return whether the token authenticated this request
+        :param obj:
+        :return:
+        """
+        auth = self.context['request'].auth
+        return auth is not None and auth.pk == obj.pk
@@ -0,0 +1,28 @@
+"""
+Keep the authentication token cache in step with tokens and users
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import AuthToken
+
+from . import authentication
+
+
+@receiver(post_delete, sender=AuthToken)
+def token_deleted(sender, instance, **kwargs):
+    authentication.invalidate(instance.digest)
+    transaction.on_commit(lambda: authentication.invalidate(instance.digest))
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, **kwargs):
+    # Covers deactivation and password changes, and keeps the cached user
+    # from serving a stale name or email.
+    if not created:
+        authentication.invalidate_user(instance.pk)
+        transaction.on_commit(
+            lambda: authentication.invalidate_user(instance.pk)
+        )
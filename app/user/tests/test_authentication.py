@@ -0,0 +1,143 @@
+"""
+Testing the cached token authentication
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import AuthToken
+from user import authentication
+
+TOKEN_URL = reverse('user:token')
+ME_URL = reverse('user:me')
+
+User = get_user_model()
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """
+    Test token lookups are cached and invalidated
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        authentication.local_cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com', password='password', name='Test'
+        )
+        self.token, self.key = AuthToken.objects.create_token(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+
+    def test_login_returns_key_and_stores_digest(self):
+        """
+        Test the issued key is only stored as its digest
+        :return:
+        """
+        res = self.client.post(
+            TOKEN_URL, {'email': 'test@example.com', 'password': 'password'}
+        )
+        key = res.data['token']
+        self.assertFalse(AuthToken.objects.filter(digest=key).exists())
+        self.assertTrue(
+            AuthToken.objects.filter(digest=AuthToken.hash_key(key)).exists()
+        )
+
+    def test_repeated_requests_skip_token_lookup(self):
+        """
+        Test only the first request looks the token up
+        :return:
+        """
+        self.assertEqual(
+            self.client.get(ME_URL).status_code, status.HTTP_200_OK
+        )
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.data['email'], 'test@example.com')
+
+    def test_shared_tier_used_when_local_empty(self):
+        """
+        Test another process's entry is read from the shared cache
+        :return:
+        """
+        self.client.get(ME_URL)
+        authentication.local_cache.clear()
+        with self.assertNumQueries(0):
+            self.client.get(ME_URL)
+
+    def test_invalid_token_rejected(self):
+        """
+        Test an unknown key is rejected
+        :return:
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(
+            self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_token_deletion_invalidates(self):
+        """
+        Test a deleted token stops working immediately
+        :return:
+        """
+        self.client.get(ME_URL)
+        self.token.delete()
+        self.assertEqual(
+            self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_deactivation_invalidates(self):
+        """
+        Test a deactivated user is rejected despite a cached token
+        :return:
+        """
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(
+            self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_password_change_invalidates(self):
+        """
+        Test changing the password drops the cached user
+        :return:
+        """
+        self.client.get(ME_URL)
+        self.client.patch(
+            ME_URL, {'password': 'newpassword', 'name': 'Renamed'}
+        )
+        self.assertIsNone(authentication.local_cache.get(self.token.digest))
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.data['name'], 'Renamed')
+
+    def test_cached_user_is_not_shared(self):
+        """
+        Test each request gets its own user instance
+        :return:
+        """
+        first = authentication.get_token(self.token.digest)
+        second = authentication.get_token(self.token.digest)
+        self.assertIsNot(first.user, second.user)
+
+    def test_cache_holds_plain_data_without_password(self):
+        """
+        Test cache entries are plain data leaving out the password hash,
+        which is loaded from the database when read
+        :return:
+        """
+        self.client.get(ME_URL)
+        entry = caches['default'].get(authentication._key(self.token.digest))
+        json.dumps(entry)
+        self.assertNotIn('password', entry['user'])
+        self.assertNotIn('password', json.dumps(entry))
+
+        token = authentication.get_token(self.token.digest)
+        self.assertEqual(token.expires_at, self.token.expires_at)
+        with self.assertNumQueries(1):
+            self.assertTrue(token.user.check_password('password'))
@@ -0,0 +1,113 @@
+"""
+Testing the password hashing policy
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password, identify_hasher
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status, exceptions
+from rest_framework.test import APIClient
+
+from user import hashers
+
+TOKEN_URL = reverse('user:token')
+
+User = get_user_model()
+
+
+def scrypt_settings(work_factor, **extra):
+    """
+    Return PASSWORD_HASHING settings with a cheap scrypt work factor
+    :param work_factor:
+    :param extra:
+    :return:
+    """
+    return {
+        'SCRYPT': {
+            'work_factor': work_factor, 'block_size': 8, 'parallelism': 1,
+        },
+        **extra,
+    }
+
+
+@override_settings(PASSWORD_HASHING=scrypt_settings(2 ** 10))
+class PasswordHashingTests(TestCase):
+    """
+    Test new hashes follow the policy and old ones are upgraded on login
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post(
+            TOKEN_URL, {'email': 'test@example.com', 'password': 'password'}
+        )
+
+    def test_new_passwords_use_configured_scrypt(self):
+        """
+        Test passwords are hashed with the configured scrypt parameters
+        :return:
+        """
+        user = User.objects.create_user(
+            email='test@example.com', password='password'
+        )
+        self.assertTrue(user.password.startswith('scrypt$1024$'))
+
+    def test_changed_parameters_rehash_on_login(self):
+        """
+        Test a login re-encodes hashes made with other cost parameters
+        :return:
+        """
+        User.objects.create_user(email='test@example.com', password='password')
+        with override_settings(PASSWORD_HASHING=scrypt_settings(2 ** 11)):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        user = User.objects.get(email='test@example.com')
+        self.assertTrue(user.password.startswith('scrypt$2048$'))
+
+    def test_legacy_pbkdf2_hash_upgraded_on_login(self):
+        """
+        Test a PBKDF2 hash still verifies and is replaced by scrypt
+        :return:
+        """
+        User.objects.create(
+            email='test@example.com',
+            password=make_password('password', hasher='pbkdf2_sha256'),
+        )
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+        user = User.objects.get(email='test@example.com')
+        self.assertEqual(identify_hasher(user.password).algorithm, 'scrypt')
+
+    def test_login_rejected_when_verifications_saturated(self):
+        """
+        Test logins beyond the concurrency limit are throttled
+        :return:
+        """
+        User.objects.create_user(email='test@example.com', password='password')
+        saturated = scrypt_settings(
+            2 ** 10, MAX_CONCURRENT_VERIFICATIONS=0, VERIFICATION_TIMEOUT=0
+        )
+        with override_settings(PASSWORD_HASHING=saturated):
+            res = self.login()
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+
+
+class VerificationLimiterTests(SimpleTestCase):
+    """
+    Test the verification limiter
+    """
+
+    def test_slots_are_bounded_and_released(self):
+        """
+        Test a slot is refused while the limit is held and free afterwards
+        :return:
+        """
+        limiter = hashers.VerificationLimiter()
+        with limiter.slot(1, 0):
+            with self.assertRaises(exceptions.Throttled):
+                with limiter.slot(1, 0):
+                    pass
+        with limiter.slot(1, 0):
+            self.assertEqual(limiter.active, 1)
+        self.assertEqual(limiter.active, 0)
@@ -0,0 +1,195 @@
+"""
+Testing token expiry, rotation and revocation
+"""
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import AuthToken
+from user import authentication
+
+TOKEN_URL = reverse('user:token')
+TOKENS_URL = reverse('user:tokens')
+ME_URL = reverse('user:me')
+
+User = get_user_model()
+
+
+def token_detail_url(token_id):
+    """
+    Return the url revoking a token
+    :param token_id:
+    :return:
+    """
+    return reverse('user:token-detail', args=[token_id])
+
+
+@override_settings(
+    AUTH_TOKEN_LIFETIME=timedelta(days=14),
+    AUTH_TOKEN_RENEW_INTERVAL=timedelta(hours=1),
+)
+class TokenLifecycleTests(TestCase):
+    """
+    Test tokens expire, renew while used and can be revoked
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        authentication.local_cache.clear()
+        self.user = User.objects.create_user(
+            email='test@example.com', password='password'
+        )
+        self.token, self.key = AuthToken.objects.create_token(
+            self.user, device='phone'
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+
+    def later(self, **delta):
+        return patch(
+            'django.utils.timezone.now',
+            return_value=timezone.now() + timedelta(**delta),
+        )
+
+    def test_login_per_device_rotates_token(self):
+        """
+        Test logging in again from a device replaces only that device's token
+        :return:
+        """
+        AuthToken.objects.create_token(self.user, device='laptop')
+        payload = {
+            'email': 'test@example.com', 'password': 'password',
+            'device': 'phone',
+        }
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('expires_at', res.data)
+        devices = AuthToken.objects.filter(user=self.user).values_list(
+            'device', flat=True
+        )
+        self.assertEqual(sorted(devices), ['laptop', 'phone'])
+        self.assertEqual(
+            self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_expired_token_rejected(self):
+        """
+        Test a token past its expiry is rejected even when cached
+        :return:
+        """
+        self.client.get(ME_URL)
+        with self.later(days=15):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_use_renews_token(self):
+        """
+        Test a token in use is renewed once the renewal interval has passed
+        :return:
+        """
+        expires_at = self.token.expires_at
+        self.client.get(ME_URL)
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.expires_at, expires_at)
+
+        with self.later(days=13):
+            self.assertEqual(
+                self.client.get(ME_URL).status_code, status.HTTP_200_OK
+            )
+        self.token.refresh_from_db()
+        self.assertGreater(
+            self.token.expires_at, expires_at + timedelta(days=12)
+        )
+        with self.later(days=20):
+            self.assertEqual(
+                self.client.get(ME_URL).status_code, status.HTTP_200_OK
+            )
+
+    def test_list_tokens(self):
+        """
+        Test the user's tokens are listed without their keys
+        :return:
+        """
+        AuthToken.objects.create_token(self.user, device='laptop')
+        res = self.client.get(TOKENS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(t['device'], t['current']) for t in res.data],
+            [('laptop', False), ('phone', True)],
+        )
+        self.assertNotIn('digest', res.data[0])
+
+    def test_revoke_token(self):
+        """
+        Test a revoked token stops working despite being cached
+        :return:
+        """
+        self.client.get(ME_URL)
+        res = self.client.delete(token_detail_url(self.token.id))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_revoke_other_users_token_not_found(self):
+        """
+        Test another user's token cannot be revoked
+        :return:
+        """
+        other = User.objects.create_user(
+            email='other@example.com', password='password'
+        )
+        token, _ = AuthToken.objects.create_token(other)
+        res = self.client.delete(token_detail_url(token.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(AuthToken.objects.filter(pk=token.pk).exists())
+
+    def test_revoke_all_tokens(self):
+        """
+        Test revoking all tokens logs out every device
+        :return:
+        """
+        _, laptop_key = AuthToken.objects.create_token(
+            self.user, device='laptop'
+        )
+        laptop = APIClient()
+        laptop.credentials(HTTP_AUTHORIZATION=f'Token {laptop_key}')
+        laptop.get(ME_URL)
+        self.assertEqual(
+            self.client.delete(TOKENS_URL).status_code,
+            status.HTTP_204_NO_CONTENT,
+        )
+        self.assertEqual(
+            laptop.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        self.assertFalse(AuthToken.objects.filter(user=self.user).exists())
+
+    def test_purge_expired_tokens(self):
+        """
+        Test the purge command deletes only expired tokens, in chunks
+        :return:
+        """
+        AuthToken.objects.bulk_create(
+            AuthToken(
+                user=self.user,
+                digest=f'{i:064d}',
+                expires_at=timezone.now() - timedelta(days=1),
+            )
+            for i in range(5)
+        )
+        out = StringIO()
+        call_command('purge_expired_tokens', chunk_size=2, stdout=out)
+        self.assertIn('Deleted 5 expired tokens', out.getvalue())
+        self.assertEqual(
+            list(AuthToken.objects.values_list('pk', flat=True)),
+            [self.token.pk],
+        )
@@ -8,4 +8,10 @@ urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.CreateTokenView.as_view(), name='token'),
     path('me/', views.ManageUserView.as_view(), name='me'),
+    path('tokens/', views.TokenListView.as_view(), name='tokens'),
+    path(
+        'tokens/<int:pk>/',
+        views.TokenDetailView.as_view(),
+        name='token-detail',
+    ),
 ]
\ No newline at end of file
@@ -1,12 +1,15 @@
 """
 Views for the User API.
 """
-from rest_framework import generics, authentication
+from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
-from .serializers import UserSerializer, AuthTokenSerializer
+
+from core.models import AuthToken
+from .authentication import CachedTokenAuthentication
+from .serializers import UserSerializer, AuthTokenSerializer, TokenSerializer
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -15,6 +18,7 @@ class CreateUserView(generics.CreateAPIView):
     """
 
     serializer_class = UserSerializer
+    query_budget = 2
 
 
 class CreateTokenView(ObtainAuthToken):
@@ -23,6 +27,25 @@ class CreateTokenView(ObtainAuthToken):
     """
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    # A login may also upgrade the password hash and replace the device's
+    # token.
+    query_budget = 4
+
+    def post(self, request, *args, **kwargs):
+        """
+        Issue a new token; only its digest is stored
+        :param request:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token, key = AuthToken.objects.create_token(
+            serializer.validated_data['user'],
+            device=serializer.validated_data.get('device', ''),
+        )
+        return Response({'token': key, 'expires_at': token.expires_at})
 
 
 
@@ -32,8 +55,9 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     Manage the authenticated user
     """
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = (IsAuthenticated,)
+    query_budget = {'get': 1, 'put': 4, 'patch': 4}
 
     def get_object(self):
         """
@@ -41,3 +65,49 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
         :return:
         """
         return self.request.user
+
+
+class TokenListView(generics.ListAPIView):
+    """
+    List the authenticated user's tokens, or revoke all of them
+    """
+    serializer_class = TokenSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = (IsAuthenticated,)
+    query_budget = {'get': 3, 'delete': 3}
+
+    def get_queryset(self):
+        """
+        Retrieve the user's tokens, newest first
+        :return:
+        """
+        return AuthToken.objects.filter(user=self.request.user).order_by(
+            '-created', '-id'
+        )
+
+    def delete(self, request, *args, **kwargs):
+        """
+        Revoke every token of the user, logging out all devices
+        :param request:
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        self.get_queryset().delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TokenDetailView(generics.DestroyAPIView):
+    """
+    Revoke one of the authenticated user's tokens
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = (IsAuthenticated,)
+    query_budget = 4
+
+    def get_queryset(self):
+        """
+        Retrieve the user's tokens
+        :return:
+        """
+        return AuthToken.objects.filter(user=self.request.user)